@@ -0,0 +1,32 @@
+"""Content-addressed audio blobs
+
+Revision ID: 003_audio_blobs
+Revises: 002_background_jobs
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_audio_blobs'
+down_revision = '002_background_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('audio_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('url', sa.String(length=255), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_index(op.f('ix_audio_blobs_url'), 'audio_blobs', ['url'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_audio_blobs_url'), table_name='audio_blobs')
+    op.drop_table('audio_blobs')
@@ -0,0 +1,39 @@
+"""Audio transcription pipeline
+
+Revision ID: 005_audio_transcriptions
+Revises: 004_upload_sessions
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005_audio_transcriptions'
+down_revision = '004_upload_sessions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('audio_transcriptions',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('response_id', sa.String(length=36), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('engine', sa.String(length=50), nullable=True),
+        sa.Column('duration_seconds', sa.Float(), nullable=True),
+        sa.Column('transcript', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['response_id'], ['user_activity_responses.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('response_id')
+    )
+    op.create_index(op.f('ix_audio_transcriptions_status'), 'audio_transcriptions', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_audio_transcriptions_status'), table_name='audio_transcriptions')
+    op.drop_table('audio_transcriptions')
@@ -0,0 +1,52 @@
+"""Composite indexes for progress, responses and playlists
+
+Revision ID: 006_composite_indexes
+Revises: 005_audio_transcriptions
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006_composite_indexes'
+down_revision = '005_audio_transcriptions'
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, colunas): os índices de coluna única que viraram prefixo
+# de um composto são removidos (só custavam escrita)
+COMPOSITE_INDEXES = [
+    ('ix_user_video_progress_user_watched', 'user_video_progress', ['user_id', 'watched', 'video_id']),
+    ('ix_user_video_progress_video_watched', 'user_video_progress', ['video_id', 'watched', 'user_id']),
+    ('ix_user_activity_responses_user_responded', 'user_activity_responses',
+     ['user_id', 'responded', 'activity_id', 'grau_aprendizagem']),
+    ('ix_user_activity_responses_activity_responded', 'user_activity_responses',
+     ['activity_id', 'responded', 'grau_aprendizagem']),
+    ('ix_videos_content_order', 'videos', ['content_id', 'order_index']),
+    ('ix_activities_content_order', 'activities', ['content_id', 'order_index']),
+]
+
+REPLACED_INDEXES = [
+    ('ix_user_video_progress_user_id', 'user_video_progress', ['user_id']),
+    ('ix_user_video_progress_video_id', 'user_video_progress', ['video_id']),
+    ('ix_user_activity_responses_user_id', 'user_activity_responses', ['user_id']),
+    ('ix_user_activity_responses_activity_id', 'user_activity_responses', ['activity_id']),
+    ('ix_videos_content_id', 'videos', ['content_id']),
+    ('ix_activities_content_id', 'activities', ['content_id']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in COMPOSITE_INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    for name, table, _ in REPLACED_INDEXES:
+        op.drop_index(name, table_name=table)
+    # Estatísticas para o planner do SQLite escolher os índices novos
+    op.execute('ANALYZE')
+
+
+def downgrade() -> None:
+    for name, table, columns in REPLACED_INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    for name, table, _ in COMPOSITE_INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,40 @@
+"""Unique (user_id, video_id) on user_video_progress
+
+Revision ID: 007_unique_video_progress
+Revises: 006_composite_indexes
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '007_unique_video_progress'
+down_revision = '006_composite_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Remove duplicatas criadas por chamadas concorrentes antes de criar a
+    # unique: fica um registro por (user_id, video_id), preferindo o assistido
+    # e, entre esses, o da primeira visualização
+    op.execute("""
+        DELETE FROM user_video_progress
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, video_id
+                    ORDER BY watched DESC, watched_at, id
+                ) AS position
+                FROM user_video_progress
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+    op.create_index(
+        'uq_user_video_progress_user_video', 'user_video_progress', ['user_id', 'video_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_user_video_progress_user_video', table_name='user_video_progress')
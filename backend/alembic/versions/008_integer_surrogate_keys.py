@@ -0,0 +1,312 @@
+"""Integer surrogate keys for users, videos, activities, progress and responses
+
+Revision ID: 008_integer_surrogate_keys
+Revises: 007_unique_video_progress
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_integer_surrogate_keys'
+down_revision = '007_unique_video_progress'
+branch_labels = None
+depends_on = None
+
+# Linhas copiadas por INSERT ... SELECT (faixas de rowid da tabela antiga)
+BATCH_SIZE = 5000
+
+TIMESTAMP_NOW = sa.text('CURRENT_TIMESTAMP')
+
+
+def _public_id():
+    return sa.Column('id', sa.String(length=36), nullable=False)
+
+
+def _copy_in_batches(source: str, insert_sql: str) -> int:
+    """
+    Executa insert_sql (que filtra `src.rowid BETWEEN :lo AND :hi`) em faixas
+    de BATCH_SIZE rowids da tabela de origem. Retorna o total copiado.
+    """
+    conn = op.get_bind()
+    low, high = conn.execute(sa.text(f"SELECT MIN(rowid), MAX(rowid) FROM {source}")).one()
+    copied = 0
+    if low is None:
+        return copied
+    for start in range(low, high + 1, BATCH_SIZE):
+        result = conn.execute(sa.text(insert_sql), {"lo": start, "hi": start + BATCH_SIZE - 1})
+        copied += result.rowcount
+    return copied
+
+
+def _swap(table: str) -> None:
+    """Troca a tabela antiga pela reconstruída (<table>_new)"""
+    op.drop_table(table)
+    op.rename_table(f'{table}_new', table)
+
+
+def _report(table: str, before: int, copied: int) -> None:
+    if before != copied:
+        # Registros órfãos (FKs não são impostas no SQLite) não têm para onde apontar
+        print(f"  {table}: {before - copied} registro(s) órfão(s) descartado(s)")
+
+
+# --- upgrade ---------------------------------------------------------------
+
+def _create_parent_tables_with_pk() -> None:
+    op.create_table('users_new',
+        sa.Column('pk', sa.Integer(), nullable=False),
+        _public_id(),
+        sa.Column('device_id', sa.String(length=255), nullable=False),
+        sa.Column('nome', sa.String(length=255), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=True),
+        sa.Column('idade', sa.Integer(), nullable=True),
+        sa.Column('interesses', sa.JSON(), nullable=True),
+        sa.Column('nivel_educacional', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.Column('last_active_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('pk'),
+        sa.UniqueConstraint('id')
+    )
+    op.create_table('videos_new',
+        sa.Column('pk', sa.Integer(), nullable=False),
+        _public_id(),
+        sa.Column('content_id', sa.String(length=36), nullable=False),
+        sa.Column('video_id', sa.String(length=255), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=True),
+        sa.Column('quantity_until_e2e', sa.Integer(), nullable=True),
+        sa.Column('order_index', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['content_id'], ['contents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('pk'),
+        sa.UniqueConstraint('id')
+    )
+    op.create_table('activities_new',
+        sa.Column('pk', sa.Integer(), nullable=False),
+        _public_id(),
+        sa.Column('content_id', sa.String(length=36), nullable=False),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('order_index', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['content_id'], ['contents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('pk'),
+        sa.UniqueConstraint('id')
+    )
+
+
+def _create_fact_tables_with_pk() -> None:
+    op.create_table('user_video_progress_new',
+        sa.Column('pk', sa.Integer(), nullable=False),
+        _public_id(),
+        sa.Column('user_pk', sa.Integer(), nullable=False),
+        sa.Column('video_pk', sa.Integer(), nullable=False),
+        sa.Column('watched', sa.Boolean(), nullable=True),
+        sa.Column('watched_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['user_pk'], ['users.pk'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['video_pk'], ['videos.pk'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('pk'),
+        sa.UniqueConstraint('id')
+    )
+    op.create_table('user_activity_responses_new',
+        sa.Column('pk', sa.Integer(), nullable=False),
+        _public_id(),
+        sa.Column('user_pk', sa.Integer(), nullable=False),
+        sa.Column('activity_pk', sa.Integer(), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=True),
+        sa.Column('grau_aprendizagem', sa.Float(), nullable=True),
+        sa.Column('responded', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['user_pk'], ['users.pk'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['activity_pk'], ['activities.pk'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('pk'),
+        sa.UniqueConstraint('id')
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    counts = {
+        table: conn.execute(sa.text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        for table in ('user_video_progress', 'user_activity_responses')
+    }
+
+    # 1. Tabelas referenciadas: a pk segue a ordem de inserção (rowid) antiga
+    _create_parent_tables_with_pk()
+    _copy_in_batches('users', """
+        INSERT INTO users_new (id, device_id, nome, email, idade, interesses, nivel_educacional,
+                               created_at, updated_at, last_active_at)
+        SELECT id, device_id, nome, email, idade, interesses, nivel_educacional,
+               created_at, updated_at, last_active_at
+        FROM users AS src WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _copy_in_batches('videos', """
+        INSERT INTO videos_new (id, content_id, video_id, title, quantity_until_e2e, order_index, created_at)
+        SELECT id, content_id, video_id, title, quantity_until_e2e, order_index, created_at
+        FROM videos AS src WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _copy_in_batches('activities', """
+        INSERT INTO activities_new (id, content_id, question, order_index, created_at)
+        SELECT id, content_id, question, order_index, created_at
+        FROM activities AS src WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+
+    # 2. Progresso e respostas: UUIDs das FKs traduzidos para as pks novas
+    _create_fact_tables_with_pk()
+    copied = _copy_in_batches('user_video_progress', """
+        INSERT INTO user_video_progress_new (id, user_pk, video_pk, watched, watched_at)
+        SELECT src.id, u.pk, v.pk, src.watched, src.watched_at
+        FROM user_video_progress AS src
+        JOIN users_new AS u ON u.id = src.user_id
+        JOIN videos_new AS v ON v.id = src.video_id
+        WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _report('user_video_progress', counts['user_video_progress'], copied)
+    copied = _copy_in_batches('user_activity_responses', """
+        INSERT INTO user_activity_responses_new (id, user_pk, activity_pk, answer, grau_aprendizagem, responded, created_at)
+        SELECT src.id, u.pk, a.pk, src.answer, src.grau_aprendizagem, src.responded, src.created_at
+        FROM user_activity_responses AS src
+        JOIN users_new AS u ON u.id = src.user_id
+        JOIN activities_new AS a ON a.id = src.activity_id
+        WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _report('user_activity_responses', counts['user_activity_responses'], copied)
+
+    # 3. Troca as tabelas (filhas primeiro) e recria os índices sobre as colunas novas
+    for table in ('user_activity_responses', 'user_video_progress', 'activities', 'videos', 'users'):
+        _swap(table)
+
+    op.create_index('ix_users_device_id', 'users', ['device_id'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_videos_content_order', 'videos', ['content_id', 'order_index'], unique=False)
+    op.create_index('ix_activities_content_order', 'activities', ['content_id', 'order_index'], unique=False)
+    op.create_index('ix_user_video_progress_user_watched', 'user_video_progress', ['user_pk', 'watched', 'video_pk'])
+    op.create_index('ix_user_video_progress_video_watched', 'user_video_progress', ['video_pk', 'watched', 'user_pk'])
+    op.create_index('uq_user_video_progress_user_video', 'user_video_progress', ['user_pk', 'video_pk'], unique=True)
+    op.create_index('ix_user_video_progress_watched_at', 'user_video_progress', ['watched_at'], unique=False)
+    op.create_index(
+        'ix_user_activity_responses_user_responded', 'user_activity_responses',
+        ['user_pk', 'responded', 'activity_pk', 'grau_aprendizagem']
+    )
+    op.create_index(
+        'ix_user_activity_responses_activity_responded', 'user_activity_responses',
+        ['activity_pk', 'responded', 'grau_aprendizagem']
+    )
+    op.create_index('ix_user_activity_responses_created_at', 'user_activity_responses', ['created_at'], unique=False)
+    op.execute('ANALYZE')
+
+
+# --- downgrade -------------------------------------------------------------
+
+def downgrade() -> None:
+    op.create_table('users_new',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('device_id', sa.String(length=255), nullable=False),
+        sa.Column('nome', sa.String(length=255), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=True),
+        sa.Column('idade', sa.Integer(), nullable=True),
+        sa.Column('interesses', sa.JSON(), nullable=True),
+        sa.Column('nivel_educacional', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.Column('last_active_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('videos_new',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('content_id', sa.String(length=36), nullable=False),
+        sa.Column('video_id', sa.String(length=255), nullable=False),
+        sa.Column('title', sa.String(length=255), nullable=True),
+        sa.Column('quantity_until_e2e', sa.Integer(), nullable=True),
+        sa.Column('order_index', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['content_id'], ['contents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('activities_new',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('content_id', sa.String(length=36), nullable=False),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('order_index', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['content_id'], ['contents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user_video_progress_new',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('video_id', sa.String(length=36), nullable=False),
+        sa.Column('watched', sa.Boolean(), nullable=True),
+        sa.Column('watched_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['video_id'], ['videos.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user_activity_responses_new',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('activity_id', sa.String(length=36), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=True),
+        sa.Column('grau_aprendizagem', sa.Float(), nullable=True),
+        sa.Column('responded', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=TIMESTAMP_NOW, nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    _copy_in_batches('users', """
+        INSERT INTO users_new (id, device_id, nome, email, idade, interesses, nivel_educacional,
+                               created_at, updated_at, last_active_at)
+        SELECT id, device_id, nome, email, idade, interesses, nivel_educacional,
+               created_at, updated_at, last_active_at
+        FROM users AS src WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _copy_in_batches('videos', """
+        INSERT INTO videos_new (id, content_id, video_id, title, quantity_until_e2e, order_index, created_at)
+        SELECT id, content_id, video_id, title, quantity_until_e2e, order_index, created_at
+        FROM videos AS src WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _copy_in_batches('activities', """
+        INSERT INTO activities_new (id, content_id, question, order_index, created_at)
+        SELECT id, content_id, question, order_index, created_at
+        FROM activities AS src WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _copy_in_batches('user_video_progress', """
+        INSERT INTO user_video_progress_new (id, user_id, video_id, watched, watched_at)
+        SELECT src.id, u.id, v.id, src.watched, src.watched_at
+        FROM user_video_progress AS src
+        JOIN users AS u ON u.pk = src.user_pk
+        JOIN videos AS v ON v.pk = src.video_pk
+        WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+    _copy_in_batches('user_activity_responses', """
+        INSERT INTO user_activity_responses_new (id, user_id, activity_id, answer, grau_aprendizagem, responded, created_at)
+        SELECT src.id, u.id, a.id, src.answer, src.grau_aprendizagem, src.responded, src.created_at
+        FROM user_activity_responses AS src
+        JOIN users AS u ON u.pk = src.user_pk
+        JOIN activities AS a ON a.pk = src.activity_pk
+        WHERE src.rowid BETWEEN :lo AND :hi ORDER BY src.rowid
+    """)
+
+    for table in ('user_activity_responses', 'user_video_progress', 'activities', 'videos', 'users'):
+        _swap(table)
+
+    op.create_index('ix_users_device_id', 'users', ['device_id'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_videos_content_order', 'videos', ['content_id', 'order_index'], unique=False)
+    op.create_index('ix_activities_content_order', 'activities', ['content_id', 'order_index'], unique=False)
+    op.create_index('ix_user_video_progress_user_watched', 'user_video_progress', ['user_id', 'watched', 'video_id'])
+    op.create_index('ix_user_video_progress_video_watched', 'user_video_progress', ['video_id', 'watched', 'user_id'])
+    op.create_index('uq_user_video_progress_user_video', 'user_video_progress', ['user_id', 'video_id'], unique=True)
+    op.create_index('ix_user_video_progress_watched_at', 'user_video_progress', ['watched_at'], unique=False)
+    op.create_index(
+        'ix_user_activity_responses_user_responded', 'user_activity_responses',
+        ['user_id', 'responded', 'activity_id', 'grau_aprendizagem']
+    )
+    op.create_index(
+        'ix_user_activity_responses_activity_responded', 'user_activity_responses',
+        ['activity_id', 'responded', 'grau_aprendizagem']
+    )
+    op.create_index('ix_user_activity_responses_created_at', 'user_activity_responses', ['created_at'], unique=False)
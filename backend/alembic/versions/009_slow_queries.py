@@ -0,0 +1,38 @@
+"""Slow query log
+
+Revision ID: 009_slow_queries
+Revises: 008_integer_surrogate_keys
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_slow_queries'
+down_revision = '008_integer_surrogate_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('slow_queries',
+        sa.Column('shape_hash', sa.String(length=40), nullable=False),
+        sa.Column('statement', sa.Text(), nullable=False),
+        sa.Column('calls', sa.Integer(), nullable=False),
+        sa.Column('total_ms', sa.Float(), nullable=False),
+        sa.Column('max_ms', sa.Float(), nullable=False),
+        sa.Column('last_ms', sa.Float(), nullable=True),
+        sa.Column('last_parameters', sa.Text(), nullable=True),
+        sa.Column('last_route', sa.String(length=255), nullable=True),
+        sa.Column('plan', sa.Text(), nullable=True),
+        sa.Column('first_seen_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('last_seen_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('shape_hash')
+    )
+    op.create_index(op.f('ix_slow_queries_total_ms'), 'slow_queries', ['total_ms'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_slow_queries_total_ms'), table_name='slow_queries')
+    op.drop_table('slow_queries')
@@ -0,0 +1,221 @@
+"""User and content stats rollups maintained by triggers
+
+Revision ID: 010_rollup_tables
+Revises: 009_slow_queries
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_rollup_tables'
+down_revision = '009_slow_queries'
+branch_labels = None
+depends_on = None
+
+
+# Triggers e recálculo congelados nesta revisão (cópia de app.db_models /
+# app.services.rollups no momento da migração)
+def _watch_trigger_sql(row: str, sign: str) -> str:
+    """Soma (sign='+') ou subtrai (sign='-') uma linha de progresso assistida"""
+    content = f"(SELECT content_id FROM videos WHERE pk = {row}.video_pk)"
+    # 1 se não há outro vídeo assistido do mesmo usuário no mesmo conteúdo
+    only_watch = f"""(NOT EXISTS (
+            SELECT 1 FROM user_video_progress p JOIN videos v ON v.pk = p.video_pk
+            WHERE p.user_pk = {row}.user_pk AND p.watched IS 1 AND p.pk != {row}.pk AND v.content_id = {content}
+        ))"""
+    ensure = ""
+    activity = ""
+    if sign == "+":
+        ensure = f"""
+        INSERT OR IGNORE INTO user_stats (user_pk) VALUES ({row}.user_pk);
+        INSERT OR IGNORE INTO content_stats (content_id) SELECT content_id FROM videos WHERE pk = {row}.video_pk;"""
+        activity = ", last_activity_at = CURRENT_TIMESTAMP"
+    return f"""{ensure}
+        UPDATE user_stats SET
+            videos_watched = videos_watched {sign} 1,
+            contents_watched = contents_watched {sign} {only_watch}{activity}
+        WHERE user_pk = {row}.user_pk;
+        UPDATE content_stats SET
+            videos_watched = videos_watched {sign} 1,
+            unique_viewers = unique_viewers {sign} {only_watch}{activity}
+        WHERE content_id = {content};"""
+
+
+def _response_trigger_sql(row: str, sign: str) -> str:
+    """Soma (sign='+') ou subtrai (sign='-') a contribuição de uma resposta"""
+    content = f"(SELECT content_id FROM activities WHERE pk = {row}.activity_pk)"
+    totals = f"""activities_completed = activities_completed {sign} ({row}.responded IS 1),
+            grade_sum = grade_sum {sign} coalesce({row}.grau_aprendizagem, 0),
+            grade_count = grade_count {sign} ({row}.grau_aprendizagem IS NOT NULL)"""
+    ensure = ""
+    if sign == "+":
+        ensure = f"""
+        INSERT OR IGNORE INTO user_stats (user_pk) VALUES ({row}.user_pk);
+        INSERT OR IGNORE INTO content_stats (content_id) SELECT content_id FROM activities WHERE pk = {row}.activity_pk;"""
+        totals += ", last_activity_at = CURRENT_TIMESTAMP"
+    return f"""{ensure}
+        UPDATE user_stats SET {totals} WHERE user_pk = {row}.user_pk;
+        UPDATE content_stats SET {totals} WHERE content_id = {content};"""
+
+
+_WATCH_CHANGED = "(OLD.watched IS NOT NEW.watched OR OLD.user_pk != NEW.user_pk OR OLD.video_pk != NEW.video_pk)"
+_RESPONSE_CHANGED = (
+    "(OLD.responded IS NOT NEW.responded OR OLD.grau_aprendizagem IS NOT NEW.grau_aprendizagem"
+    " OR OLD.user_pk != NEW.user_pk OR OLD.activity_pk != NEW.activity_pk)"
+)
+
+ROLLUP_TRIGGERS = {
+    # Toda linha de users/contents tem a sua linha de rollup (páginas do dashboard partem dela)
+    "trg_users_stats_insert": """
+        AFTER INSERT ON users BEGIN
+            INSERT OR IGNORE INTO user_stats (user_pk) VALUES (NEW.pk);
+        END""",
+    "trg_users_stats_delete": """
+        AFTER DELETE ON users BEGIN
+            DELETE FROM user_stats WHERE user_pk = OLD.pk;
+        END""",
+    "trg_contents_stats_insert": """
+        AFTER INSERT ON contents BEGIN
+            INSERT OR IGNORE INTO content_stats (content_id) VALUES (NEW.id);
+        END""",
+    "trg_contents_stats_delete": """
+        AFTER DELETE ON contents BEGIN
+            DELETE FROM content_stats WHERE content_id = OLD.id;
+        END""",
+    # O CASCADE das FKs apaga os fatos depois do vídeo/atividade, quando os
+    # triggers de fatos já não acham o content_id: apaga antes, com a linha viva
+    "trg_videos_stats_delete": """
+        BEFORE DELETE ON videos BEGIN
+            DELETE FROM user_video_progress WHERE video_pk = OLD.pk;
+        END""",
+    "trg_activities_stats_delete": """
+        BEFORE DELETE ON activities BEGIN
+            DELETE FROM user_activity_responses WHERE activity_pk = OLD.pk;
+        END""",
+    "trg_user_video_progress_stats_insert": f"""
+        AFTER INSERT ON user_video_progress WHEN NEW.watched IS 1 BEGIN{_watch_trigger_sql("NEW", "+")}
+        END""",
+    "trg_user_video_progress_stats_delete": f"""
+        AFTER DELETE ON user_video_progress WHEN OLD.watched IS 1 BEGIN{_watch_trigger_sql("OLD", "-")}
+        END""",
+    "trg_user_video_progress_stats_update_old": f"""
+        AFTER UPDATE OF watched, user_pk, video_pk ON user_video_progress
+        WHEN OLD.watched IS 1 AND {_WATCH_CHANGED} BEGIN{_watch_trigger_sql("OLD", "-")}
+        END""",
+    "trg_user_video_progress_stats_update_new": f"""
+        AFTER UPDATE OF watched, user_pk, video_pk ON user_video_progress
+        WHEN NEW.watched IS 1 AND {_WATCH_CHANGED} BEGIN{_watch_trigger_sql("NEW", "+")}
+        END""",
+    "trg_user_activity_responses_stats_insert": f"""
+        AFTER INSERT ON user_activity_responses BEGIN{_response_trigger_sql("NEW", "+")}
+        END""",
+    "trg_user_activity_responses_stats_delete": f"""
+        AFTER DELETE ON user_activity_responses BEGIN{_response_trigger_sql("OLD", "-")}
+        END""",
+    "trg_user_activity_responses_stats_update": f"""
+        AFTER UPDATE OF responded, grau_aprendizagem, user_pk, activity_pk ON user_activity_responses
+        WHEN {_RESPONSE_CHANGED} BEGIN{_response_trigger_sql("OLD", "-")}{_response_trigger_sql("NEW", "+")}
+        END""",
+}
+
+
+USER_STATS_SELECT = """
+    SELECT u.pk AS user_pk,
+           coalesce(w.videos_watched, 0) AS videos_watched,
+           coalesce(w.contents_watched, 0) AS contents_watched,
+           coalesce(r.activities_completed, 0) AS activities_completed,
+           coalesce(r.grade_sum, 0.0) AS grade_sum,
+           coalesce(r.grade_count, 0) AS grade_count,
+           max(coalesce(w.last_at, r.last_at), coalesce(r.last_at, w.last_at)) AS last_activity_at
+    FROM users u
+    LEFT JOIN (
+        SELECT p.user_pk, count(*) AS videos_watched, count(DISTINCT v.content_id) AS contents_watched,
+               max(p.watched_at) AS last_at
+        FROM user_video_progress p LEFT JOIN videos v ON v.pk = p.video_pk
+        WHERE p.watched IS 1
+        GROUP BY p.user_pk
+    ) w ON w.user_pk = u.pk
+    LEFT JOIN (
+        SELECT user_pk, sum(responded IS 1) AS activities_completed, total(grau_aprendizagem) AS grade_sum,
+               count(grau_aprendizagem) AS grade_count, max(created_at) AS last_at
+        FROM user_activity_responses
+        GROUP BY user_pk
+    ) r ON r.user_pk = u.pk
+"""
+
+CONTENT_STATS_SELECT = """
+    SELECT c.id AS content_id,
+           coalesce(w.videos_watched, 0) AS videos_watched,
+           coalesce(w.unique_viewers, 0) AS unique_viewers,
+           coalesce(r.activities_completed, 0) AS activities_completed,
+           coalesce(r.grade_sum, 0.0) AS grade_sum,
+           coalesce(r.grade_count, 0) AS grade_count,
+           max(coalesce(w.last_at, r.last_at), coalesce(r.last_at, w.last_at)) AS last_activity_at
+    FROM contents c
+    LEFT JOIN (
+        SELECT v.content_id, count(*) AS videos_watched, count(DISTINCT p.user_pk) AS unique_viewers,
+               max(p.watched_at) AS last_at
+        FROM user_video_progress p JOIN videos v ON v.pk = p.video_pk
+        WHERE p.watched IS 1
+        GROUP BY v.content_id
+    ) w ON w.content_id = c.id
+    LEFT JOIN (
+        SELECT a.content_id, sum(r.responded IS 1) AS activities_completed, total(r.grau_aprendizagem) AS grade_sum,
+               count(r.grau_aprendizagem) AS grade_count, max(r.created_at) AS last_at
+        FROM user_activity_responses r JOIN activities a ON a.pk = r.activity_pk
+        GROUP BY a.content_id
+    ) r ON r.content_id = c.id
+"""
+
+
+def upgrade() -> None:
+    op.create_table('user_stats',
+        sa.Column('user_pk', sa.Integer(), nullable=False),
+        sa.Column('videos_watched', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('contents_watched', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('activities_completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('grade_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('grade_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('avg_grade', sa.Float(), sa.Computed('CASE WHEN grade_count > 0 THEN grade_sum / grade_count ELSE 0 END', persisted=True)),
+        sa.Column('last_activity_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['user_pk'], ['users.pk'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_pk')
+    )
+    op.create_index('ix_user_stats_videos_watched', 'user_stats', [sa.text('videos_watched DESC'), 'user_pk'])
+    op.create_index('ix_user_stats_activities_completed', 'user_stats', [sa.text('activities_completed DESC'), 'user_pk'])
+    op.create_index('ix_user_stats_avg_grade', 'user_stats', [sa.text('avg_grade DESC'), 'user_pk'])
+    op.create_table('content_stats',
+        sa.Column('content_id', sa.String(length=36), nullable=False),
+        sa.Column('videos_watched', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unique_viewers', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('activities_completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('grade_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('grade_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_activity_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['content_id'], ['contents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('content_id')
+    )
+
+    # Carga inicial, depois os triggers (mesma transação da migração)
+    op.execute(
+        "INSERT INTO user_stats (user_pk, videos_watched, contents_watched, activities_completed, "
+        f"grade_sum, grade_count, last_activity_at) {USER_STATS_SELECT}"
+    )
+    op.execute(
+        "INSERT INTO content_stats (content_id, videos_watched, unique_viewers, activities_completed, "
+        f"grade_sum, grade_count, last_activity_at) {CONTENT_STATS_SELECT}"
+    )
+    for name, body in ROLLUP_TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade() -> None:
+    for name in ROLLUP_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table('content_stats')
+    op.drop_index('ix_user_stats_avg_grade', table_name='user_stats')
+    op.drop_index('ix_user_stats_activities_completed', table_name='user_stats')
+    op.drop_index('ix_user_stats_videos_watched', table_name='user_stats')
+    op.drop_table('user_stats')
@@ -0,0 +1,36 @@
+"""Hourly and daily activity rollups for trend charts
+
+Revision ID: 011_activity_timeseries
+Revises: 010_rollup_tables
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_activity_timeseries'
+down_revision = '010_rollup_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Tabelas vazias: o compactador da API preenche o histórico na primeira passada
+    for table in ('activity_hourly', 'activity_daily'):
+        op.create_table(table,
+            sa.Column('content_id', sa.String(length=36), nullable=False),
+            sa.Column('nivel', sa.String(length=100), nullable=False),
+            sa.Column('bucket_start', sa.TIMESTAMP(), nullable=False),
+            sa.Column('watches', sa.Integer(), nullable=False),
+            sa.Column('responses', sa.Integer(), nullable=False),
+            sa.Column('grade_sum', sa.Float(), nullable=False),
+            sa.Column('grade_count', sa.Integer(), nullable=False),
+            sa.Column('active_users', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('content_id', 'nivel', 'bucket_start')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('activity_daily')
+    op.drop_table('activity_hourly')
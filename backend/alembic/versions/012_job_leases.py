@@ -0,0 +1,28 @@
+"""Lease columns for background jobs
+
+Revision ID: 012_job_leases
+Revises: 011_activity_timeseries
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_job_leases'
+down_revision = '011_activity_timeseries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Jobs em execução sem lease (anteriores a esta revisão) contam como vencidos
+    with op.batch_alter_table('background_jobs') as batch_op:
+        batch_op.add_column(sa.Column('lease_owner', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('background_jobs') as batch_op:
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner')
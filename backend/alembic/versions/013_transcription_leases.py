@@ -0,0 +1,28 @@
+"""Lease columns for audio transcriptions
+
+Revision ID: 013_transcription_leases
+Revises: 012_job_leases
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_transcription_leases'
+down_revision = '012_job_leases'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Linhas pendentes sem lease (anteriores a esta revisão) são assumidas pelo próximo worker que subir
+    with op.batch_alter_table('audio_transcriptions') as batch_op:
+        batch_op.add_column(sa.Column('lease_owner', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('audio_transcriptions') as batch_op:
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner')
@@ -16,4 +16,69 @@ PORT = int(os.getenv("PORT", 8000))
 # Upload Directory Configuration
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 AUDIO_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "audio")
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", 25 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
 
+# Resumable Upload Sessions (abandoned sessions are garbage-collected)
+UPLOAD_SESSION_DIR = os.path.join(UPLOAD_DIR, ".sessions")
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))  # seconds since the last chunk
+UPLOAD_SESSION_GC_INTERVAL = int(os.getenv("UPLOAD_SESSION_GC_INTERVAL", 3600))
+
+# Upload Serving (/uploads)
+UPLOADS_IMMUTABLE_MAX_AGE = int(os.getenv("UPLOADS_IMMUTABLE_MAX_AGE", 365 * 24 * 3600))  # content-addressed blobs
+UPLOADS_ACCEL_REDIRECT = os.getenv("UPLOADS_ACCEL_REDIRECT", "")  # e.g. "/protected-uploads/" to let nginx send files
+
+# Circuit Breaker Configuration (LLM providers and YouTube extractor)
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5))
+CIRCUIT_BREAKER_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_BREAKER_RECOVERY_TIMEOUT", 30))
+
+# Request Deadline Configuration (seconds)
+# Clients may send X-Request-Timeout; otherwise the longest matching route prefix applies
+REQUEST_TIMEOUT_DEFAULT = float(os.getenv("REQUEST_TIMEOUT_DEFAULT", 30))
+REQUEST_TIMEOUT_MAX = float(os.getenv("REQUEST_TIMEOUT_MAX", 120))
+ROUTE_TIMEOUTS = {
+    "/api/v1/videos": 15.0,
+    "/api/v1/progress/next-video": 15.0,
+    "/api/v1/questions": 20.0,
+    "/api/v1/answers": 20.0,
+}
+
+# Minimum time left before starting optional external work (seconds)
+YTDLP_SOCKET_TIMEOUT = float(os.getenv("YTDLP_SOCKET_TIMEOUT", 20))
+YTDLP_MIN_SECONDS = float(os.getenv("YTDLP_MIN_SECONDS", 2))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_MIN_SECONDS = float(os.getenv("LLM_MIN_SECONDS", 3))
+
+# SQL instrumentation: a SELECT shape repeated this many times in one request is logged as a likely N+1
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", 5))
+# Statements slower than this are logged with their EXPLAIN QUERY PLAN and aggregated in slow_queries (0 disables)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 100))
+
+# Global dashboard stats: served from memory while fresh, stale entries are returned at once and refreshed in the background (0 disables)
+DASHBOARD_STATS_TTL = float(os.getenv("DASHBOARD_STATS_TTL", 30))
+LEADERBOARD_REBUILD_INTERVAL = float(os.getenv("LEADERBOARD_REBUILD_INTERVAL", 600))  # seconds between full leaderboard resyncs (0 disables)
+
+# Hourly/daily activity rollups (/dashboard/timeseries), filled by a background compactor
+TIMESERIES_COMPACT_INTERVAL = float(os.getenv("TIMESERIES_COMPACT_INTERVAL", 60))  # seconds between passes
+TIMESERIES_LOOKBACK_HOURS = int(os.getenv("TIMESERIES_LOOKBACK_HOURS", 2))  # recent hours recomputed each pass (late writes)
+TIMESERIES_MAX_DAYS_PER_PASS = int(os.getenv("TIMESERIES_MAX_DAYS_PER_PASS", 1))  # history backfill slice per write-queue unit
+TIMESERIES_BACKFILL_PAUSE = float(os.getenv("TIMESERIES_BACKFILL_PAUSE", 0.2))  # seconds between backfill slices (queued writes go first)
+
+# Background Jobs Configuration
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 4))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))  # a running job is reclaimable once its owner stops renewing for this long
+
+# Audio Transcription Pipeline
+TRANSCRIPTION_ENGINE = os.getenv("TRANSCRIPTION_ENGINE", "openai")  # openai, fake
+TRANSCRIPTION_MODEL = os.getenv("TRANSCRIPTION_MODEL", "whisper-1")
+TRANSCRIPTION_LANGUAGE = os.getenv("TRANSCRIPTION_LANGUAGE", "pt")
+TRANSCRIPTION_TIMEOUT = float(os.getenv("TRANSCRIPTION_TIMEOUT", 120))
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", 2))
+GRADING_CONCURRENCY = int(os.getenv("GRADING_CONCURRENCY", 4))
+TRANSCRIPTION_MAX_ATTEMPTS = int(os.getenv("TRANSCRIPTION_MAX_ATTEMPTS", 3))
+TRANSCRIPTION_RETRY_DELAY = float(os.getenv("TRANSCRIPTION_RETRY_DELAY", 30))  # seconds, doubled per attempt
+TRANSCRIPTION_LEASE_SECONDS = float(os.getenv("TRANSCRIPTION_LEASE_SECONDS", 300))  # must exceed one step (TRANSCRIPTION_TIMEOUT); then other workers may take the row
+
+# Single-writer queue (group commit for SQLite writes)
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", 64))
+WRITE_QUEUE_MAX_WAIT_MS = float(os.getenv("WRITE_QUEUE_MAX_WAIT_MS", 2))
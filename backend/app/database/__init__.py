@@ -1,24 +1,125 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # SQLite local database connection
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./feedbreak.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") in ("sqlite:", "sqlite://"))
+
+# SQLite production profile (applied on every new connection)
+# WAL lets readers run concurrently with the writer; NORMAL sync is durable
+# across app crashes in WAL mode and avoids an fsync per commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),  # wait for locks instead of "database is locked"
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024)),  # negative = KiB per connection
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Connection pool sized per process: every uvicorn/gunicorn worker has its own
+# pool, so the total budget is split by WEB_CONCURRENCY.
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 40))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", max(DB_MAX_CONNECTIONS // WEB_CONCURRENCY, 2)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", max(DB_POOL_SIZE // 2, 1)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+
+engine_options = {}
+if IS_SQLITE and not IS_SQLITE_MEMORY:
+    engine_options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
 
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Needed for SQLite
+    connect_args={
+        "check_same_thread": False,  # Needed for SQLite
+        "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+    } if IS_SQLITE else {},
     echo=False,  # Set to True for SQL query logging
+    **engine_options
 )
 
+
+def _async_database_url(url: str) -> str:
+    """Same database through an asyncio driver (sqlite -> sqlite+aiosqlite)"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return url
+
+
+# Async engine for `async def` endpoints: queries are awaited instead of
+# blocking the event loop or taking a threadpool slot.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_database_url(DATABASE_URL))
+
+# aiosqlite defaults to NullPool (a new connection + PRAGMAs per request); pool it like the sync engine
+async_engine_options = dict(engine_options, poolclass=AsyncAdaptedQueuePool) if engine_options else {}
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={
+        "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+    } if IS_SQLITE else {},
+    echo=False,
+    **async_engine_options
+)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the production PRAGMAs to each new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            if name == "journal_mode" and IS_SQLITE_MEMORY:
+                continue  # in-memory databases have no WAL
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+
+def get_database_settings() -> dict:
+    """Settings actually in effect (read back from SQLite), for startup logs and diagnostics"""
+    settings = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "pool": engine.pool.status(),
+        "async_url": async_engine.url.render_as_string(hide_password=True),
+        "async_pool": async_engine.pool.status(),
+    }
+    if IS_SQLITE:
+        with engine.connect() as conn:
+            for name in SQLITE_PRAGMAS:
+                settings[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return settings
+
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions (objects stay usable after commit; there is no lazy IO in async code)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -33,3 +134,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Async variant of get_db for `async def` endpoints.
+    Use with Depends(get_async_db) and `await db.execute(select(...))`.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, TIMESTAMP, Text, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, Float, Boolean, TIMESTAMP, Text, ForeignKey, JSON, Index, Computed, event, select, text
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 import uuid
 from app.database import Base
@@ -8,7 +8,9 @@ from app.database import Base
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # pk: chave inteira interna (armazenamento e joins); id: UUID público da API
+    pk = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     device_id = Column(String(255), unique=True, nullable=False, index=True)
     nome = Column(String(255), nullable=False)
     email = Column(String(255), unique=True, nullable=True, index=True)
@@ -41,9 +43,14 @@ class Content(Base):
 
 class Video(Base):
     __tablename__ = "videos"
+    __table_args__ = (
+        # Playlist: vídeos de um conteúdo em ordem (sem sort temporário)
+        Index("ix_videos_content_order", "content_id", "order_index"),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    content_id = Column(String(36), ForeignKey("contents.id", ondelete="CASCADE"), nullable=False, index=True)
+    pk = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    content_id = Column(String(36), ForeignKey("contents.id", ondelete="CASCADE"), nullable=False)
     
     video_id = Column(String(255), nullable=False)
     title = Column(String(255), nullable=True)
@@ -57,9 +64,13 @@ class Video(Base):
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        Index("ix_activities_content_order", "content_id", "order_index"),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    content_id = Column(String(36), ForeignKey("contents.id", ondelete="CASCADE"), nullable=False, index=True)
+    pk = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    content_id = Column(String(36), ForeignKey("contents.id", ondelete="CASCADE"), nullable=False)
     
     question = Column(Text, nullable=False)
     order_index = Column(Integer, default=0)
@@ -71,29 +82,312 @@ class Activity(Base):
 
 class UserVideoProgress(Base):
     __tablename__ = "user_video_progress"
+    __table_args__ = (
+        # Progresso do usuário (contagens e "não assistidos") e visualizações por vídeo/conteúdo
+        Index("ix_user_video_progress_user_watched", "user_pk", "watched", "video_pk"),
+        Index("ix_user_video_progress_video_watched", "video_pk", "watched", "user_pk"),
+        # Um registro por usuário e vídeo (alvo do upsert em POST /progress/watch)
+        Index("uq_user_video_progress_user_video", "user_pk", "video_pk", unique=True),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    video_id = Column(String(36), ForeignKey("videos.id", ondelete="CASCADE"), nullable=False, index=True)
+    pk = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    # Chaves estrangeiras inteiras (índices e joins compactos); filtre e junte por elas
+    user_pk = Column(Integer, ForeignKey("users.pk", ondelete="CASCADE"), nullable=False)
+    video_pk = Column(Integer, ForeignKey("videos.pk", ondelete="CASCADE"), nullable=False)
     
     watched = Column(Boolean, default=False)
     watched_at = Column(TIMESTAMP, server_default=func.now(), index=True)
     
+    # UUIDs públicos, somente leitura (carregados junto com a linha, pela pk)
+    user_id = column_property(select(User.id).where(User.pk == user_pk).correlate_except(User).scalar_subquery())
+    video_id = column_property(select(Video.id).where(Video.pk == video_pk).correlate_except(Video).scalar_subquery())
+    
     user = relationship("User", back_populates="video_progress")
     video = relationship("Video", back_populates="user_progress")
 
 
 class UserActivityResponse(Base):
     __tablename__ = "user_activity_responses"
+    __table_args__ = (
+        # Cobrem as contagens, a média de grau e o "não respondidas" sem ler a tabela
+        Index("ix_user_activity_responses_user_responded", "user_pk", "responded", "activity_pk", "grau_aprendizagem"),
+        Index("ix_user_activity_responses_activity_responded", "activity_pk", "responded", "grau_aprendizagem"),
+    )
     
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    activity_id = Column(String(36), ForeignKey("activities.id", ondelete="CASCADE"), nullable=False, index=True)
+    pk = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    user_pk = Column(Integer, ForeignKey("users.pk", ondelete="CASCADE"), nullable=False)
+    activity_pk = Column(Integer, ForeignKey("activities.pk", ondelete="CASCADE"), nullable=False)
     
     answer = Column(Text, nullable=True)
     grau_aprendizagem = Column(Float, nullable=True)
     responded = Column(Boolean, default=False)
     created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
     
+    user_id = column_property(select(User.id).where(User.pk == user_pk).correlate_except(User).scalar_subquery())
+    activity_id = column_property(
+        select(Activity.id).where(Activity.pk == activity_pk).correlate_except(Activity).scalar_subquery()
+    )
+    
     user = relationship("User", back_populates="activity_responses")
     activity = relationship("Activity", back_populates="user_responses")
+
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = Column(String(50), nullable=False, index=True)  # activity_generation, ...
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, completed, failed, interrupted
+    params = Column(JSON, default=dict)
+    checkpoint = Column(JSON, default=dict)  # Estado para retomar o job de onde parou
+    total_items = Column(Integer, default=0)
+    processed_items = Column(Integer, default=0)
+    failed_items = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    # Worker que está rodando o job e até quando (renovado por heartbeat)
+    lease_owner = Column(String(255), nullable=True)
+    lease_expires_at = Column(TIMESTAMP, nullable=True)
+    started_at = Column(TIMESTAMP, nullable=True)
+    finished_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class AudioBlob(Base):
+    __tablename__ = "audio_blobs"
+    
+    # Arquivos de áudio endereçados pelo conteúdo: mesmo SHA-256 = mesmo arquivo
+    sha256 = Column(String(64), primary_key=True)
+    url = Column(String(255), nullable=False, unique=True, index=True)
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    
+    # Upload de áudio retomável: o cliente envia blocos com offset e finaliza no fim
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    activity_id = Column(String(36), ForeignKey("activities.id", ondelete="CASCADE"), nullable=False)
+    extension = Column(String(16), nullable=False, default="")
+    upload_length = Column(Integer, nullable=True)  # Tamanho total declarado (opcional)
+    upload_offset = Column(Integer, nullable=False, default=0)  # Bytes já recebidos
+    status = Column(String(20), nullable=False, default="open", index=True)  # open, finalized
+    response_id = Column(String(36), nullable=True)  # Resposta criada no finalize
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)  # Renovado a cada bloco
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+
+class AudioTranscription(Base):
+    __tablename__ = "audio_transcriptions"
+    
+    # Pipeline de uma resposta em áudio: duração -> transcrição -> avaliação
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    response_id = Column(String(36), ForeignKey("user_activity_responses.id", ondelete="CASCADE"), nullable=False, unique=True)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, transcribing, grading, completed, failed
+    engine = Column(String(50), nullable=True)
+    duration_seconds = Column(Float, nullable=True)  # Lida do cabeçalho do arquivo
+    transcript = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)  # Tentativas na etapa atual
+    error = Column(Text, nullable=True)
+    lease_owner = Column(String(255), nullable=True)  # Worker que está processando (ou vai reprocessar) a linha
+    lease_expires_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class SlowQuery(Base):
+    __tablename__ = "slow_queries"
+    
+    # Statements acima de SLOW_QUERY_THRESHOLD_MS, agregados pelo formato (SQL normalizado)
+    shape_hash = Column(String(40), primary_key=True)  # SHA-1 do SQL normalizado
+    statement = Column(Text, nullable=False)
+    calls = Column(Integer, nullable=False, default=0)
+    total_ms = Column(Float, nullable=False, default=0.0, index=True)
+    max_ms = Column(Float, nullable=False, default=0.0)
+    last_ms = Column(Float, nullable=True)
+    last_parameters = Column(Text, nullable=True)  # JSON da última ocorrência
+    last_route = Column(String(255), nullable=True)  # "GET /api/v1/..." (template da rota)
+    plan = Column(Text, nullable=True)  # EXPLAIN QUERY PLAN da última ocorrência
+    first_seen_at = Column(TIMESTAMP, server_default=func.now())
+    last_seen_at = Column(TIMESTAMP, server_default=func.now())
+
+
+class UserRollup(Base):
+    __tablename__ = "user_stats"
+    __table_args__ = (
+        # Ordenações de GET /dashboard/users sem agregar nem ordenar na consulta
+        Index("ix_user_stats_videos_watched", text("videos_watched DESC"), "user_pk"),
+        Index("ix_user_stats_activities_completed", text("activities_completed DESC"), "user_pk"),
+        Index("ix_user_stats_avg_grade", text("avg_grade DESC"), "user_pk"),
+    )
+    
+    # Agregados por usuário, mantidos pelos triggers ROLLUP_TRIGGERS na mesma
+    # transação de cada escrita em progresso/respostas (rebuild_stats.py recalcula)
+    user_pk = Column(Integer, ForeignKey("users.pk", ondelete="CASCADE"), primary_key=True)
+    videos_watched = Column(Integer, nullable=False, default=0, server_default="0")
+    contents_watched = Column(Integer, nullable=False, default=0, server_default="0")  # Conteúdos com ao menos 1 vídeo assistido
+    activities_completed = Column(Integer, nullable=False, default=0, server_default="0")  # Respostas com responded
+    grade_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    grade_count = Column(Integer, nullable=False, default=0, server_default="0")  # Respostas com grau_aprendizagem
+    avg_grade = Column(Float, Computed("CASE WHEN grade_count > 0 THEN grade_sum / grade_count ELSE 0 END", persisted=True))
+    last_activity_at = Column(TIMESTAMP, nullable=True)
+
+
+class ContentRollup(Base):
+    __tablename__ = "content_stats"
+    
+    # Agregados por conteúdo (mesmos triggers de UserRollup)
+    content_id = Column(String(36), ForeignKey("contents.id", ondelete="CASCADE"), primary_key=True)
+    videos_watched = Column(Integer, nullable=False, default=0, server_default="0")
+    unique_viewers = Column(Integer, nullable=False, default=0, server_default="0")  # Usuários com ao menos 1 vídeo assistido
+    activities_completed = Column(Integer, nullable=False, default=0, server_default="0")
+    grade_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    grade_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_activity_at = Column(TIMESTAMP, nullable=True)
+
+
+class _ActivityBucket:
+    """
+    Colunas comuns das séries temporais: um bucket por conteúdo e nível, com
+    '*' nas linhas que agregam todos (usuários ativos não se somam entre
+    linhas). Preenchidas pelo compactador de app.services.timeseries.
+    """
+    # Chave na ordem das consultas: dimensões fixas, intervalo de buckets
+    content_id = Column(String(36), primary_key=True)  # '*' = todos os conteúdos
+    nivel = Column(String(100), primary_key=True)  # nivel_educacional normalizado; '*' = todos, '' = sem nível
+    bucket_start = Column(TIMESTAMP, primary_key=True)  # UTC, início da hora/dia
+    watches = Column(Integer, nullable=False, default=0)
+    responses = Column(Integer, nullable=False, default=0)  # Respostas com responded
+    grade_sum = Column(Float, nullable=False, default=0.0)
+    grade_count = Column(Integer, nullable=False, default=0)
+    active_users = Column(Integer, nullable=False, default=0)  # Usuários distintos com vídeo ou resposta no bucket
+
+
+class ActivityHourly(_ActivityBucket, Base):
+    __tablename__ = "activity_hourly"
+
+
+class ActivityDaily(_ActivityBucket, Base):
+    __tablename__ = "activity_daily"
+
+
+# --- Triggers dos rollups (user_stats / content_stats) ------------------------
+# Cada linha de progresso assistida e cada resposta contribui para o usuário e
+# para o conteúdo do vídeo/atividade; INSERT soma, DELETE subtrai e UPDATE
+# subtrai a contribuição antiga e soma a nova. As cópias na migração 010 são
+# a fonte do esquema em bancos criados pelo alembic.
+
+def _watch_trigger_sql(row: str, sign: str) -> str:
+    """Soma (sign='+') ou subtrai (sign='-') uma linha de progresso assistida"""
+    content = f"(SELECT content_id FROM videos WHERE pk = {row}.video_pk)"
+    # 1 se não há outro vídeo assistido do mesmo usuário no mesmo conteúdo
+    only_watch = f"""(NOT EXISTS (
+            SELECT 1 FROM user_video_progress p JOIN videos v ON v.pk = p.video_pk
+            WHERE p.user_pk = {row}.user_pk AND p.watched IS 1 AND p.pk != {row}.pk AND v.content_id = {content}
+        ))"""
+    ensure = ""
+    activity = ""
+    if sign == "+":
+        ensure = f"""
+        INSERT OR IGNORE INTO user_stats (user_pk) VALUES ({row}.user_pk);
+        INSERT OR IGNORE INTO content_stats (content_id) SELECT content_id FROM videos WHERE pk = {row}.video_pk;"""
+        activity = ", last_activity_at = CURRENT_TIMESTAMP"
+    return f"""{ensure}
+        UPDATE user_stats SET
+            videos_watched = videos_watched {sign} 1,
+            contents_watched = contents_watched {sign} {only_watch}{activity}
+        WHERE user_pk = {row}.user_pk;
+        UPDATE content_stats SET
+            videos_watched = videos_watched {sign} 1,
+            unique_viewers = unique_viewers {sign} {only_watch}{activity}
+        WHERE content_id = {content};"""
+
+
+def _response_trigger_sql(row: str, sign: str) -> str:
+    """Soma (sign='+') ou subtrai (sign='-') a contribuição de uma resposta"""
+    content = f"(SELECT content_id FROM activities WHERE pk = {row}.activity_pk)"
+    totals = f"""activities_completed = activities_completed {sign} ({row}.responded IS 1),
+            grade_sum = grade_sum {sign} coalesce({row}.grau_aprendizagem, 0),
+            grade_count = grade_count {sign} ({row}.grau_aprendizagem IS NOT NULL)"""
+    ensure = ""
+    if sign == "+":
+        ensure = f"""
+        INSERT OR IGNORE INTO user_stats (user_pk) VALUES ({row}.user_pk);
+        INSERT OR IGNORE INTO content_stats (content_id) SELECT content_id FROM activities WHERE pk = {row}.activity_pk;"""
+        totals += ", last_activity_at = CURRENT_TIMESTAMP"
+    return f"""{ensure}
+        UPDATE user_stats SET {totals} WHERE user_pk = {row}.user_pk;
+        UPDATE content_stats SET {totals} WHERE content_id = {content};"""
+
+
+_WATCH_CHANGED = "(OLD.watched IS NOT NEW.watched OR OLD.user_pk != NEW.user_pk OR OLD.video_pk != NEW.video_pk)"
+_RESPONSE_CHANGED = (
+    "(OLD.responded IS NOT NEW.responded OR OLD.grau_aprendizagem IS NOT NEW.grau_aprendizagem"
+    " OR OLD.user_pk != NEW.user_pk OR OLD.activity_pk != NEW.activity_pk)"
+)
+
+ROLLUP_TRIGGERS = {
+    # Toda linha de users/contents tem a sua linha de rollup (páginas do dashboard partem dela)
+    "trg_users_stats_insert": """
+        AFTER INSERT ON users BEGIN
+            INSERT OR IGNORE INTO user_stats (user_pk) VALUES (NEW.pk);
+        END""",
+    "trg_users_stats_delete": """
+        AFTER DELETE ON users BEGIN
+            DELETE FROM user_stats WHERE user_pk = OLD.pk;
+        END""",
+    "trg_contents_stats_insert": """
+        AFTER INSERT ON contents BEGIN
+            INSERT OR IGNORE INTO content_stats (content_id) VALUES (NEW.id);
+        END""",
+    "trg_contents_stats_delete": """
+        AFTER DELETE ON contents BEGIN
+            DELETE FROM content_stats WHERE content_id = OLD.id;
+        END""",
+    # O CASCADE das FKs apaga os fatos depois do vídeo/atividade, quando os
+    # triggers de fatos já não acham o content_id: apaga antes, com a linha viva
+    "trg_videos_stats_delete": """
+        BEFORE DELETE ON videos BEGIN
+            DELETE FROM user_video_progress WHERE video_pk = OLD.pk;
+        END""",
+    "trg_activities_stats_delete": """
+        BEFORE DELETE ON activities BEGIN
+            DELETE FROM user_activity_responses WHERE activity_pk = OLD.pk;
+        END""",
+    "trg_user_video_progress_stats_insert": f"""
+        AFTER INSERT ON user_video_progress WHEN NEW.watched IS 1 BEGIN{_watch_trigger_sql("NEW", "+")}
+        END""",
+    "trg_user_video_progress_stats_delete": f"""
+        AFTER DELETE ON user_video_progress WHEN OLD.watched IS 1 BEGIN{_watch_trigger_sql("OLD", "-")}
+        END""",
+    "trg_user_video_progress_stats_update_old": f"""
+        AFTER UPDATE OF watched, user_pk, video_pk ON user_video_progress
+        WHEN OLD.watched IS 1 AND {_WATCH_CHANGED} BEGIN{_watch_trigger_sql("OLD", "-")}
+        END""",
+    "trg_user_video_progress_stats_update_new": f"""
+        AFTER UPDATE OF watched, user_pk, video_pk ON user_video_progress
+        WHEN NEW.watched IS 1 AND {_WATCH_CHANGED} BEGIN{_watch_trigger_sql("NEW", "+")}
+        END""",
+    "trg_user_activity_responses_stats_insert": f"""
+        AFTER INSERT ON user_activity_responses BEGIN{_response_trigger_sql("NEW", "+")}
+        END""",
+    "trg_user_activity_responses_stats_delete": f"""
+        AFTER DELETE ON user_activity_responses BEGIN{_response_trigger_sql("OLD", "-")}
+        END""",
+    "trg_user_activity_responses_stats_update": f"""
+        AFTER UPDATE OF responded, grau_aprendizagem, user_pk, activity_pk ON user_activity_responses
+        WHEN {_RESPONSE_CHANGED} BEGIN{_response_trigger_sql("OLD", "-")}{_response_trigger_sql("NEW", "+")}
+        END""",
+}
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_rollup_triggers(target, connection, **kw):
+    """create_all (init_new_db.py, scripts) cria os triggers junto com as tabelas"""
+    for name, body in ROLLUP_TRIGGERS.items():
+        connection.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
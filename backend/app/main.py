@@ -1,8 +1,21 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from app.routers import users, videos, progress, dashboard, contents, activities, activity_responses, dashboard_frontend
-from app.config import UPLOAD_DIR, AUDIO_UPLOAD_DIR
+from app.routers import users, videos, progress, dashboard, contents, activities, activity_responses, dashboard_frontend, jobs, uploads
+from app.config import UPLOAD_DIR, AUDIO_UPLOAD_DIR, SLOW_QUERY_THRESHOLD_MS
+from app.database import SessionLocal, async_engine, get_database_settings, get_db
+from app.services.jobs import mark_interrupted_jobs
+from app.services.upload_sessions import run_gc_loop as run_upload_session_gc
+from app.services import audio_pipeline
+from app.services.write_queue import writer
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.services.circuit_breaker import get_breakers_status
+from app.services.deadline import RequestDeadlineMiddleware
+from app.services.query_stats import QueryStatsMiddleware, top_slow_queries
+from app.services.stats_cache import stats_cache
+from app.services.leaderboard import leaderboard, run_rebuild_loop as run_leaderboard_rebuild
+from app.services.timeseries import compactor, run_compactor_loop as run_timeseries_compactor
+import asyncio
 import logging
 import os
 
@@ -29,10 +42,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline por requisição (header X-Request-Timeout ou default da rota); respostas degradadas recebem X-Degraded
+app.add_middleware(RequestDeadlineMiddleware)
+
+# Queries e tempo de banco por requisição (Server-Timing) e aviso de prováveis N+1
+app.add_middleware(QueryStatsMiddleware)
+
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(AUDIO_UPLOAD_DIR, exist_ok=True)
 
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# /uploads: Range, ETag e cache imutável para blobs (ou X-Accel-Redirect para o proxy)
+app.include_router(uploads.router, prefix="/uploads", tags=["Uploads"])
 
 @app.get("/health")
 def health_check():
@@ -42,6 +62,30 @@ def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/health/breakers")
+def circuit_breakers_status():
+    """Estado dos circuit breakers das dependências externas (LLM, YouTube)."""
+    return get_breakers_status()
+
+@app.get("/health/db")
+def database_status():
+    """Configuração efetiva do SQLite, estatísticas da fila de escrita (group commit) e do cache de estatísticas."""
+    return {
+        "settings": get_database_settings(),
+        "write_queue": writer.stats(),
+        "stats_cache": stats_cache.stats(),
+        "leaderboard": leaderboard.stats(),
+        "timeseries": compactor.stats()
+    }
+
+@app.get("/health/db/slow-queries")
+def slow_queries(limit: int = 20, db: Session = Depends(get_db)):
+    """Queries acima de SLOW_QUERY_THRESHOLD_MS, por formato, ordenadas pelo tempo total (com o último EXPLAIN)."""
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "queries": top_slow_queries(db, min(max(limit, 1), 200))
+    }
+
 @app.get("/")
 def root():
     return {
@@ -98,14 +142,59 @@ app.include_router(
     tags=["Dashboard Frontend"]
 )
 
+app.include_router(
+    jobs.router,
+    prefix="/api/v1/jobs",
+    tags=["Jobs"]
+)
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("FeedBreak API starting up...")
+    try:
+        logger.info(f"Database settings: {get_database_settings()}")
+    except Exception as e:
+        logger.warning(f"Could not read database settings: {str(e)}")
+    db = SessionLocal()
+    try:
+        interrupted = mark_interrupted_jobs(db)
+        if interrupted:
+            logger.info(f"{interrupted} background job(s) marked as interrupted; resume via POST /api/v1/jobs/{{id}}/resume")
+    except Exception as e:
+        logger.warning(f"Could not check background jobs: {str(e)}")
+    finally:
+        db.close()
+    # Ranking em memória (atualizado incrementalmente a cada resposta depois daqui e reconstruído periodicamente)
+    try:
+        ranked = await run_in_threadpool(leaderboard.rebuild)
+        logger.info(f"Leaderboard loaded: {ranked} user(s)")
+    except Exception as e:
+        logger.warning(f"Could not load leaderboard: {str(e)}")
+    app.state.leaderboard_rebuild = asyncio.create_task(run_leaderboard_rebuild())
+    # Coleta de sessões de upload retomável abandonadas
+    app.state.upload_session_gc = asyncio.create_task(run_upload_session_gc())
+    # Compactador das séries temporais de atividade (/dashboard/timeseries)
+    app.state.timeseries_compactor = asyncio.create_task(run_timeseries_compactor())
+    # Thread dona da conexão de escrita (group commit)
+    writer.start()
+    # Transcrição e avaliação das respostas em áudio (retoma o que ficou pendente)
+    try:
+        audio_pipeline.start_workers()
+    except Exception as e:
+        logger.warning(f"Could not start audio pipeline: {str(e)}")
     logger.info("API documentation available at /docs")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("FeedBreak API shutting down...")
+    for task_name in ("upload_session_gc", "timeseries_compactor", "leaderboard_rebuild"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+    await audio_pipeline.stop_workers()
+    # Grava o que ainda está na fila de escrita antes de sair
+    await run_in_threadpool(writer.stop)
+    await async_engine.dispose()
 
 if __name__ == "__main__":
     import uvicorn
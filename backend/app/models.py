@@ -116,6 +116,33 @@ class UserActivityResponseDetail(BaseModel):
     created_at: datetime
 
 
+class UploadSessionCreate(BaseModel):
+    device_id: str
+    activity_id: str
+    filename: str = "audio.mp3"  # Só a extensão é usada
+    upload_length: Optional[int] = Field(None, ge=1)  # Tamanho total, se conhecido
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    upload_offset: int
+    upload_length: Optional[int]
+    status: str
+    response_id: Optional[str]
+    expires_at: datetime
+
+
+class AudioTranscriptionResponse(BaseModel):
+    response_id: str
+    status: str  # pending, transcribing, grading, completed, failed
+    engine: Optional[str]
+    duration_seconds: Optional[float]
+    transcript: Optional[str]
+    grau_aprendizagem: Optional[float]
+    attempts: int
+    error: Optional[str]
+    updated_at: Optional[datetime]
+
+
 class NextVideoResponse(BaseModel):
     video: Optional[VideoResponse]
     watched_count: int
@@ -123,6 +150,14 @@ class NextVideoResponse(BaseModel):
     next_activity: Optional[ActivityResponse] = None
 
 
+class AnswerAnalysis(BaseModel):
+    quality_score: float = Field(..., ge=0.0, le=1.0, description="Score de 0.0 a 1.0")
+    passed: bool = Field(..., description="True se score >= 0.6")
+    concepts_identified: List[str] = Field(default_factory=list)
+    missing_concepts: List[str] = Field(default_factory=list)
+    feedback: str
+
+
 class DashboardStats(BaseModel):
     total_users: int
     total_videos: int
@@ -139,3 +174,44 @@ class UserStats(BaseModel):
     activities_completed: int
     avg_grau_aprendizagem: Optional[float]
     last_active: Optional[datetime]
+
+class ContentStats(BaseModel):
+    content_id: str
+    content_title: str
+    publico_alvo: Optional[str]
+    total_videos: int
+    total_activities: int
+    total_watches: int
+    total_responses: int
+    avg_grau_aprendizagem: Optional[float]
+    unique_users: int
+    completion_rate: float
+
+
+class ActivityGenerationRequest(BaseModel):
+    category: str
+    activities_per_item: int = Field(3, ge=1, le=20)
+    per: str = Field("content", pattern="^(content|video)$")  # gerar N atividades por conteúdo ou por vídeo
+    concurrency: Optional[int] = Field(None, ge=1, le=32)
+
+class RegradeRequest(BaseModel):
+    activity_id: Optional[str] = None
+    content_id: Optional[str] = None
+    only_ungraded: bool = False
+    batch_size: int = Field(200, ge=1, le=1000)
+    concurrency: Optional[int] = Field(None, ge=1, le=32)
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    params: dict
+    total_items: int
+    processed_items: int
+    failed_items: int
+    progress: float
+    items_per_second: Optional[float]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
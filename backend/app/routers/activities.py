@@ -1,11 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.database import get_db
-from app.models import ActivityCreate, ActivityResponse
+from app.models import ActivityCreate, ActivityResponse, ActivityGenerationRequest, JobResponse
 from app.db_models import Activity, Content
+from app.services import jobs
+from app.services.activity_generation import JOB_KIND as ACTIVITY_GENERATION_JOB
+from app.services.agent import astream_educational_question, _parse_questions
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.deadline import DeadlineExceeded
+from app.services.write_queue import writer
+import json
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
@@ -43,6 +54,123 @@ def create_activity(activity_data: ActivityCreate, content_id: str, db: Session
         raise HTTPException(status_code=500, detail=f"Erro ao criar atividade: {str(e)}")
 
 
+@router.post("/generate", response_model=JobResponse, status_code=202)
+def generate_activities(
+    request: ActivityGenerationRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Inicia um job em background que gera N atividades por conteúdo (ou por vídeo)
+    de uma categoria. Acompanhe o progresso em GET /api/v1/jobs/{job_id}.
+    """
+    has_contents = db.query(Content.id).filter(
+        Content.category == request.category,
+        Content.is_active == True
+    ).first()
+    if not has_contents:
+        raise HTTPException(status_code=404, detail="Nenhum conteúdo ativo encontrado para a categoria")
+    
+    job = jobs.create_job(db, ACTIVITY_GENERATION_JOB, request.model_dump())
+    background_tasks.add_task(jobs.run_job, job.id, job.kind)
+    
+    return jobs.build_job_response(job)
+
+
+@router.get("/generate/stream")
+def stream_generated_activity(content_id: str, db: Session = Depends(get_db)):
+    """
+    Gera UMA atividade para o conteúdo transmitindo os tokens do modelo via
+    Server-Sent Events, à medida que chegam do provedor.
+    
+    Eventos:
+    - `token`: `{"text": "..."}` para cada pedaço da resposta do modelo
+    - `done`: `{"id", "content_id", "order_index", "pergunta_gerada", "conceito_avaliado"}` com a atividade salva
+    - `error`: `{"detail": "..."}` se a geração falhou (nada é salvo)
+    """
+    content = db.query(Content).filter(Content.id == content_id).first()
+    if not content:
+        raise HTTPException(status_code=404, detail="Conteúdo não encontrado")
+    
+    # Mesmo contexto do job de geração em lote; o stream não volta a tocar no banco até salvar
+    rag_text = "\n".join(filter(None, [content.title, content.description]))
+    nivel = content.publico_alvo
+    
+    async def event_stream():
+        chunks = []
+        try:
+            async for text in astream_educational_question(
+                rag_text=rag_text or None,
+                rag_path=None if rag_text else "app/data_rag/bncc.txt",
+                nivel_educacional=nivel
+            ):
+                chunks.append(text)
+                yield _sse_event("token", {"text": text})
+        except CircuitOpenError:
+            yield _sse_event("error", {"detail": "Provedor de IA indisponível no momento"})
+            return
+        except DeadlineExceeded:
+            yield _sse_event("error", {"detail": "Tempo da requisição esgotado durante a geração"})
+            return
+        except Exception as e:
+            logger.warning(f"Erro ao gerar atividade via stream para {content_id}: {str(e)}")
+            yield _sse_event("error", {"detail": f"Erro ao gerar atividade: {str(e)}"})
+            return
+        
+        questions = _parse_questions("".join(chunks))
+        question_data = questions[0] if questions and isinstance(questions[0], dict) else {}
+        question_text = question_data.get("pergunta_gerada")
+        if not question_text:
+            yield _sse_event("error", {"detail": "O modelo não retornou uma pergunta válida"})
+            return
+        
+        activity_id = str(uuid.uuid4())
+        try:
+            order_index = await writer.arun(
+                lambda session: _insert_generated_activity(session, activity_id, content_id, question_text)
+            )
+        except Exception as e:
+            logger.error(f"Erro ao salvar atividade gerada para {content_id}: {str(e)}")
+            yield _sse_event("error", {"detail": f"Erro ao salvar atividade: {str(e)}"})
+            return
+        
+        yield _sse_event("done", {
+            "id": activity_id,
+            "content_id": content_id,
+            "order_index": order_index,
+            "pergunta_gerada": question_text,
+            "conceito_avaliado": question_data.get("conceito_avaliado")
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # sem buffer no proxy: os tokens chegam ao cliente na hora
+        }
+    )
+
+
+def _insert_generated_activity(db: Session, activity_id: str, content_id: str, question: str) -> int:
+    """Unidade da fila de escrita: insere a atividade no fim do conteúdo e retorna o order_index"""
+    next_index = db.query(func.coalesce(func.max(Activity.order_index), -1)).filter(
+        Activity.content_id == content_id
+    ).scalar() + 1
+    db.execute(insert(Activity).values(
+        id=activity_id,
+        content_id=content_id,
+        question=question,
+        order_index=next_index
+    ))
+    return next_index
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    """Formata uma mensagem Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.get("/{activity_id}", response_model=ActivityResponse)
 def get_activity(activity_id: str, db: Session = Depends(get_db)):
     """
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, BackgroundTasks, Header, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from app.database import get_db
-from app.models import ActivityResponseCreate, ActivityResponseUpdate, UserActivityResponseDetail
-from app.db_models import UserActivityResponse, Activity, User
+from app.models import (
+    ActivityResponseCreate, ActivityResponseUpdate, UserActivityResponseDetail, RegradeRequest, JobResponse,
+    UploadSessionCreate, UploadSessionResponse, AudioTranscriptionResponse
+)
+from app.db_models import UserActivityResponse, Activity, User, UploadSession, AudioTranscription
 from app.config import AUDIO_UPLOAD_DIR
+from app.services import jobs
+from app.services.regrading import JOB_KIND as REGRADING_JOB
+from app.services import upload_sessions, audio_pipeline
+from app.services.write_queue import writer
+from app.services.uploads import UploadTooLargeError
+from app.services.audio_store import (
+    AUDIO_URL_PREFIX, store_audio, release_audio, is_blob_url, audio_path_from_url, delete_unreferenced_file
+)
 import uuid
 import os
 import logging
@@ -28,31 +41,33 @@ def create_response(response_data: ActivityResponseCreate, db: Session = Depends
     if not activity:
         raise HTTPException(status_code=404, detail="Atividade não encontrada")
     
-    try:
+    def write_response(session: Session) -> dict:
+        # Roda na thread de escrita, agrupada com outras escritas no mesmo commit
         user_response = UserActivityResponse(
             id=str(uuid.uuid4()),
-            user_id=user.id,
-            activity_id=response_data.activity_id,
+            user_pk=user.pk,
+            activity_pk=activity.pk,
             answer=response_data.answer,
             grau_aprendizagem=response_data.grau_aprendizagem,
             responded=response_data.responded
         )
-        db.add(user_response)
-        db.commit()
-        db.refresh(user_response)
+        session.add(user_response)
+        session.flush()
+        session.refresh(user_response)
         
-        return UserActivityResponseDetail(
-            id=user_response.id,
-            user_id=user_response.user_id,
-            activity_id=user_response.activity_id,
-            answer=user_response.answer,
-            grau_aprendizagem=user_response.grau_aprendizagem,
-            responded=user_response.responded,
-            created_at=user_response.created_at
-        )
+        return {
+            "id": user_response.id,
+            "user_id": user.id,
+            "activity_id": activity.id,
+            "answer": user_response.answer,
+            "grau_aprendizagem": user_response.grau_aprendizagem,
+            "responded": user_response.responded,
+            "created_at": user_response.created_at
+        }
     
+    try:
+        return UserActivityResponseDetail(**writer.run(write_response))
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao criar resposta: {str(e)}")
 
 
@@ -77,29 +92,27 @@ async def create_audio_response(
         raise HTTPException(status_code=404, detail="Atividade não encontrada")
     
     try:
-        # Salvar arquivo de áudio
+        # Salvar arquivo de áudio no blob store (deduplicado pelo SHA-256)
         file_extension = os.path.splitext(audio.filename)[1]
-        audio_filename = f"{uuid.uuid4()}{file_extension}"
-        audio_path = os.path.join(AUDIO_UPLOAD_DIR, audio_filename)
-        
-        with open(audio_path, "wb") as buffer:
-            content = await audio.read()
-            buffer.write(content)
+        stored = await store_audio(db, audio, file_extension)
         
         # URL relativa do áudio
-        audio_url = f"/uploads/audio/{audio_filename}"
+        audio_url = stored['url']
         
         # Criar resposta
         user_response = UserActivityResponse(
             id=str(uuid.uuid4()),
-            user_id=user.id,
-            activity_id=activity_id,
+            user_pk=user.pk,
+            activity_pk=activity.pk,
             answer=audio_url,  # URL do áudio
             responded=True
         )
         db.add(user_response)
+        # Transcrição e avaliação em background (GET /{response_id}/transcription)
+        transcription = audio_pipeline.create_transcription(db, user_response.id)
         db.commit()
         db.refresh(user_response)
+        audio_pipeline.submit(transcription.id)
         
         return UserActivityResponseDetail(
             id=user_response.id,
@@ -111,14 +124,194 @@ async def create_audio_response(
             created_at=user_response.created_at
         )
     
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         db.rollback()
-        # Tentar deletar o arquivo se algo der errado
-        if 'audio_path' in locals() and os.path.exists(audio_path):
-            os.remove(audio_path)
+        # Tentar deletar o arquivo se algo der errado e ninguém mais o referencia
+        if 'stored' in locals():
+            await run_in_threadpool(delete_unreferenced_file, db, audio_path_from_url(stored['url']), stored['url'])
         raise HTTPException(status_code=500, detail=f"Erro ao criar resposta de áudio: {str(e)}")
 
 
+def _build_upload_session_response(session: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session.id,
+        upload_offset=session.upload_offset,
+        upload_length=session.upload_length,
+        status=session.status,
+        response_id=session.response_id,
+        expires_at=session.expires_at
+    )
+
+
+def _get_upload_session(db: Session, session_id: str) -> UploadSession:
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada ou expirada")
+    return session
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+def create_upload_session(data: UploadSessionCreate, response: Response, db: Session = Depends(get_db)):
+    """
+    Inicia um upload de áudio retomável. Envie os blocos com
+    PATCH /uploads/{id} e finalize com POST /uploads/{id}/finalize.
+    """
+    user = db.query(User).filter(User.device_id == data.device_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    
+    activity = db.query(Activity).filter(Activity.id == data.activity_id).first()
+    if not activity:
+        raise HTTPException(status_code=404, detail="Atividade não encontrada")
+    
+    try:
+        session = upload_sessions.create_session(
+            db,
+            user_id=user.id,
+            activity_id=activity.id,
+            extension=os.path.splitext(data.filename)[1],
+            upload_length=data.upload_length
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    response.headers["Upload-Offset"] = "0"
+    return _build_upload_session_response(session)
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+def get_upload_session(session_id: str, response: Response, db: Session = Depends(get_db)):
+    """
+    Consulta o offset atual, para retomar o upload após uma falha de conexão
+    """
+    session = _get_upload_session(db, session_id)
+    response.headers["Upload-Offset"] = str(session.upload_offset)
+    return _build_upload_session_response(session)
+
+
+@router.patch("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., description="Offset em bytes onde este bloco começa"),
+    db: Session = Depends(get_db)
+):
+    """
+    Envia um bloco (corpo binário cru) a partir de Upload-Offset.
+    Se o offset não bate com o do servidor, responde 409 com o offset correto.
+    """
+    async with upload_sessions.session_lock(session_id):
+        session = await run_in_threadpool(_get_upload_session, db, session_id)
+        if session.status != upload_sessions.OPEN:
+            raise HTTPException(status_code=409, detail="Upload já finalizado")
+        
+        try:
+            new_offset = await upload_sessions.append_chunk(db, session, upload_offset, request.stream())
+        except upload_sessions.UploadOffsetMismatch as e:
+            raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.expected)})
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+    
+    response.headers["Upload-Offset"] = str(new_offset)
+    return _build_upload_session_response(session)
+
+
+def _response_detail(user_response: UserActivityResponse) -> UserActivityResponseDetail:
+    return UserActivityResponseDetail(
+        id=user_response.id,
+        user_id=user_response.user_id,
+        activity_id=user_response.activity_id,
+        answer=user_response.answer,
+        grau_aprendizagem=user_response.grau_aprendizagem,
+        responded=user_response.responded,
+        created_at=user_response.created_at
+    )
+
+
+def _finalized_response(db: Session, session_id: str) -> UserActivityResponseDetail:
+    """Resposta criada pelo finalize da sessão (chamadas repetidas ou de outro worker)"""
+    db.expire_all()
+    session = _get_upload_session(db, session_id)
+    user_response = db.query(UserActivityResponse).filter(UserActivityResponse.id == session.response_id).first()
+    if not user_response:
+        raise HTTPException(status_code=404, detail="Resposta do upload não encontrada")
+    return _response_detail(user_response)
+
+
+def _create_upload_response(db: Session, session: UploadSession, stored: dict):
+    """Cria a resposta e a transcrição e fecha a sessão na mesma transação (commit)"""
+    user_response = UserActivityResponse(
+        id=str(uuid.uuid4()),
+        user_pk=select(User.pk).where(User.id == session.user_id).scalar_subquery(),
+        activity_pk=select(Activity.pk).where(Activity.id == session.activity_id).scalar_subquery(),
+        answer=stored['url'],  # URL do áudio
+        responded=True
+    )
+    db.add(user_response)
+    transcription = audio_pipeline.create_transcription(db, user_response.id)
+    upload_sessions.mark_finalized(db, session, user_response.id)
+    db.commit()
+    db.refresh(user_response)
+    return _response_detail(user_response), transcription.id
+
+
+def _rollback_stored(db: Session, stored: Optional[dict]) -> None:
+    db.rollback()
+    if stored:
+        delete_unreferenced_file(db, audio_path_from_url(stored['url']), stored['url'])
+
+
+@router.post("/uploads/{session_id}/finalize", response_model=UserActivityResponseDetail, status_code=201)
+async def finalize_upload(session_id: str, db: Session = Depends(get_db)):
+    """
+    Conclui o upload: o áudio entra no blob store e a resposta é criada.
+    Chamadas repetidas devolvem a mesma resposta.
+    """
+    async with upload_sessions.session_lock(session_id):
+        session = await run_in_threadpool(_get_upload_session, db, session_id)
+        
+        if session.status == upload_sessions.FINALIZED:
+            return await run_in_threadpool(_finalized_response, db, session_id)
+        
+        stored = None
+        try:
+            stored = await upload_sessions.finalize_session(db, session, AUDIO_UPLOAD_DIR)
+            detail, transcription_id = await run_in_threadpool(_create_upload_response, db, session, stored)
+        except upload_sessions.UploadIncompleteError as e:
+            raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(session.upload_offset)})
+        except upload_sessions.UploadAlreadyFinalized:
+            # Outro worker finalizou primeiro: desfaz esta referência e devolve a resposta dele
+            await run_in_threadpool(_rollback_stored, db, stored)
+            return await run_in_threadpool(_finalized_response, db, session_id)
+        except Exception as e:
+            await run_in_threadpool(_rollback_stored, db, stored)
+            raise HTTPException(status_code=500, detail=f"Erro ao finalizar upload: {str(e)}")
+        
+        audio_pipeline.submit(transcription_id)
+        upload_sessions.discard_part(session_id)
+    
+    return detail
+
+
+@router.post("/regrade", response_model=JobResponse, status_code=202)
+def regrade_responses(
+    request: RegradeRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Inicia um job em background que recalcula grau_aprendizagem das respostas
+    de texto com o avaliador atual. Acompanhe em GET /api/v1/jobs/{job_id}.
+    """
+    job = jobs.create_job(db, REGRADING_JOB, request.model_dump())
+    background_tasks.add_task(jobs.run_job, job.id, job.kind)
+    
+    return jobs.build_job_response(job)
+
+
 @router.get("/{response_id}", response_model=UserActivityResponseDetail)
 def get_response(response_id: str, db: Session = Depends(get_db)):
     """
@@ -140,6 +333,32 @@ def get_response(response_id: str, db: Session = Depends(get_db)):
     )
 
 
+@router.get("/{response_id}/transcription", response_model=AudioTranscriptionResponse)
+def get_response_transcription(response_id: str, db: Session = Depends(get_db)):
+    """
+    Andamento da transcrição e avaliação de uma resposta em áudio
+    """
+    row = db.query(AudioTranscription, UserActivityResponse.grau_aprendizagem).join(
+        UserActivityResponse, AudioTranscription.response_id == UserActivityResponse.id
+    ).filter(AudioTranscription.response_id == response_id).first()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Transcrição não encontrada para esta resposta")
+    
+    transcription, grau = row
+    return AudioTranscriptionResponse(
+        response_id=transcription.response_id,
+        status=transcription.status,
+        engine=transcription.engine,
+        duration_seconds=transcription.duration_seconds,
+        transcript=transcription.transcript,
+        grau_aprendizagem=grau,
+        attempts=transcription.attempts,
+        error=transcription.error,
+        updated_at=transcription.updated_at
+    )
+
+
 @router.get("/", response_model=List[UserActivityResponseDetail])
 def list_responses(
     user_device_id: Optional[str] = None,
@@ -162,10 +381,12 @@ def list_responses(
     if user_device_id:
         user = db.query(User).filter(User.device_id == user_device_id).first()
         if user:
-            query = query.filter(UserActivityResponse.user_id == user.id)
+            query = query.filter(UserActivityResponse.user_pk == user.pk)
     
     if activity_id:
-        query = query.filter(UserActivityResponse.activity_id == activity_id)
+        query = query.filter(
+            UserActivityResponse.activity_pk == select(Activity.pk).where(Activity.id == activity_id).scalar_subquery()
+        )
     
     responses = query.order_by(UserActivityResponse.created_at.desc()).offset(skip).limit(limit).all()
     
@@ -196,7 +417,13 @@ def update_response(
     if not response:
         raise HTTPException(status_code=404, detail="Resposta não encontrada")
     
+    released_url = None
+    released_path = None
     if update_data.answer is not None:
+        # Trocar um áudio por outra resposta libera a referência ao blob
+        if response.answer != update_data.answer and response.answer and is_blob_url(db, response.answer):
+            released_url = response.answer
+            released_path = release_audio(db, released_url)
         response.answer = update_data.answer
     if update_data.grau_aprendizagem is not None:
         response.grau_aprendizagem = update_data.grau_aprendizagem
@@ -207,6 +434,9 @@ def update_response(
         db.commit()
         db.refresh(response)
         
+        if released_path:
+            delete_unreferenced_file(db, released_path, released_url)
+        
         return UserActivityResponseDetail(
             id=response.id,
             user_id=response.user_id,
@@ -232,15 +462,23 @@ def delete_response(response_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Resposta não encontrada")
     
     try:
-        # Se for áudio, tentar deletar o arquivo
-        if response.answer and response.answer.startswith("/uploads/audio/"):
-            audio_filename = response.answer.split("/")[-1]
-            audio_path = os.path.join(AUDIO_UPLOAD_DIR, audio_filename)
+        # Se for áudio, liberar a referência; o arquivo só é apagado na última
+        audio_url = response.answer if response.answer and response.answer.startswith(AUDIO_URL_PREFIX) else None
+        released_path = None
+        if audio_url and is_blob_url(db, audio_url):
+            released_path = release_audio(db, audio_url)
+        elif audio_url:
+            # Arquivo anterior ao blob store: sem contagem de referências
+            audio_path = audio_path_from_url(audio_url)
             if os.path.exists(audio_path):
                 os.remove(audio_path)
         
+        db.query(AudioTranscription).filter(AudioTranscription.response_id == response.id).delete(synchronize_session=False)
         db.delete(response)
         db.commit()
+        
+        if released_path:
+            delete_unreferenced_file(db, released_path, audio_url)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao deletar resposta: {str(e)}")
@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import case, func, select
 from typing import List, Optional
 from app.database import get_db
-from app.models import DashboardStats, UserStats
-from app.db_models import User, Content, Video, Activity, UserVideoProgress, UserActivityResponse
+from app.models import ContentStats, DashboardStats, UserStats
+from app.db_models import User, Content, Video, Activity, UserRollup, ContentRollup
+from app.services.leaderboard import GLOBAL, Scope, leaderboard, level_scope
+from app.services.stats_cache import set_cache_headers, stats_cache
+from app.services.timeseries import GRANULARITIES, MAX_BUCKETS, ceil_bucket, compactor, floor_bucket, get_timeseries, to_utc
 from datetime import datetime
 
 router = APIRouter()
 
 
 @router.get("/stats", response_model=DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db)):
+def get_dashboard_stats(response: Response, db: Session = Depends(get_db)):
     """
     Retorna estatísticas gerais do dashboard
+    
+    Servidas do cache stale-while-revalidate (headers Age e X-Cache).
     """
+    cached = stats_cache.get("dashboard", _compute_dashboard_stats, db)
+    set_cache_headers(response, cached)
+    return cached.value
+
+
+def _compute_dashboard_stats(db: Session) -> DashboardStats:
     # Total de usuários
     total_users = db.query(func.count(User.id)).scalar() or 0
     
@@ -24,28 +35,19 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
     # Total de atividades
     total_activities = db.query(func.count(Activity.id)).scalar() or 0
     
-    # Total de visualizações de vídeos
-    total_video_watches = db.query(func.count(UserVideoProgress.id)).filter(
-        UserVideoProgress.watched == True
-    ).scalar() or 0
-    
-    # Total de respostas de atividades
-    total_activity_responses = db.query(func.count(UserActivityResponse.id)).filter(
-        UserActivityResponse.responded == True
-    ).scalar() or 0
-    
-    # Média de grau de aprendizagem
-    avg_learning = db.query(func.avg(UserActivityResponse.grau_aprendizagem)).filter(
-        UserActivityResponse.grau_aprendizagem.isnot(None)
-    ).scalar() or 0.0
+    # Visualizações, respostas e grau médio somados dos rollups por usuário
+    total_video_watches, total_activity_responses, avg_learning = db.query(
+        func.coalesce(func.sum(UserRollup.videos_watched), 0),
+        func.coalesce(func.sum(UserRollup.activities_completed), 0),
+        func.sum(UserRollup.grade_sum) / func.nullif(func.sum(UserRollup.grade_count), 0)
+    ).one()
     
     # Conteúdo mais popular (mais vídeos assistidos)
-    most_popular = db.query(
-        Content.title,
-        func.count(UserVideoProgress.id).label('watch_count')
-    ).join(Video).join(UserVideoProgress).filter(
-        UserVideoProgress.watched == True
-    ).group_by(Content.id).order_by(desc('watch_count')).first()
+    most_popular = db.query(Content.title).join(
+        ContentRollup, ContentRollup.content_id == Content.id
+    ).filter(
+        ContentRollup.videos_watched > 0
+    ).order_by(ContentRollup.videos_watched.desc()).first()
     
     most_popular_content = most_popular[0] if most_popular else None
     
@@ -74,47 +76,133 @@ def get_users_stats(
         skip: Paginação
         limit: Limite de resultados
         order_by: Ordenar por (videos_watched, activities_completed, avg_grade)
+    
+    Lê uma linha de user_stats por usuário (rollup mantido pelos triggers);
+    a ordenação usa os índices do rollup antes do OFFSET/LIMIT, então cada
+    página segue a ordem global.
     """
-    users = db.query(User).offset(skip).limit(limit).all()
-    
-    users_stats = []
-    for user in users:
-        # Vídeos assistidos
-        videos_watched = db.query(func.count(UserVideoProgress.id)).filter(
-            UserVideoProgress.user_id == user.id,
-            UserVideoProgress.watched == True
-        ).scalar() or 0
-        
-        # Atividades completadas
-        activities_completed = db.query(func.count(UserActivityResponse.id)).filter(
-            UserActivityResponse.user_id == user.id,
-            UserActivityResponse.responded == True
-        ).scalar() or 0
-        
-        # Média de grau de aprendizagem
-        avg_learning = db.query(func.avg(UserActivityResponse.grau_aprendizagem)).filter(
-            UserActivityResponse.user_id == user.id,
-            UserActivityResponse.grau_aprendizagem.isnot(None)
-        ).scalar()
-        
-        users_stats.append(UserStats(
-            user_id=user.id,
-            user_nome=user.nome,
-            videos_watched=videos_watched,
-            activities_completed=activities_completed,
-            avg_grau_aprendizagem=round(float(avg_learning), 2) if avg_learning else None,
-            last_active=user.last_active_at
-        ))
-    
-    # Ordenar
+    query = select(
+        User.id,
+        User.nome,
+        User.last_active_at,
+        UserRollup.videos_watched,
+        UserRollup.activities_completed,
+        UserRollup.grade_count,
+        UserRollup.avg_grade
+    ).join(UserRollup, UserRollup.user_pk == User.pk)
+    
+    # Ordenar (desempate pela pk para a paginação ser estável)
     if order_by == "videos_watched":
-        users_stats.sort(key=lambda x: x.videos_watched, reverse=True)
+        query = query.order_by(UserRollup.videos_watched.desc(), UserRollup.user_pk)
     elif order_by == "activities_completed":
-        users_stats.sort(key=lambda x: x.activities_completed, reverse=True)
+        query = query.order_by(UserRollup.activities_completed.desc(), UserRollup.user_pk)
     elif order_by == "avg_grade":
-        users_stats.sort(key=lambda x: x.avg_grau_aprendizagem or 0, reverse=True)
+        query = query.order_by(UserRollup.avg_grade.desc(), UserRollup.user_pk)
+    else:
+        query = query.order_by(User.pk)
+    
+    rows = db.execute(query.offset(skip).limit(limit)).all()
+    
+    return [
+        UserStats(
+            user_id=row.id,
+            user_nome=row.nome,
+            videos_watched=row.videos_watched,
+            activities_completed=row.activities_completed,
+            avg_grau_aprendizagem=round(row.avg_grade, 2) if row.grade_count and row.avg_grade else None,
+            last_active=row.last_active_at
+        )
+        for row in rows
+    ]
+
+
+def _content_stats_query():
+    """
+    Estatísticas por conteúdo numa consulta: contagens de vídeos/atividades
+    por subconsulta correlacionada (índices por content_id) e o resto do
+    rollup content_stats. Devolve a consulta e as colunas ordenáveis.
+    """
+    total_videos = select(func.count()).where(Video.content_id == Content.id).scalar_subquery()
+    total_activities = select(func.count()).where(Activity.content_id == Content.id).scalar_subquery()
+    total_responses = func.coalesce(ContentRollup.activities_completed, 0)
+    
+    total_activities = total_activities.label("total_activities")
+    total_watches = func.coalesce(ContentRollup.videos_watched, 0).label("total_watches")
+    avg_grade = (ContentRollup.grade_sum / func.nullif(ContentRollup.grade_count, 0)).label("avg_grade")
+    completion_rate = case(
+        (total_activities > 0, total_responses * 100.0 / total_activities), else_=0
+    ).label("completion_rate")
     
-    return users_stats
+    query = select(
+        Content.id,
+        Content.title,
+        Content.publico_alvo,
+        total_videos.label("total_videos"),
+        total_activities,
+        total_watches,
+        total_responses.label("total_responses"),
+        avg_grade,
+        func.coalesce(ContentRollup.unique_viewers, 0).label("unique_users"),
+        completion_rate
+    ).outerjoin(ContentRollup, ContentRollup.content_id == Content.id)
+    
+    return query, {"completion_rate": completion_rate, "watches": total_watches, "avg_grade": avg_grade}
+
+
+def _build_content_stats(row) -> ContentStats:
+    return ContentStats(
+        content_id=row.id,
+        content_title=row.title,
+        publico_alvo=row.publico_alvo,
+        total_videos=row.total_videos,
+        total_activities=row.total_activities,
+        total_watches=row.total_watches,
+        total_responses=row.total_responses,
+        avg_grau_aprendizagem=round(float(row.avg_grade), 2) if row.avg_grade else None,
+        unique_users=row.unique_users,
+        completion_rate=round(row.completion_rate, 2)
+    )
+
+
+@router.get("/content-stats", response_model=List[ContentStats])
+def get_contents_stats(
+    content_id: Optional[List[str]] = Query(None),
+    publico_alvo: Optional[str] = None,
+    category: Optional[str] = None,
+    order_by: str = "completion_rate",  # completion_rate, watches, avg_grade
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna estatísticas de todos os conteúdos (ou dos filtrados) de uma vez
+    
+    Args:
+        content_id: Restringe a estes conteúdos (repetível: ?content_id=a&content_id=b)
+        publico_alvo, category: Filtros do conteúdo
+        order_by: Ordenar por (completion_rate, watches, avg_grade), decrescente
+        skip, limit: Paginação
+    
+    Mesmo formato de /content/{content_id}/stats, numa única consulta
+    ordenada e paginada no SQL.
+    """
+    query, sort_columns = _content_stats_query()
+    if content_id:
+        query = query.where(Content.id.in_(content_id))
+    if publico_alvo:
+        query = query.where(Content.publico_alvo == publico_alvo)
+    if category:
+        query = query.where(Content.category == category)
+    
+    # Desempate pelo id para a paginação ser estável
+    sort_column = sort_columns.get(order_by)
+    if sort_column is not None:
+        query = query.order_by(sort_column.desc().nulls_last(), Content.id)
+    else:
+        query = query.order_by(Content.id)
+    
+    rows = db.execute(query.offset(skip).limit(min(max(limit, 1), 500))).all()
+    return [_build_content_stats(row) for row in rows]
 
 
 @router.get("/content/{content_id}/stats")
@@ -122,87 +210,98 @@ def get_content_stats(content_id: str, db: Session = Depends(get_db)):
     """
     Retorna estatísticas de um conteúdo específico
     """
-    content = db.query(Content).filter(Content.id == content_id).first()
-    if not content:
+    query, _ = _content_stats_query()
+    row = db.execute(query.where(Content.id == content_id)).first()
+    if not row:
         return {"error": "Conteúdo não encontrado"}
     
-    # Total de vídeos
-    total_videos = db.query(func.count(Video.id)).filter(
-        Video.content_id == content_id
-    ).scalar() or 0
-    
-    # Total de atividades
-    total_activities = db.query(func.count(Activity.id)).filter(
-        Activity.content_id == content_id
-    ).scalar() or 0
-    
-    # Total de visualizações
-    total_watches = db.query(func.count(UserVideoProgress.id)).join(Video).filter(
-        Video.content_id == content_id,
-        UserVideoProgress.watched == True
-    ).scalar() or 0
-    
-    # Total de respostas
-    total_responses = db.query(func.count(UserActivityResponse.id)).join(Activity).filter(
-        Activity.content_id == content_id,
-        UserActivityResponse.responded == True
-    ).scalar() or 0
-    
-    # Média de grau de aprendizagem
-    avg_learning = db.query(func.avg(UserActivityResponse.grau_aprendizagem)).join(Activity).filter(
-        Activity.content_id == content_id,
-        UserActivityResponse.grau_aprendizagem.isnot(None)
-    ).scalar()
-    
-    # Usuários únicos que assistiram
-    unique_users = db.query(func.count(func.distinct(UserVideoProgress.user_id))).join(Video).filter(
-        Video.content_id == content_id,
-        UserVideoProgress.watched == True
-    ).scalar() or 0
-    
-    return {
-        "content_id": content_id,
-        "content_title": content.title,
-        "publico_alvo": content.publico_alvo,
-        "total_videos": total_videos,
-        "total_activities": total_activities,
-        "total_watches": total_watches,
-        "total_responses": total_responses,
-        "avg_grau_aprendizagem": round(float(avg_learning), 2) if avg_learning else None,
-        "unique_users": unique_users,
-        "completion_rate": round((total_responses / total_activities * 100), 2) if total_activities > 0 else 0
-    }
+    return _build_content_stats(row)
+
+
+def _leaderboard_scope(content_id: Optional[str], nivel: Optional[str]) -> Scope:
+    if content_id and nivel:
+        raise HTTPException(status_code=400, detail="Use content_id ou nivel, não os dois")
+    if content_id:
+        return ("content", content_id)
+    return level_scope(nivel) or GLOBAL
 
 
 @router.get("/leaderboard")
-def get_leaderboard(limit: int = 10, db: Session = Depends(get_db)):
+def get_leaderboard(limit: int = 10, content_id: Optional[str] = None, nivel: Optional[str] = None):
     """
     Retorna um ranking dos usuários com melhor desempenho
+    
+    Args:
+        limit: Número de usuários
+        content_id: Ranking de um conteúdo (só respostas das atividades dele)
+        nivel: Ranking de um nível educacional (ex: fundamental, medio)
+    
+    Lido do ranking em memória (app.services.leaderboard), atualizado em
+    background a cada resposta criada ou reavaliada e a cada alteração de perfil.
     """
-    # Buscar usuários com pelo menos 1 resposta
-    users_with_responses = db.query(
-        User.id,
-        User.nome,
-        func.count(UserActivityResponse.id).label('total_responses'),
-        func.avg(UserActivityResponse.grau_aprendizagem).label('avg_grade')
-    ).join(UserActivityResponse).filter(
-        UserActivityResponse.responded == True,
-        UserActivityResponse.grau_aprendizagem.isnot(None)
-    ).group_by(User.id).having(
-        func.count(UserActivityResponse.id) > 0
-    ).all()
-    
-    # Criar ranking
-    leaderboard = []
-    for user in users_with_responses:
-        leaderboard.append({
-            "user_id": user.id,
-            "user_nome": user.nome,
-            "total_responses": user.total_responses,
-            "avg_grau_aprendizagem": round(float(user.avg_grade), 2)
-        })
-    
-    # Ordenar por média de aprendizagem
-    leaderboard.sort(key=lambda x: x['avg_grau_aprendizagem'], reverse=True)
-    
-    return leaderboard[:limit]
+    leaderboard.ensure_ready()
+    return leaderboard.top(_leaderboard_scope(content_id, nivel), min(max(limit, 1), 1000))
+
+
+@router.get("/leaderboard/users/{user_id}")
+def get_leaderboard_position(user_id: str, content_id: Optional[str] = None, nivel: Optional[str] = None):
+    """
+    Retorna a posição de um usuário no ranking (geral, por conteúdo ou por nível)
+    """
+    leaderboard.ensure_ready()
+    position = leaderboard.rank(user_id, _leaderboard_scope(content_id, nivel))
+    if position is None:
+        raise HTTPException(status_code=404, detail="Usuário sem respostas avaliadas neste ranking")
+    return position
+
+
+@router.get("/timeseries")
+def get_activity_timeseries(
+    granularity: str = "day",  # day, hour
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    content_id: Optional[str] = None,
+    nivel: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna a série temporal de atividade (vídeos assistidos, respostas,
+    usuários ativos e grau médio por bucket)
+    
+    Args:
+        granularity: day ou hour
+        start, end: Intervalo [start, end) em UTC (com fuso, é convertido; padrão:
+            últimos 30 dias / últimas 48 horas). start desce e end sobe até o
+            limite de bucket mais próximo
+        content_id: Só um conteúdo (padrão: todos)
+        nivel: Só um nível educacional (padrão: todos)
+    
+    Lida das tabelas activity_daily/activity_hourly (app.services.timeseries),
+    uma linha por bucket; dados até a última passada do compactador.
+    O filtro nivel usa o nível atual de cada usuário (não o da época do
+    evento) e cada vídeo conta uma vez por usuário, na data de watched_at.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity deve ser day ou hour")
+    step = GRANULARITIES[granularity][2]
+    
+    # Intervalo [start, end) alinhado aos buckets; sem end, inclui o bucket corrente
+    if end:
+        end = ceil_bucket(to_utc(end), granularity)
+    else:
+        end = floor_bucket(datetime.utcnow(), granularity) + step
+    start = floor_bucket(to_utc(start), granularity) if start else end - step * (30 if granularity == "day" else 48)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start deve ser anterior a end")
+    if (end - start) / step > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Intervalo grande demais: máximo {MAX_BUCKETS} buckets")
+    
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "content_id": content_id,
+        "nivel": nivel,
+        "compacted_until": compactor.compacted_until,
+        "points": get_timeseries(db, granularity, start, end, content_id, nivel)
+    }
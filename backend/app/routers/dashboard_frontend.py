@@ -2,12 +2,13 @@
 Router específico para integração com o frontend do dashboard
 Transforma os dados da nova estrutura para o formato esperado pelo frontend
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List
 from app.database import get_db
-from app.db_models import User, Content, Video, Activity, UserVideoProgress, UserActivityResponse
+from app.db_models import User, Content, Video, Activity, UserVideoProgress, UserActivityResponse, UserRollup
+from app.services.stats_cache import set_cache_headers, stats_cache
 
 router = APIRouter()
 
@@ -57,9 +58,9 @@ def get_students_for_dashboard(db: Session = Depends(get_db)):
         
         # 1. Vídeos assistidos (tipo: video)
         videos_watched = db.query(UserVideoProgress, Video).join(
-            Video, UserVideoProgress.video_id == Video.id
+            Video, UserVideoProgress.video_pk == Video.pk
         ).filter(
-            UserVideoProgress.user_id == user.id,
+            UserVideoProgress.user_pk == user.pk,
             UserVideoProgress.watched == True
         ).all()
         
@@ -75,9 +76,9 @@ def get_students_for_dashboard(db: Session = Depends(get_db)):
         
         # 2. Atividades respondidas (tipo: atividade)
         activities_responded = db.query(UserActivityResponse, Activity).join(
-            Activity, UserActivityResponse.activity_id == Activity.id
+            Activity, UserActivityResponse.activity_pk == Activity.pk
         ).filter(
-            UserActivityResponse.user_id == user.id,
+            UserActivityResponse.user_pk == user.pk,
             UserActivityResponse.responded == True
         ).all()
         
@@ -104,8 +105,8 @@ def get_students_for_dashboard(db: Session = Depends(get_db)):
             if not already_added:
                 # Verificar se existe progresso
                 has_progress = db.query(UserVideoProgress).filter(
-                    UserVideoProgress.user_id == user.id,
-                    UserVideoProgress.video_id == video.id
+                    UserVideoProgress.user_pk == user.pk,
+                    UserVideoProgress.video_pk == video.pk
                 ).first()
                 
                 if not has_progress:
@@ -131,28 +132,28 @@ def get_students_for_dashboard(db: Session = Depends(get_db)):
 
 
 @router.get("/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
+def get_dashboard_stats(response: Response, db: Session = Depends(get_db)):
     """
     Retorna estatísticas gerais para o dashboard
+    
+    Servidas do cache stale-while-revalidate (headers Age e X-Cache).
     """
+    cached = stats_cache.get("dashboard-frontend", _compute_dashboard_stats, db)
+    set_cache_headers(response, cached)
+    return cached.value
+
+
+def _compute_dashboard_stats(db: Session) -> dict:
     total_students = db.query(func.count(User.id)).scalar() or 0
     total_videos = db.query(func.count(Video.id)).scalar() or 0
     total_activities = db.query(func.count(Activity.id)).scalar() or 0
     
-    # Total de vídeos assistidos
-    videos_watched = db.query(func.count(UserVideoProgress.id)).filter(
-        UserVideoProgress.watched == True
-    ).scalar() or 0
-    
-    # Total de atividades respondidas
-    activities_completed = db.query(func.count(UserActivityResponse.id)).filter(
-        UserActivityResponse.responded == True
-    ).scalar() or 0
-    
-    # Média de grau de aprendizagem
-    avg_learning = db.query(func.avg(UserActivityResponse.grau_aprendizagem)).filter(
-        UserActivityResponse.grau_aprendizagem.isnot(None)
-    ).scalar() or 0.0
+    # Vídeos assistidos, atividades respondidas e grau médio dos rollups por usuário
+    videos_watched, activities_completed, avg_learning = db.query(
+        func.coalesce(func.sum(UserRollup.videos_watched), 0),
+        func.coalesce(func.sum(UserRollup.activities_completed), 0),
+        func.sum(UserRollup.grade_sum) / func.nullif(func.sum(UserRollup.grade_count), 0)
+    ).one()
     
     return {
         'totalStudents': total_students,
@@ -198,13 +199,10 @@ def get_content_distribution(db: Session = Depends(get_db)):
     """
     Retorna distribuição de tipos de conteúdo
     """
-    total_videos = db.query(func.count(UserVideoProgress.id)).filter(
-        UserVideoProgress.watched == True
-    ).scalar() or 0
-    
-    total_activities = db.query(func.count(UserActivityResponse.id)).filter(
-        UserActivityResponse.responded == True
-    ).scalar() or 0
+    total_videos, total_activities = db.query(
+        func.coalesce(func.sum(UserRollup.videos_watched), 0),
+        func.coalesce(func.sum(UserRollup.activities_completed), 0)
+    ).one()
     
     return {
         'video': total_videos,
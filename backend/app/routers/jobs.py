@@ -0,0 +1,72 @@
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_db
+from app.models import JobResponse
+from app.db_models import BackgroundJob
+from app.services import jobs
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[JobResponse])
+def list_jobs(
+    kind: Optional[str] = None,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """
+    Lista jobs em background
+    
+    Args:
+        kind: Filtrar por tipo (ex: activity_generation)
+        status: Filtrar por status (pending, running, completed, failed, interrupted)
+        skip: Paginação
+        limit: Limite de resultados
+    """
+    query = db.query(BackgroundJob)
+    
+    if kind:
+        query = query.filter(BackgroundJob.kind == kind)
+    if status:
+        query = query.filter(BackgroundJob.status == status)
+    
+    job_list = query.order_by(BackgroundJob.created_at.desc()).offset(skip).limit(limit).all()
+    
+    return [jobs.build_job_response(job) for job in job_list]
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Retorna status, progresso e vazão de um job
+    """
+    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    return jobs.build_job_response(job)
+
+
+@router.post("/{job_id}/resume", response_model=JobResponse, status_code=202)
+def resume_job(job_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Retoma um job interrompido ou com falhas a partir do último checkpoint
+    """
+    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    if jobs.is_running(job.id) or jobs.lease_active(job):
+        raise HTTPException(status_code=409, detail="Job já está em execução")
+    
+    if job.status == jobs.COMPLETED and not job.failed_items:
+        raise HTTPException(status_code=409, detail="Job já foi concluído")
+    
+    background_tasks.add_task(jobs.run_job, job.id, job.kind)
+    
+    return jobs.build_job_response(job)
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models import VideoProgressCreate, VideoProgressResponse, NextVideoResponse, VideoResponse, ActivityResponse
-from app.db_models import UserVideoProgress, User, Video, Activity, Content, UserActivityResponse
+from app.db_models import UserVideoProgress, User, Video, Activity, UserActivityResponse, UserRollup
 from app.routers.videos import _build_video_response
+from app.services.write_queue import writer
 import uuid
 
 router = APIRouter()
@@ -16,63 +20,45 @@ def mark_video_watched(progress_data: VideoProgressCreate, db: Session = Depends
     """
     Marca um vídeo como assistido para um usuário
     """
-    # Buscar usuário pelo device_id
-    user = db.query(User).filter(User.device_id == progress_data.device_id).first()
-    if not user:
+    # Buscar usuário pelo device_id e verificar se o vídeo existe (uma ida ao banco)
+    row = db.execute(
+        select(User.pk, User.id, select(Video.pk).where(Video.id == progress_data.video_id).scalar_subquery())
+        .where(User.device_id == progress_data.device_id)
+    ).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    
-    # Verificar se o vídeo existe
-    video = db.query(Video).filter(Video.id == progress_data.video_id).first()
-    if not video:
+    user_pk, user_id, video_pk = row
+    if not video_pk:
         raise HTTPException(status_code=404, detail="Vídeo não encontrado")
     
-    # Verificar se já existe progresso
-    existing_progress = db.query(UserVideoProgress).filter(
-        UserVideoProgress.user_id == user.id,
-        UserVideoProgress.video_id == progress_data.video_id
-    ).first()
-    
-    if existing_progress:
-        # Atualizar progresso existente
-        existing_progress.watched = progress_data.watched
-        db.commit()
-        db.refresh(existing_progress)
-        
-        return VideoProgressResponse(
-            id=existing_progress.id,
-            user_id=existing_progress.user_id,
-            video_id=existing_progress.video_id,
-            watched=existing_progress.watched,
-            watched_at=existing_progress.watched_at
-        )
-    
-    # Criar novo progresso
-    try:
-        progress = UserVideoProgress(
+    def write_progress(session: Session) -> dict:
+        # Upsert em um único comando pela unique (user_pk, video_pk): chamadas
+        # concorrentes não duplicam o progresso (roda na thread de escrita)
+        stmt = sqlite_insert(UserVideoProgress).values(
             id=str(uuid.uuid4()),
-            user_id=user.id,
-            video_id=progress_data.video_id,
+            user_pk=user_pk,
+            video_pk=video_pk,
             watched=progress_data.watched
         )
-        db.add(progress)
-        db.commit()
-        db.refresh(progress)
-        
-        return VideoProgressResponse(
-            id=progress.id,
-            user_id=progress.user_id,
-            video_id=progress.video_id,
-            watched=progress.watched,
-            watched_at=progress.watched_at
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserVideoProgress.user_pk, UserVideoProgress.video_pk],
+            set_={"watched": stmt.excluded.watched}
+        ).returning(
+            UserVideoProgress.id,
+            UserVideoProgress.watched,
+            UserVideoProgress.watched_at
         )
+        row = session.execute(stmt).mappings().one()
+        return dict(row, user_id=user_id, video_id=progress_data.video_id)
     
+    try:
+        return VideoProgressResponse(**writer.run(write_progress))
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao registrar progresso: {str(e)}")
 
 
 @router.get("/next-video", response_model=NextVideoResponse)
-def get_next_video(device_id: str, content_id: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_next_video(device_id: str, content_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """
     Retorna o próximo vídeo não assistido e verifica se deve disparar E2E
     
@@ -81,28 +67,28 @@ def get_next_video(device_id: str, content_id: Optional[str] = None, db: Session
         content_id: ID do conteúdo (opcional, se não fornecido pega qualquer vídeo)
     """
     # Buscar usuário
-    user = db.query(User).filter(User.device_id == device_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    user = await _get_user_by_device(db, device_id)
     
     # Query para vídeos
-    query = db.query(Video).filter(Video.id.notin_(
-        db.query(UserVideoProgress.video_id).filter(
-            UserVideoProgress.user_id == user.id,
+    query = select(Video).where(Video.pk.notin_(
+        select(UserVideoProgress.video_pk).where(
+            UserVideoProgress.user_pk == user.pk,
             UserVideoProgress.watched == True
         )
     ))
     
     if content_id:
-        query = query.filter(Video.content_id == content_id)
+        query = query.where(Video.content_id == content_id)
     
-    next_video = query.order_by(Video.order_index).first()
+    next_video = (await db.execute(query.order_by(Video.order_index).limit(1))).scalars().first()
     
     # Contar vídeos assistidos
-    watched_count = db.query(func.count(UserVideoProgress.id)).filter(
-        UserVideoProgress.user_id == user.id,
-        UserVideoProgress.watched == True
-    ).scalar() or 0
+    watched_count = (await db.execute(
+        select(func.count(UserVideoProgress.pk)).where(
+            UserVideoProgress.user_pk == user.pk,
+            UserVideoProgress.watched == True
+        )
+    )).scalar() or 0
     
     # Verificar se deve disparar E2E
     should_trigger_e2e = False
@@ -114,15 +100,17 @@ def get_next_video(device_id: str, content_id: Optional[str] = None, db: Session
         
         # Se deve disparar E2E, buscar próxima atividade não respondida
         if should_trigger_e2e and next_video.content_id:
-            activity = db.query(Activity).filter(
-                Activity.content_id == next_video.content_id,
-                Activity.id.notin_(
-                    db.query(UserActivityResponse.activity_id).filter(
-                        UserActivityResponse.user_id == user.id,
-                        UserActivityResponse.responded == True
+            activity = (await db.execute(
+                select(Activity).where(
+                    Activity.content_id == next_video.content_id,
+                    Activity.pk.notin_(
+                        select(UserActivityResponse.activity_pk).where(
+                            UserActivityResponse.user_pk == user.pk,
+                            UserActivityResponse.responded == True
+                        )
                     )
-                )
-            ).order_by(Activity.order_index).first()
+                ).order_by(Activity.order_index).limit(1)
+            )).scalars().first()
             
             if activity:
                 next_activity = ActivityResponse(
@@ -133,7 +121,8 @@ def get_next_video(device_id: str, content_id: Optional[str] = None, db: Session
                     created_at=activity.created_at
                 )
     
-    video_response = _build_video_response(next_video, include_url=True) if next_video else None
+    # A URL vem do yt-dlp (rede, bloqueante): fora do event loop
+    video_response = await run_in_threadpool(_build_video_response, next_video, True) if next_video else None
     
     return NextVideoResponse(
         video=video_response,
@@ -144,7 +133,7 @@ def get_next_video(device_id: str, content_id: Optional[str] = None, db: Session
 
 
 @router.get("/user/{device_id}", response_model=List[VideoProgressResponse])
-def get_user_progress(device_id: str, content_id: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_user_progress(device_id: str, content_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """
     Retorna todo o progresso de um usuário
     
@@ -152,16 +141,14 @@ def get_user_progress(device_id: str, content_id: Optional[str] = None, db: Sess
         device_id: ID do dispositivo do usuário
         content_id: Filtrar por conteúdo específico (opcional)
     """
-    user = db.query(User).filter(User.device_id == device_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    user = await _get_user_by_device(db, device_id)
     
-    query = db.query(UserVideoProgress).filter(UserVideoProgress.user_id == user.id)
+    query = select(UserVideoProgress).where(UserVideoProgress.user_pk == user.pk)
     
     if content_id:
-        query = query.join(Video).filter(Video.content_id == content_id)
+        query = query.join(Video).where(Video.content_id == content_id)
     
-    progress_list = query.all()
+    progress_list = (await db.execute(query)).scalars().all()
     
     return [
         VideoProgressResponse(
@@ -175,37 +162,19 @@ def get_user_progress(device_id: str, content_id: Optional[str] = None, db: Sess
 
 
 @router.get("/stats/{device_id}")
-def get_user_stats(device_id: str, db: Session = Depends(get_db)):
+async def get_user_stats(device_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Retorna estatísticas de progresso do usuário
     """
-    user = db.query(User).filter(User.device_id == device_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    
-    # Total de vídeos assistidos
-    total_watched = db.query(func.count(UserVideoProgress.id)).filter(
-        UserVideoProgress.user_id == user.id,
-        UserVideoProgress.watched == True
-    ).scalar() or 0
-    
-    # Total de atividades respondidas
-    total_responses = db.query(func.count(UserActivityResponse.id)).filter(
-        UserActivityResponse.user_id == user.id,
-        UserActivityResponse.responded == True
-    ).scalar() or 0
-    
-    # Média de grau de aprendizagem
-    avg_learning = db.query(func.avg(UserActivityResponse.grau_aprendizagem)).filter(
-        UserActivityResponse.user_id == user.id,
-        UserActivityResponse.grau_aprendizagem.isnot(None)
-    ).scalar() or 0.0
+    user = await _get_user_by_device(db, device_id)
     
+    # Contadores do rollup user_stats (mantido pelos triggers a cada escrita)
+    rollup = await db.get(UserRollup, user.pk)
+    total_watched = rollup.videos_watched if rollup else 0
+    total_responses = rollup.activities_completed if rollup else 0
+    avg_learning = rollup.avg_grade if rollup and rollup.grade_count else 0.0
     # Conteúdos em progresso (tem pelo menos 1 vídeo assistido)
-    contents_in_progress = db.query(Content).join(Video).join(UserVideoProgress).filter(
-        UserVideoProgress.user_id == user.id,
-        UserVideoProgress.watched == True
-    ).distinct().count()
+    contents_in_progress = rollup.contents_watched if rollup else 0
     
     return {
         "user_id": user.id,
@@ -215,3 +184,11 @@ def get_user_stats(device_id: str, db: Session = Depends(get_db)):
         "avg_learning_grade": round(float(avg_learning), 2),
         "contents_in_progress": contents_in_progress
     }
+
+
+async def _get_user_by_device(db: AsyncSession, device_id: str) -> User:
+    result = await db.execute(select(User).where(User.device_id == device_id))
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    return user
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+from app.config import UPLOAD_DIR, UPLOADS_IMMUTABLE_MAX_AGE, UPLOADS_ACCEL_REDIRECT
+from app.services.file_serving import (
+    RangeFileResponse, RangeNotSatisfiable, resolve_upload_path, cache_headers, etag_matches, parse_range, is_regular_file
+)
+from mimetypes import guess_type
+from urllib.parse import quote
+import os
+
+router = APIRouter()
+
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_upload(file_path: str, request: Request):
+    """
+    Serve arquivos enviados (áudios) com suporte a Range, ETag e cache.
+    Blobs endereçados pelo conteúdo (audio/ab/cd/<sha256>.ext) são imutáveis.
+    """
+    path = resolve_upload_path(UPLOAD_DIR, file_path)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    if not is_regular_file(stat_result):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    
+    headers = cache_headers(file_path, stat_result, UPLOADS_IMMUTABLE_MAX_AGE)
+    
+    # Revalidação: o cliente já tem esta versão
+    if etag_matches(request.headers.get("if-none-match"), headers["etag"]):
+        return Response(status_code=304, headers=headers)
+    
+    media_type = guess_type(path)[0] or "application/octet-stream"
+    
+    # Modo proxy: nginx entrega o arquivo (e trata Range) a partir do mesmo caminho relativo
+    if UPLOADS_ACCEL_REDIRECT:
+        headers["x-accel-redirect"] = UPLOADS_ACCEL_REDIRECT.rstrip("/") + "/" + quote(file_path.lstrip("/"))
+        return Response(status_code=200, headers=headers, media_type=media_type)
+    
+    # If-Range: só honra o Range se o cliente ainda tem a mesma versão
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != headers["etag"]:
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, stat_result.st_size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={"content-range": f"bytes */{stat_result.st_size}"})
+    
+    return RangeFileResponse(
+        path,
+        stat_result,
+        byte_range=byte_range,
+        headers=headers,
+        media_type=media_type,
+        method=request.method
+    )
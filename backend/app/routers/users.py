@@ -1,95 +1,85 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.db_models import User
 from app.models import UserCreate, UserResponse
+from app.services.leaderboard import touch_users
 from datetime import datetime
+import uuid
 
 router = APIRouter()
 
+
+def _build_user_response(user: User) -> UserResponse:
+    return UserResponse(
+        id=str(user.id),
+        device_id=user.device_id,
+        nome=user.nome,
+        idade=user.idade,
+        interesses=user.interesses,
+        nivel_educacional=user.nivel_educacional,
+        created_at=user.created_at,
+        last_active_at=user.last_active_at
+    )
+
+
 @router.post("", response_model=UserResponse)
-async def create_or_update_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def create_or_update_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create or update user profile.
     Uses upsert logic: if device_id exists, updates profile; otherwise creates new user.
     """
     try:
-        # Check if user already exists
-        existing_user = db.query(User).filter(User.device_id == user_data.device_id).first()
-        
-        if existing_user:
-            # Update existing user
-            existing_user.nome = user_data.nome
-            existing_user.idade = user_data.idade
-            existing_user.interesses = user_data.interesses
-            existing_user.nivel_educacional = user_data.nivel_educacional
-            existing_user.last_active_at = datetime.now()
-            
-            db.commit()
-            db.refresh(existing_user)
-            
-            return UserResponse(
-                id=str(existing_user.id),
-                device_id=existing_user.device_id,
-                nome=existing_user.nome,
-                idade=existing_user.idade,
-                interesses=existing_user.interesses,
-                nivel_educacional=existing_user.nivel_educacional,
-                created_at=existing_user.created_at,
-                last_active_at=existing_user.last_active_at
-            )
-        else:
-            # Create new user
-            new_user = User(
-                device_id=user_data.device_id,
-                nome=user_data.nome,
-                idade=user_data.idade,
-                interesses=user_data.interesses,
-                nivel_educacional=user_data.nivel_educacional,
-                last_active_at=datetime.now()
-            )
-            
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            
-            return UserResponse(
-                id=str(new_user.id),
-                device_id=new_user.device_id,
-                nome=new_user.nome,
-                idade=new_user.idade,
-                interesses=new_user.interesses,
-                nivel_educacional=new_user.nivel_educacional,
-                created_at=new_user.created_at,
-                last_active_at=new_user.last_active_at
-            )
-    
+        # Single-statement upsert on the unique device_id: concurrent calls for
+        # the same device cannot create duplicates, and RETURNING hands back the row
+        stmt = sqlite_insert(User).values(
+            id=str(uuid.uuid4()),
+            device_id=user_data.device_id,
+            nome=user_data.nome,
+            idade=user_data.idade,
+            interesses=user_data.interesses,
+            nivel_educacional=user_data.nivel_educacional,
+            last_active_at=datetime.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.device_id],
+            set_={
+                "nome": stmt.excluded.nome,
+                "idade": stmt.excluded.idade,
+                "interesses": stmt.excluded.interesses,
+                "nivel_educacional": stmt.excluded.nivel_educacional,
+                "last_active_at": stmt.excluded.last_active_at,
+                "updated_at": func.now()
+            }
+        ).returning(User)
+
+        user = (await db.scalars(stmt, execution_options={"populate_existing": True})).one()
+        # Upsert em Core não passa pelo flush do ORM: avisa o ranking (nome/nível)
+        touch_users(db, [user.pk])
+        await db.commit()
+
+        return _build_user_response(user)
+
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating/updating user: {str(e)}")
 
 @router.get("/{device_id}", response_model=UserResponse)
-async def get_user(device_id: str, db: Session = Depends(get_db)):
+async def get_user(device_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get user profile by device_id.
     """
     try:
-        user = db.query(User).filter(User.device_id == device_id).first()
-        
+        result = await db.execute(select(User).where(User.device_id == device_id))
+        user = result.scalars().first()
+
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        
-        return UserResponse(
-            id=str(user.id),
-            device_id=user.device_id,
-            nome=user.nome,
-            idade=user.idade,
-            interesses=user.interesses,
-            nivel_educacional=user.nivel_educacional,
-            created_at=user.created_at,
-            last_active_at=user.last_active_at
-        )
-    
+
+        return _build_user_response(user)
+
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,215 @@
+"""
+Job em background que gera atividades E2E em lote para todos os conteúdos
+(ou vídeos) de uma categoria, tirando o custo de geração do caminho das
+requisições dos usuários.
+
+- concorrência limitada: `concurrency` workers consomem a fila de alvos
+- checkpoint: cada alvo concluído é gravado no job na mesma transação do
+  insert das atividades, então retomar o job nunca duplica atividades
+- insert em lote: as N atividades de um alvo entram num único INSERT
+- circuit breaker próprio (llm_jobs): falhas do provedor durante o job não
+  abrem o breaker `llm` das requisições dos usuários
+- fora do event loop: o setup e o fechamento do job rodam numa thread com
+  sessão própria, e cada alvo concluído (ou falho) é uma unidade da fila de
+  escrita única (app.services.write_queue)
+"""
+import asyncio
+import logging
+import uuid
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from app.config import JOB_CONCURRENCY
+from app.database import SessionLocal
+from app.db_models import Activity, BackgroundJob, Content, Video
+from app.services import jobs
+from app.services.agent import generate_educational_questions
+from app.services.circuit_breaker import get_breaker
+from app.services.write_queue import writer
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = "activity_generation"
+
+generation_breaker = get_breaker("llm_jobs")
+
+
+def _list_targets(db: Session, category: str, per: str) -> List[Dict]:
+    """
+    Lista os alvos de geração: um por conteúdo ativo da categoria, ou um por vídeo
+    """
+    contents = db.query(Content).filter(
+        Content.category == category,
+        Content.is_active == True
+    ).order_by(Content.created_at, Content.id).all()
+
+    targets = []
+    for content in contents:
+        base_context = "\n".join(filter(None, [content.title, content.description]))
+        if per == "video":
+            videos = db.query(Video).filter(Video.content_id == content.id).order_by(Video.order_index).all()
+            for video in videos:
+                targets.append({
+                    "key": f"video:{video.id}",
+                    "content_id": content.id,
+                    "topic": video.title or content.title,
+                    "rag_text": "\n".join(filter(None, [base_context, video.title])),
+                    "nivel": content.publico_alvo,
+                })
+        else:
+            targets.append({
+                "key": f"content:{content.id}",
+                "content_id": content.id,
+                "topic": content.title,
+                "rag_text": base_context,
+                "nivel": content.publico_alvo,
+            })
+    return targets
+
+
+def _generate_question(target: Dict) -> Optional[str]:
+    """Gera uma pergunta (chamada bloqueante ao LLM; roda em thread)."""
+    questions = generate_educational_questions(
+        topic=target["topic"],
+        num_questions=1,
+        rag_text=target["rag_text"] or None,
+        rag_path=None if target["rag_text"] else "app/data_rag/bncc.txt",
+        nivel_educacional=target["nivel"],
+        breaker=generation_breaker,
+    )
+    if questions:
+        return questions[0].get("pergunta_gerada")
+    return None
+
+
+def _save_target(db: Session, job_id: str, target: Dict, questions: List[str]) -> None:
+    """
+    Unidade da fila de escrita: insere as atividades do alvo em lote e grava o
+    checkpoint na mesma transação
+    """
+    job = db.get(BackgroundJob, job_id)
+    next_index = db.query(func.coalesce(func.max(Activity.order_index), -1)).filter(
+        Activity.content_id == target["content_id"]
+    ).scalar() + 1
+
+    db.execute(insert(Activity), [
+        {
+            "id": str(uuid.uuid4()),
+            "content_id": target["content_id"],
+            "question": question,
+            "order_index": next_index + i,
+        }
+        for i, question in enumerate(questions)
+    ])
+
+    done = list((job.checkpoint or {}).get("done", []))
+    done.append(target["key"])
+    job.checkpoint = {**(job.checkpoint or {}), "done": done}  # reatribuir para o SQLAlchemy detectar a mudança
+    job.processed_items = len(done)
+
+
+def _count_failure(db: Session, job_id: str) -> None:
+    """Unidade da fila de escrita: conta um alvo que falhou"""
+    db.execute(
+        update(BackgroundJob).where(BackgroundJob.id == job_id).values(
+            failed_items=func.coalesce(BackgroundJob.failed_items, 0) + 1
+        )
+    )
+
+
+def _start_job(job_id: str) -> Optional[Dict]:
+    """Marca o job como iniciado e lista os alvos que faltam (bloqueante; roda em thread)"""
+    db = SessionLocal()
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        if not job:
+            return None
+
+        params = job.params or {}
+        jobs.mark_started(db, job)
+
+        targets = _list_targets(db, params["category"], params.get("per", "content"))
+        done = set((job.checkpoint or {}).get("done", []))
+        pending = [t for t in targets if t["key"] not in done]
+
+        job.total_items = len(targets)
+        job.processed_items = len(done & {t["key"] for t in targets})
+        job.failed_items = 0
+        db.commit()
+        return {
+            "per_item": params.get("activities_per_item", 3),
+            "concurrency": params.get("concurrency") or JOB_CONCURRENCY,
+            "targets": len(targets),
+            "pending": pending,
+        }
+    finally:
+        db.close()
+
+
+def _finish_job(job_id: str, error: Optional[str] = None) -> Optional[str]:
+    """Fecha o job (erro explícito ou alvos com falha); retorna o status final"""
+    db = SessionLocal()
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        if not job:
+            return None
+        if error is None and job.failed_items:
+            error = f"{job.failed_items} item(s) failed; resume the job to retry them"
+        jobs.mark_finished(db, job, error=error)
+        return job.status
+    finally:
+        db.close()
+
+
+@jobs.register_job_runner(JOB_KIND)
+async def run_activity_generation_job(job_id: str) -> None:
+    """
+    Executa (ou retoma) um job de geração de atividades.
+
+    Params do job: category, activities_per_item, per ("content" ou "video"), concurrency.
+    """
+    try:
+        plan = await asyncio.to_thread(_start_job, job_id)
+        if plan is None:
+            logger.error("Activity generation job %s not found", job_id)
+            return
+
+        pending, per_item, concurrency = plan["pending"], plan["per_item"], plan["concurrency"]
+        logger.info(
+            "Activity generation job %s: %d targets, %d already done, concurrency=%d",
+            job_id, plan["targets"], plan["targets"] - len(pending), concurrency
+        )
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for target in pending:
+            queue.put_nowait(target)
+
+        async def worker():
+            while True:
+                try:
+                    target = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    questions = []
+                    for _ in range(per_item):
+                        question = await asyncio.to_thread(_generate_question, target)
+                        if question:
+                            questions.append(question)
+                    if len(questions) < per_item:
+                        raise RuntimeError(f"generated {len(questions)} of {per_item} questions")
+                    await writer.arun(lambda db: _save_target(db, job_id, target, questions))
+                except Exception as e:
+                    await writer.arun(lambda db: _count_failure(db, job_id))
+                    logger.warning("Activity generation failed for %s: %s", target["key"], e)
+
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, len(pending)) or 1)])
+
+        status = await asyncio.to_thread(_finish_job, job_id)
+        logger.info("Activity generation job %s finished: %s", job_id, status)
+
+    except Exception as e:
+        await asyncio.to_thread(_finish_job, job_id, str(e))
+        raise
@@ -2,11 +2,14 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from dotenv import load_dotenv
 from langchain.chains import LLMChain
 from app.services.llm_provider import make_chat_llm
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, llm_breaker
+from app.services.deadline import DeadlineExceeded, deadline_near, deadline_timeouts, mark_degraded, time_budget
+from app.config import LLM_TIMEOUT, LLM_MIN_SECONDS
 from langchain.prompts import ChatPromptTemplate
 
 
@@ -21,14 +24,14 @@ def _get_openai_api_key() -> Optional[str]:
 	)
 
 
-def _make_llm(api_key: Optional[str] = None, model_name: str = "gemini-2.5-flash", temperature: float = 0.3):
+def _make_llm(api_key: Optional[str] = None, model_name: str = "gemini-2.5-flash", temperature: float = 0.3, timeout: Optional[float] = None):
 	"""Create a LangChain-compatible chat LLM instance.
 
 	This delegates to `app.services.llm_provider.make_chat_llm`, which will try to
 	instantiate a Gemini model when a Gemini key is present, otherwise fall back to OpenAI.
 	"""
 	# Let the provider handle selection and errors
-	llm = make_chat_llm(model=model_name, temperature=temperature, api_key=api_key)
+	llm = make_chat_llm(model=model_name, temperature=temperature, api_key=api_key, timeout=timeout)
 	# Ensure an OPENAI_API_KEY is present in the environment for compatibility with other code
 	key = api_key or _get_openai_api_key()
 	if key and "OPENAI_API_KEY" not in os.environ:
@@ -59,59 +62,27 @@ A saída deve ser um único objeto JSON válido.
 ### Formato de Saída (JSON)
 Responda *apenas* com um objeto JSON válido, seguindo exatamente esta estrutura:
 
-{
+{{
   "pergunta_gerada": "O texto da pergunta que você criou.",
   "nivel_alvo": "{nivel_de_escolaridade}",
   "conceito_avaliado": "O conceito ou fato principal do contexto que a pergunta está testando."
-}
+}}
 
 ### Exemplo de Execução
 (Se o contexto fosse "A fotossíntese é o processo pelo qual as plantas usam a luz solar, água e dióxido de carbono para criar seu próprio alimento (glicose)." e o nível "Ensino Médio")
 
 **Saída Esperada:**
-{
+{{
   "pergunta_gerada": "Quais são os três componentes principais que as plantas utilizam durante a fotossíntese, segundo o texto?",
   "nivel_alvo": "Ensino Médio",
   "conceito_avaliado": "Componentes do processo de fotossíntese"
-}
+}}
 
 """
 
 
-def generate_educational_questions(
-	topic: str,
-	num_questions: int = 5,
-	difficulty: str = "medium",
-	api_key: Optional[str] = None,
-	model_name: str = "gemini-2.5-flash",
-	llm_callable: Optional[Any] = None,
-	rag_path: Optional[str] = None,
-	rag_text: Optional[str] = None,
-	device_id: Optional[str] = None,
-	db: Optional[Any] = None,
-) -> List[Dict[str, Any]]:
-	"""Gera perguntas educacionais usando LangChain.
-
-	Args:
-		topic: Tópico para as perguntas (ex.: "fotossíntese").
-		num_questions: Quantidade de perguntas a gerar.
-		difficulty: Nível de dificuldade (easy/medium/hard).
-		api_key: Chave OpenAI opcional (se não fornecida, carregada do env/.env).
-		model_name: Nome do modelo OpenAI a utilizar.
-		device_id: ID do dispositivo do usuário para buscar nivel_educacional.
-		db: Sessão do banco de dados SQLAlchemy.
-
-	Retorna:
-		Uma lista de dicionários representando as perguntas, parseadas a partir do JSON retornado pelo modelo.
-
-	Levanta:
-		RuntimeError: quando a chave da API não estiver presente.
-	"""
-
-	if not api_key and not _get_openai_api_key():
-		raise RuntimeError("Chave da API não fornecida e não encontrada nas variáveis de ambiente.")
-	
-	# Buscar nivel_educacional do usuário se device_id e db foram fornecidos
+def _resolve_nivel_educacional(device_id: Optional[str], db: Optional[Any]) -> str:
+	"""Busca o nivel_educacional do usuário; retorna "medio" se não encontrado."""
 	nivel_de_escolaridade = "medio"  # valor padrão
 	if device_id and db:
 		try:
@@ -122,10 +93,11 @@ def generate_educational_questions(
 		except Exception:
 			# Se houver erro ao buscar, usa o valor padrão
 			pass
+	return nivel_de_escolaridade
 
-	# Allow injection of a simple callable for testing to avoid hitting the API
-	prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
 
+def _load_rag_context(rag_path: Optional[str] = None, rag_text: Optional[str] = None) -> str:
+	"""Carrega o contexto RAG a partir do texto explícito ou do arquivo em rag_path."""
 	# Prepare RAG context: prefer explicit rag_text, then rag_path, else empty
 	rag_context = ""
 	if rag_text:
@@ -154,35 +126,11 @@ def generate_educational_questions(
 				rag_context = p2.read_text(encoding="utf-8", errors="ignore")
 		except Exception:
 			pass
+	return rag_context
 
-	if llm_callable is not None:
-		# llm_callable should accept a single formatted prompt string and return a text response
-		# ChatPromptTemplate.format can produce structured messages; for simple testing we format the raw template string
-		formatted = PROMPT_TEMPLATE.format(
-			topic=topic,
-			difficulty=difficulty,
-			num_questions=num_questions,
-			format=format,
-			rag_context=rag_context,
-			nivel_de_escolaridade=nivel_de_escolaridade
-		)
-		response = llm_callable(formatted)
-	else:
-		llm = _make_llm(api_key=api_key, model_name=model_name)
-		# Use Runnable-style composition: prompt | llm
-		chain = prompt | llm
-		# invoke synchronously
-		response = chain.invoke({
-			"topic": topic,
-			"difficulty": difficulty,
-			"num_questions": num_questions,
-			"format": format,
-			"rag_context": rag_context,
-			"nivel_de_escolaridade": nivel_de_escolaridade
-		})
-		if not isinstance(response, str):
-			response = str(response)
 
+def _parse_questions(response: str) -> List[Dict[str, Any]]:
+	"""Converte a saída de texto do modelo em uma lista de perguntas."""
 	# Tenta parsear JSON da saída do modelo. Se falhar, retorna um item com a saída bruta.
 	try:
 		parsed = json.loads(response)
@@ -203,6 +151,153 @@ def generate_educational_questions(
 			return [{"raw_output": response}]
 
 
+def generate_educational_questions(
+	topic: str,
+	num_questions: int = 5,
+	difficulty: str = "medium",
+	api_key: Optional[str] = None,
+	model_name: str = "gemini-2.5-flash",
+	llm_callable: Optional[Any] = None,
+	rag_path: Optional[str] = None,
+	rag_text: Optional[str] = None,
+	device_id: Optional[str] = None,
+	db: Optional[Any] = None,
+	nivel_educacional: Optional[str] = None,
+	breaker: CircuitBreaker = llm_breaker,
+) -> List[Dict[str, Any]]:
+	"""Gera perguntas educacionais usando LangChain.
+
+	Args:
+		topic: Tópico para as perguntas (ex.: "fotossíntese").
+		num_questions: Quantidade de perguntas a gerar.
+		difficulty: Nível de dificuldade (easy/medium/hard).
+		api_key: Chave OpenAI opcional (se não fornecida, carregada do env/.env).
+		model_name: Nome do modelo OpenAI a utilizar.
+		device_id: ID do dispositivo do usuário para buscar nivel_educacional.
+		db: Sessão do banco de dados SQLAlchemy.
+		nivel_educacional: Nível explícito (ex.: publico_alvo do conteúdo); tem prioridade sobre o do usuário.
+		breaker: Circuit breaker da chamada ao provedor (jobs em lote usam um próprio, separado do das requisições).
+
+	Retorna:
+		Uma lista de dicionários representando as perguntas, parseadas a partir do JSON retornado pelo modelo.
+
+	Levanta:
+		RuntimeError: quando a chave da API não estiver presente.
+		CircuitOpenError: quando o circuit breaker do provedor de LLM está aberto.
+		DeadlineExceeded: quando o deadline da requisição não deixa tempo para o LLM.
+	"""
+
+	if not api_key and not _get_openai_api_key():
+		raise RuntimeError("Chave da API não fornecida e não encontrada nas variáveis de ambiente.")
+	
+	nivel_de_escolaridade = nivel_educacional or _resolve_nivel_educacional(device_id, db)
+
+	# Allow injection of a simple callable for testing to avoid hitting the API
+	prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+	rag_context = _load_rag_context(rag_path=rag_path, rag_text=rag_text)
+
+	if llm_callable is not None:
+		# llm_callable should accept a single formatted prompt string and return a text response
+		# ChatPromptTemplate.format can produce structured messages; for simple testing we format the raw template string
+		formatted = PROMPT_TEMPLATE.format(
+			topic=topic,
+			difficulty=difficulty,
+			num_questions=num_questions,
+			format=format,
+			rag_context=rag_context,
+			nivel_de_escolaridade=nivel_de_escolaridade
+		)
+		response = llm_callable(formatted)
+	else:
+		# Not enough time left in the request deadline: skip the LLM so the caller
+		# can answer with its fallback question right away
+		if deadline_near(LLM_MIN_SECONDS):
+			mark_degraded("llm")
+			raise DeadlineExceeded("Not enough time left in the request deadline for the LLM call")
+
+		# Prompt and client are built outside the circuit breaker: only the provider
+		# call counts, so a local error (bad template, missing package) never opens it
+		messages = prompt.format_messages(
+			rag_context=rag_context,
+			nivel_de_escolaridade=nivel_de_escolaridade
+		)
+		timeout = time_budget(LLM_TIMEOUT)
+		llm = _make_llm(api_key=api_key, model_name=model_name, timeout=timeout)
+
+		def invoke():
+			# A timeout cut short by the request deadline is the client's, not the provider's
+			with deadline_timeouts(timeout, LLM_TIMEOUT, "llm"):
+				return llm.invoke(messages)
+
+		# Circuit breaker: while the provider is failing this raises CircuitOpenError
+		# immediately so callers fall back without waiting for the full timeout
+		response = breaker.call(invoke)
+		response = getattr(response, "content", response)
+		if not isinstance(response, str):
+			response = str(response)
+
+	return _parse_questions(response)
+
+
+
+async def astream_educational_question(
+	api_key: Optional[str] = None,
+	model_name: str = "gemini-2.5-flash",
+	rag_path: Optional[str] = None,
+	rag_text: Optional[str] = None,
+	nivel_educacional: Optional[str] = None,
+	breaker: CircuitBreaker = llm_breaker,
+) -> AsyncIterator[str]:
+	"""Gera UMA pergunta educacional transmitindo os tokens do modelo à medida que chegam.
+
+	Usa o mesmo prompt, contexto RAG, circuit breaker e deadline de
+	`generate_educational_questions`. O texto completo (concatenação dos
+	pedaços) é convertido com `_parse_questions`. Não acessa o banco: o nível
+	vem pronto em `nivel_educacional` (padrão "medio").
+
+	Levanta:
+		RuntimeError: quando a chave da API não estiver presente.
+		CircuitOpenError: quando o circuit breaker do provedor de LLM está aberto.
+		DeadlineExceeded: quando o deadline da requisição não deixa tempo para o LLM.
+	"""
+	if not api_key and not _get_openai_api_key():
+		raise RuntimeError("Chave da API não fornecida e não encontrada nas variáveis de ambiente.")
+
+	if deadline_near(LLM_MIN_SECONDS):
+		mark_degraded("llm")
+		raise DeadlineExceeded("Not enough time left in the request deadline for the LLM call")
+
+	prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+	messages = prompt.format_messages(
+		rag_context=_load_rag_context(rag_path=rag_path, rag_text=rag_text),
+		nivel_de_escolaridade=nivel_educacional or "medio"
+	)
+	timeout = time_budget(LLM_TIMEOUT)
+	llm = _make_llm(api_key=api_key, model_name=model_name, timeout=timeout)
+
+	# Same outcomes as CircuitBreaker.acall, spread over the whole stream
+	if not breaker.allow_request():
+		raise CircuitOpenError(breaker.name)
+	try:
+		with deadline_timeouts(timeout, LLM_TIMEOUT, "llm"):
+			async for chunk in llm.astream(messages):
+				text = getattr(chunk, "content", chunk)
+				if text:
+					yield text if isinstance(text, str) else str(text)
+	except DeadlineExceeded:
+		breaker.release()
+		raise
+	except Exception:
+		breaker.record_failure()
+		raise
+	except BaseException:
+		# Client disconnected mid-stream (GeneratorExit/cancel): neither success nor failure
+		breaker.release()
+		raise
+	breaker.record_success()
+
+
 if __name__ == "__main__":
 	# Quick manual test when running the module directly.
 	try:
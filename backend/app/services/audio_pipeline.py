@@ -0,0 +1,397 @@
+"""
+Pipeline assíncrono das respostas em áudio: duração -> transcrição -> avaliação.
+
+Cada resposta em áudio ganha uma linha em audio_transcriptions (na mesma
+transação da resposta) e o id entra na fila de transcrição. Duas filas com
+workers próprios limitam a concorrência de cada etapa:
+
+- transcrição (TRANSCRIPTION_CONCURRENCY): lê a duração real do cabeçalho e
+  transcreve com o engine configurado (app.services.transcription)
+- avaliação (GRADING_CONCURRENCY): envia a transcrição ao mesmo avaliador das
+  respostas em texto e grava grau_aprendizagem
+
+O estado fica no banco: falhas são repetidas com backoff até
+TRANSCRIPTION_MAX_ATTEMPTS e, ao reiniciar, o que estava pendente volta às filas.
+
+Com vários workers cada linha tem um dono (lease_owner/lease_expires_at),
+assumido com um UPDATE condicional antes de cada etapa e no startup. O lease
+cobre uma etapa (TRANSCRIPTION_LEASE_SECONDS) mais a espera de um retry
+agendado; só depois de vencido outro processo reenfileira a linha.
+
+Os workers só esperam no event loop a leitura da duração, a transcrição e a
+avaliação; cada passo no banco (claim, status, retry) roda no threadpool com
+sessão própria.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    CIRCUIT_BREAKER_RECOVERY_TIMEOUT, GRADING_CONCURRENCY, TRANSCRIPTION_CONCURRENCY, TRANSCRIPTION_LANGUAGE,
+    TRANSCRIPTION_LEASE_SECONDS, TRANSCRIPTION_MAX_ATTEMPTS, TRANSCRIPTION_RETRY_DELAY, TRANSCRIPTION_TIMEOUT
+)
+from app.database import SessionLocal
+from app.db_models import Activity, AudioTranscription, Content, UserActivityResponse
+from app.services.audio_probe import probe_duration
+from app.services.audio_store import AUDIO_URL_PREFIX, audio_path_from_url
+from app.services.circuit_breaker import CircuitOpenError, get_breaker
+from app.services.jobs import WORKER_ID
+from app.services.regrading import grade_answer_text
+from app.services.transcription import get_engine
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+TRANSCRIBING = "transcribing"
+GRADING = "grading"
+COMPLETED = "completed"
+FAILED = "failed"
+
+transcription_breaker = get_breaker("transcription")
+
+_transcribe_queue: Optional[asyncio.Queue] = None
+_grade_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+
+
+def create_transcription(db: Session, response_id: str) -> AudioTranscription:
+    """Registra a resposta no pipeline (sem commit; entra na transação da resposta)"""
+    transcription = AudioTranscription(
+        id=str(uuid.uuid4()),
+        response_id=response_id,
+        status=PENDING,
+        attempts=0
+    )
+    db.add(transcription)
+    return transcription
+
+
+def submit(transcription_id: str) -> None:
+    """Enfileira para transcrição; chamar depois do commit"""
+    if _transcribe_queue is None:
+        logger.info("Audio pipeline not running; transcription %s will be picked up on startup", transcription_id)
+        return
+    _transcribe_queue.put_nowait(transcription_id)
+
+
+def _lease_expiry(delay: float = 0) -> datetime:
+    return datetime.now() + timedelta(seconds=delay + TRANSCRIPTION_LEASE_SECONDS)
+
+
+def _lease_free(now: datetime):
+    """Linha sem dono, deste processo ou com lease vencido"""
+    return or_(
+        AudioTranscription.lease_owner.is_(None),
+        AudioTranscription.lease_owner == WORKER_ID,
+        AudioTranscription.lease_expires_at.is_(None),
+        AudioTranscription.lease_expires_at < now
+    )
+
+
+def _claim(db: Session, transcription_id: str, statuses: Sequence[str]) -> bool:
+    """Assume a linha para uma etapa se estiver num dos status e livre. Atômico entre processos."""
+    claimed = db.execute(
+        update(AudioTranscription).where(
+            AudioTranscription.id == transcription_id,
+            AudioTranscription.status.in_(statuses),
+            _lease_free(datetime.now())
+        ).values(lease_owner=WORKER_ID, lease_expires_at=_lease_expiry())
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def _release(transcription: AudioTranscription) -> None:
+    """Solta o lease num estado final (sem commit)"""
+    transcription.lease_owner = None
+    transcription.lease_expires_at = None
+
+
+def _with_session(fn: Callable, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def _run_db(fn: Callable, *args):
+    """Executa fn(db, *args) no threadpool com sessão própria (o event loop só espera)"""
+    return await run_in_threadpool(_with_session, fn, *args)
+
+
+def _requeue_later(queue: asyncio.Queue, transcription_id: str, delay: float) -> None:
+    """Reenfileira depois de `delay` segundos (o lease já foi estendido no banco)"""
+    asyncio.get_running_loop().call_later(delay, queue.put_nowait, transcription_id)
+
+
+def _retry_or_fail(db: Session, transcription_id: str, error: Exception) -> Optional[float]:
+    """
+    Registra a falha da tentativa. Retorna o atraso do retry (backoff exponencial,
+    com o lease estendido até lá) ou None se atingiu o limite e foi marcada como falha.
+    """
+    transcription = db.get(AudioTranscription, transcription_id)
+    transcription.error = str(error)
+    if transcription.attempts >= TRANSCRIPTION_MAX_ATTEMPTS:
+        transcription.status = FAILED
+        _release(transcription)
+        db.commit()
+        logger.error("Transcription %s failed after %d attempts: %s", transcription.id, transcription.attempts, error)
+        return None
+
+    delay = TRANSCRIPTION_RETRY_DELAY * (2 ** (transcription.attempts - 1))
+    logger.warning(
+        "Transcription %s attempt %d failed (%s); retrying in %.1fs",
+        transcription.id, transcription.attempts, error, delay
+    )
+    transcription.lease_expires_at = _lease_expiry(delay)
+    db.commit()
+    return delay
+
+
+def _defer(db: Session, transcription_id: str, status: Optional[str]) -> None:
+    """Provedor fora (breaker aberto): devolve a tentativa e segura o lease até a recuperação"""
+    transcription = db.get(AudioTranscription, transcription_id)
+    if status is not None:
+        transcription.status = status
+    transcription.attempts -= 1
+    transcription.lease_expires_at = _lease_expiry(CIRCUIT_BREAKER_RECOVERY_TIMEOUT)
+    db.commit()
+
+
+async def _retry(transcription_id: str, error: Exception, queue: asyncio.Queue) -> None:
+    delay = await _run_db(_retry_or_fail, transcription_id, error)
+    if delay is not None:
+        _requeue_later(queue, transcription_id, delay)
+
+
+async def _wait_breaker(transcription_id: str, queue: asyncio.Queue, status: Optional[str] = None) -> None:
+    await _run_db(_defer, transcription_id, status)
+    _requeue_later(queue, transcription_id, CIRCUIT_BREAKER_RECOVERY_TIMEOUT)
+
+
+def _start_transcription(db: Session, transcription_id: str, engine_name: str) -> Optional[Tuple[str, Optional[float]]]:
+    """Assume a linha e conta a tentativa. Retorna (path, duração já conhecida) ou None se não há o que fazer."""
+    if not _claim(db, transcription_id, (PENDING, TRANSCRIBING)):
+        return None
+    transcription = db.get(AudioTranscription, transcription_id)
+    if not transcription:
+        return None
+
+    response = db.query(UserActivityResponse).filter(UserActivityResponse.id == transcription.response_id).first()
+    if not response or not response.answer or not response.answer.startswith(AUDIO_URL_PREFIX):
+        transcription.status = FAILED
+        transcription.error = "Resposta removida ou sem áudio"
+        _release(transcription)
+        db.commit()
+        return None
+
+    transcription.status = TRANSCRIBING
+    transcription.engine = engine_name
+    transcription.attempts += 1
+    db.commit()
+    return audio_path_from_url(response.answer), transcription.duration_seconds
+
+
+def _save_duration(db: Session, transcription_id: str, duration: float) -> None:
+    db.query(AudioTranscription).filter(AudioTranscription.id == transcription_id).update(
+        {AudioTranscription.duration_seconds: duration}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _save_transcript(db: Session, transcription_id: str, text: str) -> Optional[float]:
+    """Grava a transcrição e passa a linha para a avaliação. Retorna a duração (para o log)."""
+    transcription = db.get(AudioTranscription, transcription_id)
+    transcription.transcript = text
+    transcription.status = GRADING
+    transcription.attempts = 0
+    transcription.error = None
+    db.commit()
+    return transcription.duration_seconds
+
+
+async def _transcribe(transcription_id: str) -> None:
+    engine = get_engine()
+    started = await _run_db(_start_transcription, transcription_id, engine.name)
+    if started is None:
+        return
+    path, duration = started
+
+    if duration is None:
+        try:
+            duration = await run_in_threadpool(probe_duration, path)
+        except Exception as e:
+            await _retry(transcription_id, e, _transcribe_queue)
+            return
+        await _run_db(_save_duration, transcription_id, duration)
+
+    try:
+        text = await transcription_breaker.acall(
+            lambda: asyncio.wait_for(engine.transcribe(path, TRANSCRIPTION_LANGUAGE), timeout=TRANSCRIPTION_TIMEOUT)
+        )
+    except CircuitOpenError:
+        # Provedor fora: espera o breaker sem gastar tentativas
+        await _wait_breaker(transcription_id, _transcribe_queue, PENDING)
+        return
+    except Exception as e:
+        await _retry(transcription_id, e, _transcribe_queue)
+        return
+
+    duration = await _run_db(_save_transcript, transcription_id, text)
+    logger.info("Transcribed %s (%s s, %d chars)", transcription_id, duration, len(text))
+    _grade_queue.put_nowait(transcription_id)
+
+
+def _start_grading(db: Session, transcription_id: str) -> Optional[Tuple[str, str, str, Optional[str]]]:
+    """
+    Assume a linha e conta a tentativa. Retorna (transcrição, pergunta, título,
+    descrição) para o avaliador ou None se a linha já foi resolvida aqui.
+    """
+    if not _claim(db, transcription_id, (GRADING,)):
+        return None
+    transcription = db.get(AudioTranscription, transcription_id)
+    if not transcription:
+        return None
+
+    row = db.query(UserActivityResponse, Activity.question, Content.title, Content.description).join(
+        Activity, UserActivityResponse.activity_pk == Activity.pk
+    ).join(
+        Content, Activity.content_id == Content.id
+    ).filter(UserActivityResponse.id == transcription.response_id).first()
+    if not row:
+        transcription.status = FAILED
+        transcription.error = "Resposta ou atividade removida"
+        _release(transcription)
+        db.commit()
+        return None
+
+    response, question, title, description = row
+    if not (transcription.transcript or "").strip():
+        # Áudio sem fala reconhecível
+        response.grau_aprendizagem = 0.0
+        transcription.status = COMPLETED
+        transcription.error = "Transcrição vazia"
+        _release(transcription)
+        db.commit()
+        return None
+
+    transcription.attempts += 1
+    db.commit()
+    return transcription.transcript, question, title, description
+
+
+def _save_score(db: Session, transcription_id: str, score: float) -> Optional[str]:
+    """Grava a nota na resposta e fecha a linha. Retorna o id da resposta (para o log)."""
+    transcription = db.get(AudioTranscription, transcription_id)
+    response = db.query(UserActivityResponse).filter(UserActivityResponse.id == transcription.response_id).first()
+    if response:
+        response.grau_aprendizagem = score
+    transcription.status = COMPLETED
+    transcription.error = None
+    _release(transcription)
+    db.commit()
+    return transcription.response_id
+
+
+async def _grade(transcription_id: str) -> None:
+    started = await _run_db(_start_grading, transcription_id)
+    if started is None:
+        return
+    transcript, question, title, description = started
+
+    try:
+        score = await grade_answer_text(transcript, question, title, description)
+    except CircuitOpenError:
+        await _wait_breaker(transcription_id, _grade_queue)
+        return
+    except Exception as e:
+        await _retry(transcription_id, e, _grade_queue)
+        return
+
+    response_id = await _run_db(_save_score, transcription_id, score)
+    logger.info("Graded audio response %s: %.2f", response_id, score)
+
+
+async def _worker(queue: asyncio.Queue, handler: Callable[[str], Awaitable[None]]) -> None:
+    while True:
+        transcription_id = await queue.get()
+        try:
+            await handler(transcription_id)
+        except Exception:
+            logger.exception("Audio pipeline step failed for %s", transcription_id)
+        finally:
+            queue.task_done()
+
+
+def _requeue_unfinished() -> int:
+    """
+    Devolve às filas o que ficou pendente quando o servidor parou. As linhas são
+    assumidas num único UPDATE ... RETURNING: com vários workers subindo juntos,
+    cada uma entra na fila de um só processo, e linhas com lease válido de outro
+    worker ficam com ele.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            update(AudioTranscription).where(
+                AudioTranscription.status.in_([PENDING, TRANSCRIBING, GRADING]),
+                _lease_free(datetime.now())
+            ).values(
+                lease_owner=WORKER_ID, lease_expires_at=_lease_expiry()
+            ).returning(AudioTranscription.id, AudioTranscription.status, AudioTranscription.created_at)
+        ).all()
+        db.commit()
+    finally:
+        db.close()
+
+    for row in sorted(rows, key=lambda row: row.created_at or datetime.min):
+        queue = _grade_queue if row.status == GRADING else _transcribe_queue
+        queue.put_nowait(row.id)
+    return len(rows)
+
+
+def start_workers(
+    transcription_concurrency: int = TRANSCRIPTION_CONCURRENCY,
+    grading_concurrency: int = GRADING_CONCURRENCY
+) -> None:
+    """Cria as filas e os workers (no startup da aplicação)"""
+    global _transcribe_queue, _grade_queue
+    if _workers:
+        return
+
+    _transcribe_queue = asyncio.Queue()
+    _grade_queue = asyncio.Queue()
+    _workers.extend(asyncio.create_task(_worker(_transcribe_queue, _transcribe)) for _ in range(transcription_concurrency))
+    _workers.extend(asyncio.create_task(_worker(_grade_queue, _grade)) for _ in range(grading_concurrency))
+
+    requeued = _requeue_unfinished()
+    logger.info(
+        "Audio pipeline started: %d transcription / %d grading workers, %d requeued",
+        transcription_concurrency, grading_concurrency, requeued
+    )
+
+
+async def stop_workers() -> None:
+    global _transcribe_queue, _grade_queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _transcribe_queue = None
+    _grade_queue = None
+
+
+async def wait_idle() -> None:
+    """Espera as filas esvaziarem (scripts e testes; não inclui retries agendados)"""
+    if _transcribe_queue is None:
+        return
+    # A transcrição põe o id na fila de avaliação antes do task_done
+    await _transcribe_queue.join()
+    await _grade_queue.join()
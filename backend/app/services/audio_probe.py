@@ -0,0 +1,221 @@
+"""
+Duração real de arquivos de áudio a partir do cabeçalho, sem decodificar.
+
+Formatos reconhecidos pelos bytes iniciais (não pela extensão):
+- WAV: byte rate do chunk fmt + tamanho do chunk data
+- MP3: frame Xing/Info ou VBRI (VBR); senão taxa do primeiro frame (CBR)
+- MP4/M4A/3GP: duration/timescale do atom mvhd
+- FLAC: total de amostras / sample rate do STREAMINFO
+- OGG (Opus, Vorbis): granule position da última página
+
+Só lê o início e, no caso de OGG, o fim do arquivo. Retorna None quando o
+formato não é reconhecido ou o cabeçalho está corrompido.
+"""
+import logging
+import os
+import struct
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+HEAD_BYTES = 64 * 1024
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Duração em segundos, ou None se não for possível determinar"""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+            if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+                duration = _wav_duration(head, size)
+            elif head[:4] == b"fLaC":
+                duration = _flac_duration(head)
+            elif head[:4] == b"OggS":
+                duration = _ogg_duration(f, head, size)
+            elif head[4:8] == b"ftyp":
+                duration = _mp4_duration(f, size)
+            else:
+                duration = _mp3_duration(f, head, size)
+    except (OSError, struct.error, ValueError, IndexError, ZeroDivisionError) as e:
+        logger.warning(f"Não foi possível ler a duração de {path}: {str(e)}")
+        return None
+
+    if duration is None or duration <= 0:
+        return None
+    return round(duration, 3)
+
+
+def _wav_duration(head: bytes, size: int) -> Optional[float]:
+    byte_rate = None
+    pos = 12
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", head, pos)
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack_from("<I", head, pos + 16)[0]
+        elif chunk_id == b"data":
+            data_size = chunk_size
+            if data_size in (0, 0xFFFFFFFF) or pos + 8 + data_size > size:
+                # Gravação em streaming ou cabeçalho não atualizado: usa o tamanho real
+                data_size = size - (pos + 8)
+            return data_size / byte_rate if byte_rate else None
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _flac_duration(head: bytes) -> Optional[float]:
+    # Primeiro bloco de metadados é sempre o STREAMINFO (34 bytes)
+    if len(head) < 8 + 34 or head[4] & 0x7F != 0:
+        return None
+    packed = struct.unpack_from(">Q", head, 8 + 10)[0]
+    sample_rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+def _ogg_duration(f: BinaryIO, head: bytes, size: int) -> Optional[float]:
+    if len(head) < 27:
+        return None
+    segments = head[26]
+    packet = head[27 + segments:]
+    if packet.startswith(b"OpusHead"):
+        sample_rate = 48000  # Opus sempre usa granule a 48 kHz
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+    elif packet.startswith(b"\x01vorbis"):
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        pre_skip = 0
+    else:
+        return None
+
+    f.seek(max(size - HEAD_BYTES, 0))
+    tail = f.read()
+    last_page = tail.rfind(b"OggS")
+    if last_page < 0 or last_page + 14 > len(tail):
+        return None
+    granule = struct.unpack_from("<q", tail, last_page + 6)[0]
+    if granule <= 0 or not sample_rate:
+        return None
+    return (granule - pre_skip) / sample_rate
+
+
+def _mp4_find_atom(f: BinaryIO, start: int, end: int, name: bytes) -> Optional[tuple]:
+    """Procura um atom entre start e end; retorna (início do conteúdo, fim)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(16)
+        if len(header) < 8:
+            return None
+        atom_size, atom_type = struct.unpack_from(">I4s", header)
+        header_size = 8
+        if atom_size == 1:
+            atom_size = struct.unpack_from(">Q", header, 8)[0]
+            header_size = 16
+        elif atom_size == 0:
+            atom_size = end - pos
+        if atom_size < header_size:
+            return None
+        if atom_type == name:
+            return pos + header_size, pos + atom_size
+        pos += atom_size
+    return None
+
+
+def _mp4_duration(f: BinaryIO, size: int) -> Optional[float]:
+    moov = _mp4_find_atom(f, 0, size, b"moov")
+    if not moov:
+        return None
+    mvhd = _mp4_find_atom(f, moov[0], moov[1], b"mvhd")
+    if not mvhd:
+        return None
+
+    f.seek(mvhd[0])
+    data = f.read(32)
+    if data[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, 12)
+    return duration / timescale if timescale else None
+
+
+def _mp3_duration(f: BinaryIO, head: bytes, size: int) -> Optional[float]:
+    audio_start = 0
+    if head[:3] == b"ID3":
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        audio_start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+        f.seek(audio_start)
+        head = f.read(HEAD_BYTES)
+
+    for pos in range(0, len(head) - 4):
+        if head[pos] != 0xFF or (head[pos + 1] & 0xE0) != 0xE0:
+            continue
+        frame = _mp3_frame_info(head[pos:pos + 4])
+        if not frame:
+            continue
+        # Confirma o sync com o frame seguinte (evita falsos positivos em dados aleatórios)
+        next_pos = pos + frame[5]
+        if _mp3_frame_info(head[next_pos:next_pos + 4]):
+            break
+    else:
+        return None
+
+    version, layer, bitrate, sample_rate, mono, _ = frame
+    samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+
+    # Cabeçalho VBR (Xing/Info logo após o side info, ou VBRI a 32 bytes)
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = pos + 4 + side_info
+    if head[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", head, xing + 4)[0]
+        if flags & 1:
+            frames = struct.unpack_from(">I", head, xing + 8)[0]
+            return frames * samples_per_frame / sample_rate
+    vbri = pos + 4 + 32
+    if head[vbri:vbri + 4] == b"VBRI":
+        frames = struct.unpack_from(">I", head, vbri + 14)[0]
+        return frames * samples_per_frame / sample_rate
+
+    # CBR: bytes de áudio / taxa (desconta a tag ID3v1 no fim, se houver)
+    audio_bytes = size - audio_start - pos
+    f.seek(max(size - 128, 0))
+    if f.read(3) == b"TAG":
+        audio_bytes -= 128
+    return audio_bytes * 8 / (bitrate * 1000)
+
+
+def _mp3_frame_info(header: bytes) -> Optional[tuple]:
+    """(versão, layer, bitrate kbps, sample rate, mono, tamanho do frame), ou None se inválido"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = header[1], header[2], header[3]
+    version_bits = (b1 >> 3) & 0x3
+    layer_bits = (b1 >> 1) & 0x3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    mono = (b3 >> 6) == 3
+    padding = (b2 >> 1) & 0x1
+    if layer == 1:
+        frame_length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        coefficient = 72 if layer == 3 and version != 1 else 144
+        frame_length = coefficient * bitrate * 1000 // sample_rate + padding
+    return version, layer, bitrate, sample_rate, mono, frame_length
@@ -0,0 +1,186 @@
+"""
+Armazenamento de áudio endereçado pelo conteúdo, com deduplicação.
+
+Cada arquivo é salvo como ab/cd/<sha256><ext> (diretórios pelos primeiros
+bytes do hash, para não acumular centenas de milhares de arquivos num único
+diretório) e registrado em audio_blobs com um contador de referências. Reenvios dos mesmos bytes (retries do app) não
+ocupam espaço novo: o temporário é descartado e só o contador sobe. O
+arquivo só é removido quando a última referência é liberada.
+
+As alterações no contador entram na transação do chamador, junto com o
+insert/delete da resposta que referencia o áudio.
+
+Arquivo e contador são coordenados pelo lock de escrita do SQLite, sem
+segurar o lock durante I/O pesado:
+- store: o arquivo é posto no lugar antes do upsert (um hard link do
+  temporário, que fica até o upsert); depois do upsert, já com o lock, o
+  arquivo é reposto se uma remoção concorrente o apagou
+- release: só decrementa; quem apaga é delete_unreferenced_file, depois do
+  commit, com um DELETE condicional (ref_count = 0) que pega o lock antes de
+  remover o arquivo. Um upload concorrente do mesmo blob espera esse commit
+  e repõe o arquivo
+"""
+import logging
+import os
+import shutil
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config import AUDIO_UPLOAD_DIR
+from app.db_models import AudioBlob
+from app.services.uploads import stream_upload_to_temp, remove_quietly
+
+logger = logging.getLogger(__name__)
+
+AUDIO_URL_PREFIX = "/uploads/audio/"
+SHARD_URL_PATTERN = AUDIO_URL_PREFIX + "__/__/%"  # padrão LIKE das URLs já no layout em shards
+
+
+def shard_relpath(sha256: str, extension: str) -> str:
+    """Caminho relativo do blob no layout em shards: ab/cd/abcd...<ext>"""
+    return f"{sha256[0:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def blob_url(sha256: str, extension: str) -> str:
+    return f"{AUDIO_URL_PREFIX}{shard_relpath(sha256, extension)}"
+
+
+def audio_path_from_url(audio_url: str) -> str:
+    """Converte a URL relativa (/uploads/audio/...) no caminho do arquivo em disco"""
+    return os.path.join(AUDIO_UPLOAD_DIR, *audio_url[len(AUDIO_URL_PREFIX):].split("/"))
+
+
+def _link_file(tmp_path: str, final_path: str) -> bool:
+    """Põe uma cópia do temporário (hard link) no destino se ele não existe; o temporário fica"""
+    if os.path.exists(final_path):
+        return False
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    staging = f"{final_path}.{os.path.basename(tmp_path)}"
+    try:
+        os.link(tmp_path, staging)
+    except OSError:
+        shutil.copyfile(tmp_path, staging)
+    os.replace(staging, final_path)  # atômico: leitores nunca veem o arquivo pela metade
+    return True
+
+
+async def store_audio(db: Session, upload: UploadFile, extension: str) -> Dict:
+    """
+    Salva o upload no blob store e adiciona uma referência a ele (sem commit)
+
+    Args:
+        db: Sessão do chamador; o commit é feito junto com a resposta
+        upload: Arquivo recebido
+        extension: Extensão a usar se o blob for novo (ex: ".mp3")
+
+    Returns:
+        Dict com url, sha256, size e deduplicated (True se os bytes já existiam)
+    """
+    stored = await stream_upload_to_temp(upload, AUDIO_UPLOAD_DIR)
+    return await store_temp_file(db, stored['tmp_path'], stored['sha256'], stored['size'], extension)
+
+
+async def store_temp_file(db: Session, tmp_path: str, sha256: str, size: int, extension: str) -> Dict:
+    """
+    Adota um arquivo temporário já completo (mesmo sistema de arquivos) no
+    blob store e adiciona uma referência a ele (sem commit). O temporário é
+    sempre removido.
+    """
+    return await run_in_threadpool(_add_reference, db, tmp_path, sha256, size, extension)
+
+
+def _add_reference(db: Session, tmp_path: str, sha256: str, size: int, extension: str) -> Dict:
+    try:
+        return _upsert_blob(db, tmp_path, sha256, size, extension)
+    finally:
+        remove_quietly(tmp_path)
+
+
+def _upsert_blob(db: Session, tmp_path: str, sha256: str, size: int, extension: str) -> Dict:
+    # O blob pode já existir com outra extensão: o arquivo vai para a URL dele
+    url = db.execute(select(AudioBlob.url).where(AudioBlob.sha256 == sha256)).scalar() or blob_url(sha256, extension)
+    placed = _link_file(tmp_path, audio_path_from_url(url))  # antes do upsert: sem lock de escrita
+
+    # Upsert atômico: cria o blob ou incrementa o contador (também revive um
+    # blob com 0 referências ainda não apagado); RETURNING devolve a URL do
+    # blob existente. Daqui até o commit do chamador o lock de escrita é nosso.
+    stmt = sqlite_insert(AudioBlob).values(
+        sha256=sha256,
+        url=url,
+        size_bytes=size,
+        ref_count=1
+    ).on_conflict_do_update(
+        index_elements=[AudioBlob.sha256],
+        set_={"ref_count": AudioBlob.ref_count + 1}
+    ).returning(AudioBlob.url, AudioBlob.ref_count)
+    stored_url, ref_count = db.execute(stmt).one()
+
+    # Uma remoção que rodou entre o link e o upsert apagou o arquivo (ou o blob
+    # foi criado em paralelo com outra extensão): repõe a partir do temporário
+    replaced = _link_file(tmp_path, audio_path_from_url(stored_url))
+    if stored_url != url:
+        if placed:
+            remove_quietly(audio_path_from_url(url))  # nenhuma linha aponta para essa URL
+        placed = replaced
+    placed = placed or replaced
+
+    if not placed:
+        logger.info(f"Áudio duplicado {sha256[:12]}, reutilizando {stored_url} ({ref_count} referências)")
+
+    return {
+        'url': stored_url,
+        'sha256': sha256,
+        'size': size,
+        'deduplicated': not placed,
+    }
+
+
+def release_audio(db: Session, audio_url: str) -> Optional[str]:
+    """
+    Remove uma referência ao blob (sem commit)
+
+    Returns:
+        Caminho do arquivo a apagar depois do commit (com delete_unreferenced_file),
+        se era a última referência; None caso contrário ou se a URL não pertence
+        ao blob store (arquivos antigos)
+    """
+    row = db.execute(
+        update(AudioBlob)
+        .where(AudioBlob.url == audio_url)
+        .values(ref_count=AudioBlob.ref_count - 1)
+        .returning(AudioBlob.ref_count)
+    ).first()
+    if row is None or row.ref_count > 0:
+        return None
+    return audio_path_from_url(audio_url)
+
+
+def is_blob_url(db: Session, audio_url: str) -> bool:
+    return db.query(AudioBlob.sha256).filter(AudioBlob.url == audio_url).first() is not None
+
+
+def delete_unreferenced_file(db: Session, file_path: str, audio_url: str) -> None:
+    """
+    Apaga o blob (linha e arquivo) se ele não tem referências. Chamar depois do
+    commit de release_audio, ou depois de um rollback de store_audio.
+
+    O DELETE condicional pega o lock de escrita antes de remover o arquivo e o
+    commit vem depois: um upload do mesmo blob nunca fica entre a checagem e
+    a remoção (ele repõe o arquivo ao fazer o upsert depois deste commit).
+    """
+    try:
+        deleted = db.execute(
+            delete(AudioBlob).where(AudioBlob.url == audio_url, AudioBlob.ref_count <= 0).returning(AudioBlob.sha256)
+        ).first()
+        # Sem linha nenhuma: blob novo cujo insert voltou no rollback
+        if deleted is not None or not is_blob_url(db, audio_url):
+            remove_quietly(file_path)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
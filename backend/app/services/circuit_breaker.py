@@ -0,0 +1,197 @@
+"""
+Circuit breakers para dependências externas (provedores de LLM e YouTube).
+
+Quando uma dependência começa a falhar, o breaker abre e as chamadas seguintes
+recebem o fallback imediatamente, sem esperar o timeout completo. Depois do
+período de recuperação, uma única chamada de teste (half-open) decide se o
+circuito volta a fechar ou permanece aberto.
+"""
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from app.config import CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RECOVERY_TIMEOUT
+from app.services.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Levantada quando uma chamada é rejeitada porque o circuito está aberto."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit breaker '{name}' is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker thread-safe com estados closed, open e half-open.
+
+    - closed: chamadas passam; falhas consecutivas são contadas
+    - open: chamadas são rejeitadas até o fim do recovery_timeout
+    - half_open: uma chamada de teste passa; sucesso fecha, falha reabre
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout: float = CIRCUIT_BREAKER_RECOVERY_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_in_flight = False
+        self._total_failures = 0
+        self._total_successes = 0
+        self._total_rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        # Must be called with the lock held
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = False
+            logger.info("Circuit breaker '%s' half-open, allowing a trial call", self.name)
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Retorna True se a chamada pode prosseguir; False se deve usar o fallback."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._half_open_in_flight:
+                self._half_open_in_flight = True
+                return True
+            self._total_rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._total_successes += 1
+            if self._state != CLOSED:
+                logger.info("Circuit breaker '%s' closed", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._half_open_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._total_failures += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(
+                        "Circuit breaker '%s' opened after %d consecutive failures",
+                        self.name, self._failures
+                    )
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_in_flight = False
+
+    def release(self) -> None:
+        """Libera uma chamada permitida que não chegou a ser feita (sem sucesso nem falha)."""
+        with self._lock:
+            self._half_open_in_flight = False
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Executa func protegida pelo breaker. Levanta CircuitOpenError se aberto."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        try:
+            result = func(*args, **kwargs)
+        except DeadlineExceeded:
+            # Prazo do cliente acabou (ver deadline_timeouts): não é falha da dependência
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Interrompida (cancelamento, KeyboardInterrupt): sem sucesso nem falha
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Versão assíncrona de call() para corrotinas."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        try:
+            result = await func(*args, **kwargs)
+        except DeadlineExceeded:
+            # Prazo do cliente acabou (ver deadline_timeouts): não é falha da dependência
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Interrompida (ex.: cliente desconectou durante o teste): sem sucesso nem falha
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado atual do breaker para monitoramento."""
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == OPEN:
+                retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at)), 2)
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "retry_in_seconds": retry_in,
+                "total_successes": self._total_successes,
+                "total_failures": self._total_failures,
+                "total_rejected": self._total_rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Retorna (criando se necessário) o breaker registrado com esse nome."""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name)
+            _breakers[name] = breaker
+        return breaker
+
+
+def get_breakers_status() -> Dict[str, Dict[str, Any]]:
+    """Snapshot de todos os breakers registrados."""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+# Breakers das dependências externas
+llm_breaker = get_breaker("llm")
+analyzer_breaker = get_breaker("analyzer")
+youtube_breaker = get_breaker("youtube")
@@ -0,0 +1,179 @@
+"""
+Deadline por requisição, propagado via contextvars.
+
+O middleware HTTP define o prazo a partir do header X-Request-Timeout (segundos)
+ou do default configurado para a rota. Serviços lentos (yt-dlp, LLM) consultam
+o tempo restante para ajustar seus próprios timeouts e pular trabalho opcional
+quando o prazo está perto do fim, devolvendo respostas degradadas mas rápidas.
+
+Fora de uma requisição (scripts, jobs em background) não há deadline e todas
+as funções retornam os valores padrão.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Optional, Set
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import REQUEST_TIMEOUT_DEFAULT, REQUEST_TIMEOUT_MAX, ROUTE_TIMEOUTS
+
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_degraded: ContextVar[Optional[Set[str]]] = ContextVar("request_degraded", default=None)
+
+
+class DeadlineExceeded(RuntimeError):
+    """Levantada quando não há tempo suficiente para uma etapa opcional."""
+
+
+def resolve_timeout(path: str, header_value: Optional[str] = None) -> float:
+    """
+    Calcula o timeout da requisição em segundos.
+
+    O header tem prioridade (limitado a REQUEST_TIMEOUT_MAX); senão usa o
+    default da rota com o prefixo mais longo, ou o default global.
+    """
+    if header_value:
+        try:
+            value = float(header_value)
+            if value > 0:
+                return min(value, REQUEST_TIMEOUT_MAX)
+        except ValueError:
+            pass
+
+    best_prefix = ""
+    timeout = REQUEST_TIMEOUT_DEFAULT
+    for prefix, route_timeout in ROUTE_TIMEOUTS.items():
+        if path.startswith(prefix) and len(prefix) > len(best_prefix):
+            best_prefix = prefix
+            timeout = route_timeout
+    return timeout
+
+
+def start_deadline(timeout: float) -> Dict[str, Token]:
+    """Inicia o deadline da requisição atual. Retorna tokens para end_deadline()."""
+    return {
+        "deadline": _deadline.set(time.monotonic() + timeout),
+        "degraded": _degraded.set(set()),
+    }
+
+
+def end_deadline(tokens: Dict[str, Token]) -> None:
+    _deadline.reset(tokens["deadline"])
+    _degraded.reset(tokens["degraded"])
+
+
+@contextmanager
+def no_deadline():
+    """
+    Executa o bloco sem deadline. Usado por jobs em background disparados
+    por uma requisição, que herdariam o prazo (já expirado) dela.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining() -> Optional[float]:
+    """Segundos restantes até o deadline, ou None se não houver deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def time_budget(default: float) -> float:
+    """Timeout a usar numa chamada externa: o menor entre o default e o tempo restante."""
+    remaining = get_remaining()
+    if remaining is None:
+        return default
+    return min(default, remaining)
+
+
+def is_timeout_error(error: Optional[BaseException]) -> bool:
+    """True se o erro (ou uma causa encadeada) é um timeout: TimeoutError ou os *Timeout* dos clientes HTTP."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+            return True
+        # yt-dlp guarda a exceção original em exc_info (DownloadError) ou cause (TransportError)
+        exc_info = getattr(error, "exc_info", None)
+        cause = getattr(error, "cause", None)
+        error = (
+            (exc_info[1] if exc_info else None)
+            or (cause if isinstance(cause, BaseException) else None)
+            or error.__cause__ or error.__context__
+        )
+    return False
+
+
+@contextmanager
+def deadline_timeouts(timeout: float, default: float, component: str):
+    """
+    Converte em DeadlineExceeded o timeout de uma chamada externa cujo timeout
+    foi encurtado pelo deadline da requisição (timeout < default). Quem esgotou
+    foi o prazo do cliente, não o provedor: o circuit breaker libera a chamada
+    em vez de contar uma falha.
+    """
+    try:
+        yield
+    except Exception as e:
+        if timeout < default and is_timeout_error(e):
+            mark_degraded(component)
+            raise DeadlineExceeded(f"{component}: timeout de {timeout:.1f}s limitado pelo deadline da requisição") from e
+        raise
+
+
+def deadline_near(min_seconds: float) -> bool:
+    """True se restam menos de min_seconds até o deadline."""
+    remaining = get_remaining()
+    return remaining is not None and remaining < min_seconds
+
+
+def mark_degraded(component: str) -> None:
+    """Registra que uma etapa foi pulada por falta de tempo nesta requisição."""
+    degraded = _degraded.get()
+    if degraded is not None:
+        degraded.add(component)
+
+
+def get_degraded() -> Set[str]:
+    return set(_degraded.get() or ())
+
+
+class RequestDeadlineMiddleware:
+    """
+    Middleware ASGI puro: define o deadline da requisição (header
+    X-Request-Timeout ou default da rota) e marca respostas degradadas com
+    X-Degraded. Não passa o corpo da resposta por uma fila intermediária, então
+    streaming e extensões do servidor (zero-copy send) chegam intactos.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = resolve_timeout(scope["path"], Headers(scope=scope).get(REQUEST_TIMEOUT_HEADER))
+        tokens = start_deadline(timeout)
+
+        async def send_with_degraded(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                degraded = get_degraded()
+                if degraded:
+                    MutableHeaders(scope=message).append("X-Degraded", ",".join(sorted(degraded)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_degraded)
+        finally:
+            end_deadline(tokens)
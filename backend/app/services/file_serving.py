@@ -0,0 +1,180 @@
+"""
+Entrega de arquivos de /uploads com byte ranges, ETag forte e cache HTTP.
+
+- Range: um intervalo por requisição (bytes=a-b, bytes=a-, bytes=-n), com
+  If-Range; múltiplos intervalos caem para a resposta completa (200)
+- ETag forte: para blobs endereçados pelo conteúdo é o próprio SHA-256;
+  para arquivos antigos, tamanho + mtime em nanossegundos
+- If-None-Match responde 304 sem tocar no arquivo
+- zero-copy: se o servidor ASGI anunciar a extensão http.response.zerocopysend,
+  o corpo é enviado pelo descritor (sendfile); senão é lido em blocos no threadpool
+- X-Accel-Redirect: com UPLOADS_ACCEL_REDIRECT definido, só os headers são
+  gerados aqui e o proxy (nginx) faz a transferência
+"""
+import os
+import re
+import stat
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CONTENT_ADDRESSED_RE = re.compile(r"^audio/[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})\.[A-Za-z0-9]+$")
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(ValueError):
+    """O Range pedido está fora do arquivo."""
+
+
+def resolve_upload_path(root: str, relpath: str) -> Optional[str]:
+    """
+    Caminho absoluto do arquivo dentro de root, ou None se o caminho sai de root
+    ou passa por arquivos/diretórios ocultos (temporários, sessões de upload)
+    """
+    parts = [p for p in relpath.split("/") if p]
+    if not parts or any(p.startswith(".") for p in parts):
+        return None
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, *parts))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def file_etag(relpath: str, stat_result: os.stat_result) -> Tuple[str, bool]:
+    """
+    Retorna (etag, imutável). Blobs endereçados pelo conteúdo nunca mudam,
+    então o hash do nome é um ETag forte e o arquivo pode ficar em cache para sempre.
+    """
+    match = CONTENT_ADDRESSED_RE.match(relpath)
+    if match:
+        return f'"{match.group("sha256")}"', True
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"', False
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Comparação fraca (RFC 9110): W/"x" casa com "x"
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um header Range de um único intervalo
+
+    Returns:
+        (início, fim) inclusivos, ou None para servir o arquivo inteiro
+        (sem Range, Range inválido ou múltiplos intervalos)
+
+    Raises:
+        RangeNotSatisfiable: se o intervalo começa depois do fim do arquivo
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    start_text, sep, end_text = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text == "":
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise RangeNotSatisfiable(spec)
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable(spec)
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def cache_headers(relpath: str, stat_result: os.stat_result, immutable_max_age: int) -> dict:
+    etag, immutable = file_etag(relpath, stat_result)
+    return {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": f"public, max-age={immutable_max_age}, immutable" if immutable else "no-cache",
+        "accept-ranges": "bytes",
+    }
+
+
+class RangeFileResponse(Response):
+    """
+    Envia o arquivo inteiro ou um intervalo [start, end] dele.
+    Usa sendfile via extensão ASGI quando o servidor oferece.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        byte_range: Optional[Tuple[int, int]] = None,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        method: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ) -> None:
+        self.path = path
+        self.size = stat_result.st_size
+        self.start, self.end = byte_range if byte_range else (0, self.size - 1)
+        self.status_code = 206 if byte_range else 200
+        self.media_type = media_type or guess_type(path)[0] or "application/octet-stream"
+        self.send_header_only = method is not None and method.upper() == "HEAD"
+        self.background = background
+        self.init_headers(headers)
+        self.headers["content-length"] = str(max(self.end - self.start + 1, 0))
+        if byte_range:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{self.size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        count = self.end - self.start + 1
+        if self.send_header_only or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as f:
+                await f.seek(self.start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await f.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # Arquivo encolheu durante o envio: encerra o corpo
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        if self.background is not None:
+            await self.background()
+
+
+def is_regular_file(stat_result: os.stat_result) -> bool:
+    return stat.S_ISREG(stat_result.st_mode)
+
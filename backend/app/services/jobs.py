@@ -0,0 +1,238 @@
+"""
+Infraestrutura de jobs em background persistidos na tabela background_jobs.
+
+Cada tipo de job registra um runner assíncrono que recebe o job_id, abre sua
+própria sessão e grava progresso e checkpoint no registro do job. Como o
+checkpoint fica no banco, um job interrompido (restart do servidor, erro) pode
+ser retomado de onde parou.
+
+Com vários workers (WEB_CONCURRENCY > 1) o dono de um job em execução é
+registrado num lease (lease_owner/lease_expires_at) renovado por heartbeat.
+Um job só é assumido por outro processo (retomada ou startup) depois que o
+lease venceu, ou seja, quando o processo dono parou de renová-lo.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.config import JOB_LEASE_SECONDS
+from app.database import SessionLocal
+from app.db_models import BackgroundJob
+from app.models import JobResponse
+from app.services.deadline import no_deadline
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+JobRunner = Callable[[str], Awaitable[None]]
+
+_runners: Dict[str, JobRunner] = {}
+_running_jobs: Set[str] = set()
+
+# Dono dos leases deste processo
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def register_job_runner(kind: str):
+    """Decorator que associa um tipo de job ao seu runner."""
+    def decorator(func: JobRunner) -> JobRunner:
+        _runners[kind] = func
+        return func
+    return decorator
+
+
+def create_job(db: Session, kind: str, params: dict) -> BackgroundJob:
+    job = BackgroundJob(kind=kind, status=PENDING, params=params, checkpoint={})
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+async def run_job(job_id: str, kind: str) -> None:
+    """
+    Executa o runner do job. Ignora se o mesmo job já estiver rodando neste
+    processo ou com lease válido em outro worker.
+    Usado como BackgroundTask pelos endpoints que criam ou retomam jobs.
+    """
+    if job_id in _running_jobs:
+        logger.info("Job %s is already running, skipping", job_id)
+        return
+    runner = _runners.get(kind)
+    if runner is None:
+        logger.error("No runner registered for job kind '%s'", kind)
+        return
+
+    _running_jobs.add(job_id)
+    try:
+        if not await asyncio.to_thread(_claim, job_id):
+            logger.info("Job %s is leased by another worker, skipping", job_id)
+            return
+        with no_deadline():
+            runner_task = asyncio.ensure_future(runner(job_id))
+        heartbeat = asyncio.create_task(_heartbeat(job_id, runner_task))
+        try:
+            await runner_task
+        except asyncio.CancelledError:
+            if not heartbeat.done():
+                raise
+            # Lease perdido: outro worker assumiu o job
+        finally:
+            heartbeat.cancel()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception("Job %s failed: %s", job_id, e)
+    finally:
+        _running_jobs.discard(job_id)
+
+
+def _lease_expiry() -> datetime:
+    return datetime.now() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+def _claim(job_id: str) -> bool:
+    """Assume o lease do job se ninguém o detém (ou se venceu). Atômico entre processos."""
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        claimed = db.execute(
+            update(BackgroundJob).where(
+                BackgroundJob.id == job_id,
+                or_(
+                    BackgroundJob.status != RUNNING,
+                    BackgroundJob.lease_owner == WORKER_ID,
+                    BackgroundJob.lease_expires_at.is_(None),
+                    BackgroundJob.lease_expires_at < now
+                )
+            ).values(status=RUNNING, lease_owner=WORKER_ID, lease_expires_at=_lease_expiry())
+        ).rowcount
+        db.commit()
+        return claimed == 1
+    finally:
+        db.close()
+
+
+def _renew(job_id: str) -> bool:
+    """Renova o lease; False se o job não é mais deste processo"""
+    db = SessionLocal()
+    try:
+        renewed = db.execute(
+            update(BackgroundJob).where(
+                BackgroundJob.id == job_id,
+                BackgroundJob.status == RUNNING,
+                BackgroundJob.lease_owner == WORKER_ID
+            ).values(lease_expires_at=_lease_expiry())
+        ).rowcount
+        db.commit()
+        return renewed == 1
+    finally:
+        db.close()
+
+
+async def _heartbeat(job_id: str, runner_task: asyncio.Future) -> None:
+    """Renova o lease enquanto o runner roda; cancela o runner se o lease foi perdido"""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await asyncio.to_thread(_renew, job_id)
+        except Exception as e:
+            logger.warning("Could not renew lease of job %s: %s", job_id, e)
+            continue
+        if not renewed:
+            logger.warning("Job %s lost its lease (reclaimed by another worker), stopping", job_id)
+            runner_task.cancel()
+            return
+
+
+def lease_active(job: BackgroundJob) -> bool:
+    """True se algum processo está rodando o job (lease ainda não venceu)"""
+    return (
+        job.status == RUNNING
+        and job.lease_expires_at is not None
+        and job.lease_expires_at >= datetime.now()
+    )
+
+
+def is_running(job_id: str) -> bool:
+    return job_id in _running_jobs
+
+
+def mark_started(db: Session, job: BackgroundJob) -> None:
+    job.status = RUNNING
+    job.error = None
+    job.finished_at = None
+    if job.started_at is None:
+        job.started_at = datetime.now()
+    db.commit()
+
+
+def mark_finished(db: Session, job: BackgroundJob, error: Optional[str] = None) -> None:
+    job.status = FAILED if error else COMPLETED
+    job.error = error
+    job.finished_at = datetime.now()
+    job.lease_owner = None
+    job.lease_expires_at = None
+    db.commit()
+
+
+def mark_interrupted_jobs(db: Session) -> int:
+    """
+    Marca como interrompidos os jobs em execução cujo lease venceu (o processo
+    dono parou sem concluí-los). Chamado no startup de cada worker: jobs de
+    outros workers vivos continuam com o lease renovado e não são tocados.
+    Esses jobs podem ser retomados via POST /jobs/{id}/resume.
+    """
+    count = db.query(BackgroundJob).filter(
+        BackgroundJob.status == RUNNING,
+        or_(BackgroundJob.lease_expires_at.is_(None), BackgroundJob.lease_expires_at < datetime.now())
+    ).update(
+        {BackgroundJob.status: INTERRUPTED, BackgroundJob.lease_owner: None, BackgroundJob.lease_expires_at: None},
+        synchronize_session=False
+    )
+    db.commit()
+    return count
+
+
+def build_job_response(job: BackgroundJob) -> JobResponse:
+    """
+    Helper para construir a resposta do job, com progresso e vazão (itens/s)
+    """
+    total = job.total_items or 0
+    done = (job.processed_items or 0) + (job.failed_items or 0)
+    progress = round(done / total * 100, 2) if total > 0 else (100.0 if job.status == COMPLETED else 0.0)
+
+    items_per_second = None
+    if job.started_at and job.processed_items:
+        end = job.finished_at or datetime.now()
+        elapsed = (end - job.started_at).total_seconds()
+        if elapsed > 0:
+            items_per_second = round(job.processed_items / elapsed, 2)
+
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        params=job.params or {},
+        total_items=total,
+        processed_items=job.processed_items or 0,
+        failed_items=job.failed_items or 0,
+        progress=progress,
+        items_per_second=items_per_second,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
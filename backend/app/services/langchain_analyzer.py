@@ -2,8 +2,11 @@ from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
 from app.models import AnswerAnalysis
-from app.config import OPENAI_API_KEY
+from app.config import OPENAI_API_KEY, LLM_TIMEOUT, LLM_MIN_SECONDS
+from app.services.circuit_breaker import analyzer_breaker, CircuitOpenError
+from app.services.deadline import DeadlineExceeded, deadline_near, deadline_timeouts, mark_degraded, time_budget
 from typing import List
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,7 +31,8 @@ class LangChainAnalyzer:
         video_title: str,
         video_description: str,
         expected_concepts: List[str],
-        question_text: str
+        question_text: str,
+        fallback_on_error: bool = True
     ) -> AnswerAnalysis:
         """
         Analyze user's text response to E2E question.
@@ -39,10 +43,18 @@ class LangChainAnalyzer:
             video_description: Description of the video
             expected_concepts: Key concepts that should be mentioned
             question_text: The question that was asked
+            fallback_on_error: If False, errors (including an open circuit) are raised
+                instead of returning the neutral fallback analysis. Used by batch jobs
+                that must not persist fallback scores.
         
         Returns:
             AnswerAnalysis with score, feedback, concepts identified, etc.
         """
+        if deadline_near(LLM_MIN_SECONDS):
+            logger.warning("Request deadline too close, returning fallback analysis")
+            mark_degraded("analyzer")
+            return self._fallback_analysis(expected_concepts)
+        
         try:
             # Create prompt template
             template = """
@@ -86,32 +98,57 @@ Você é um professor avaliando a compreensão de um aluno sobre um conceito edu
             
             prompt = ChatPromptTemplate.from_template(template)
             
-            # Create chain
-            chain = prompt | self.llm | self.parser
+            messages = prompt.format_messages(
+                video_title=video_title,
+                video_description=video_description or "Sem descrição",
+                expected_concepts=", ".join(expected_concepts) if expected_concepts else "Conceitos gerais",
+                question_text=question_text,
+                user_response=user_response,
+                format_instructions=self.parser.get_format_instructions()
+            )
             
-            # Execute analysis
-            result = await chain.ainvoke({
-                "video_title": video_title,
-                "video_description": video_description or "Sem descrição",
-                "expected_concepts": ", ".join(expected_concepts) if expected_concepts else "Conceitos gerais",
-                "question_text": question_text,
-                "user_response": user_response,
-                "format_instructions": self.parser.get_format_instructions()
-            })
+            # Only the provider call goes through the circuit breaker, so parse
+            # errors on a healthy provider do not open the circuit; a timeout cut
+            # short by the client's deadline is released instead of counted
+            timeout = time_budget(LLM_TIMEOUT)
+
+            async def invoke():
+                with deadline_timeouts(timeout, LLM_TIMEOUT, "analyzer"):
+                    return await asyncio.wait_for(self.llm.ainvoke(messages), timeout=timeout)
+
+            llm_output = await analyzer_breaker.acall(invoke)
+            result = self.parser.invoke(llm_output)
             
             logger.info(f"Successfully analyzed response with score: {result.quality_score}")
             return result
         
+        except CircuitOpenError:
+            if not fallback_on_error:
+                raise
+            logger.warning("Analyzer circuit breaker is open, returning fallback analysis")
+            return self._fallback_analysis(expected_concepts)
+        
+        except DeadlineExceeded:
+            if not fallback_on_error:
+                raise
+            logger.warning("Request deadline reached during analysis, returning fallback analysis")
+            return self._fallback_analysis(expected_concepts)
+        
         except Exception as e:
+            if not fallback_on_error:
+                raise
             logger.error(f"Error analyzing response with LangChain: {str(e)}")
-            # Return fallback analysis
-            return AnswerAnalysis(
-                quality_score=0.5,
-                passed=False,
-                concepts_identified=[],
-                missing_concepts=expected_concepts,
-                feedback="Não foi possível analisar sua resposta automaticamente. Por favor, tente novamente."
-            )
+            return self._fallback_analysis(expected_concepts)
+    
+    def _fallback_analysis(self, expected_concepts: List[str]) -> AnswerAnalysis:
+        """Neutral analysis returned when the LLM is unavailable."""
+        return AnswerAnalysis(
+            quality_score=0.5,
+            passed=False,
+            concepts_identified=[],
+            missing_concepts=expected_concepts,
+            feedback="Não foi possível analisar sua resposta automaticamente. Por favor, tente novamente."
+        )
 
 # Global instance
 analyzer = LangChainAnalyzer()
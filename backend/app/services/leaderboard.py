@@ -0,0 +1,320 @@
+"""
+Ranking de aprendizagem em memória, atualizado incrementalmente.
+
+Cada ranking (geral, por conteúdo e por nível educacional) guarda, por
+usuário, a soma e a quantidade de notas das respostas concluídas
+(responded e grau_aprendizagem preenchido) numa SortedList ordenada por
+(média desc, respostas desc, pk). Top-K e posição de um usuário custam
+O(log n + K), sem agregar a tabela de respostas.
+
+- rebuild(): carrega tudo do banco (startup e a cada
+  LEADERBOARD_REBUILD_INTERVAL, que corrige escritas de outros workers ou
+  que escaparam dos eventos)
+- commits que criam, alteram ou apagam respostas recalculam só os usuários
+  envolvidos (uma consulta agrupada por conteúdo para esses usuários). Os
+  usuários vêm do flush do ORM (eventos da Session); escritas em Core avisam
+  antes do commit: touch_responses() no UPDATE em lote do regrading,
+  touch_users() no upsert do POST /users (nome e nível aparecem no ranking)
+- apagar usuários, conteúdos ou atividades pelo ORM (cascatas no banco)
+  reconstrói o ranking inteiro no commit
+
+O recálculo roda numa thread própria, agendada pelo after_commit: o commit
+(muitas vezes na thread de escrita) não espera a consulta. Agendamentos
+seguidos se juntam numa só passada.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.config import LEADERBOARD_REBUILD_INTERVAL
+from app.database import engine
+from app.db_models import Activity, Content, User, UserActivityResponse
+
+logger = logging.getLogger(__name__)
+
+Scope = Tuple[str, Optional[str]]  # ("global", None), ("content", content_id), ("level", nível)
+GLOBAL: Scope = ("global", None)
+
+
+def level_scope(nivel: Optional[str]) -> Optional[Scope]:
+    return ("level", nivel.strip().lower()) if nivel and nivel.strip() else None
+
+
+class _Board:
+    """Um ranking: soma/quantidade por usuário e a ordem (média desc, quantidade desc, pk)"""
+
+    def __init__(self):
+        self._order = SortedList()
+        self._totals: Dict[int, Tuple[float, int]] = {}
+
+    @staticmethod
+    def _key(user_pk: int, grade_sum: float, count: int) -> tuple:
+        return (-grade_sum / count, -count, user_pk)
+
+    def __len__(self) -> int:
+        return len(self._totals)
+
+    def set(self, user_pk: int, grade_sum: float, count: int) -> None:
+        self.remove(user_pk)
+        if count > 0:
+            self._totals[user_pk] = (grade_sum, count)
+            self._order.add(self._key(user_pk, grade_sum, count))
+
+    def remove(self, user_pk: int) -> None:
+        old = self._totals.pop(user_pk, None)
+        if old is not None:
+            self._order.remove(self._key(user_pk, *old))
+
+    def top(self, limit: int) -> List[Tuple[int, float, int]]:
+        return [(key[2], -key[0], -key[1]) for key in self._order.islice(0, limit)]
+
+    def rank(self, user_pk: int) -> Optional[Tuple[int, float, int]]:
+        """(posição 1-based, média, quantidade) ou None se o usuário não está no ranking"""
+        totals = self._totals.get(user_pk)
+        if totals is None:
+            return None
+        grade_sum, count = totals
+        return self._order.index(self._key(user_pk, grade_sum, count)) + 1, grade_sum / count, count
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Serializa leitura do banco + aplicação: um recálculo antigo não sobrescreve um mais novo
+        self._refresh_lock = threading.Lock()
+        self._boards: Dict[Scope, _Board] = defaultdict(_Board)
+        self._users: Dict[int, Tuple[str, str]] = {}  # pk -> (id, nome)
+        self._user_scopes: Dict[int, Set[Scope]] = {}
+        self._pk_by_id: Dict[str, int] = {}
+        # Recálculos agendados para a thread de atualização
+        self._pending_pks: Set[int] = set()
+        self._pending_rebuild = False
+        self._refreshing = False
+        self._idle = threading.Event()
+        self._idle.set()
+        self.ready = False
+
+    # --- Carga e atualização ---
+
+    @staticmethod
+    def _query(user_pks: Optional[Iterable[int]] = None):
+        """Soma/quantidade de notas por (usuário, conteúdo), com id, nome e nível do usuário"""
+        query = select(
+            User.pk, User.id, User.nome, User.nivel_educacional, Activity.content_id,
+            func.total(UserActivityResponse.grau_aprendizagem), func.count()
+        ).select_from(UserActivityResponse).join(
+            User, User.pk == UserActivityResponse.user_pk
+        ).join(
+            Activity, Activity.pk == UserActivityResponse.activity_pk
+        ).where(
+            UserActivityResponse.responded == True,
+            UserActivityResponse.grau_aprendizagem.isnot(None)
+        ).group_by(UserActivityResponse.user_pk, Activity.content_id)
+        if user_pks is not None:
+            query = query.where(UserActivityResponse.user_pk.in_(list(user_pks)))
+        return query
+
+    def _apply(self, rows, user_pks: Iterable[int]) -> None:
+        """Substitui as entradas dos usuários pelas linhas agrupadas (chamar com o lock)"""
+        per_user: Dict[int, list] = defaultdict(list)
+        for row in rows:
+            per_user[row[0]].append(row)
+
+        for user_pk in user_pks:
+            for scope in self._user_scopes.pop(user_pk, ()):
+                self._boards[scope].remove(user_pk)
+            old = self._users.pop(user_pk, None)
+            if old is not None:
+                self._pk_by_id.pop(old[0], None)
+
+            user_rows = per_user.get(user_pk)
+            if not user_rows:
+                continue
+            _, user_id, nome, nivel, _, _, _ = user_rows[0]
+            self._users[user_pk] = (user_id, nome)
+            self._pk_by_id[user_id] = user_pk
+            scopes = self._user_scopes[user_pk] = set()
+
+            total_sum, total_count = 0.0, 0
+            for *_, content_id, grade_sum, count in user_rows:
+                self._boards[("content", content_id)].set(user_pk, grade_sum, count)
+                scopes.add(("content", content_id))
+                total_sum += grade_sum
+                total_count += count
+            for scope in (GLOBAL, level_scope(nivel)):
+                if scope is not None:
+                    self._boards[scope].set(user_pk, total_sum, total_count)
+                    scopes.add(scope)
+
+    def rebuild(self) -> int:
+        """Recarrega todos os rankings do banco. Retorna quantos usuários entraram."""
+        with self._refresh_lock:
+            with engine.connect() as conn:
+                rows = conn.execute(self._query()).all()
+            with self._lock:
+                self._boards.clear()
+                self._users.clear()
+                self._user_scopes.clear()
+                self._pk_by_id.clear()
+                self._apply(rows, {row[0] for row in rows})
+                self.ready = True
+                return len(self._users)
+
+    def ensure_ready(self) -> None:
+        """Carrega na primeira consulta se o startup não carregou"""
+        if not self.ready:
+            self.rebuild()
+
+    def refresh_users(self, user_pks: Iterable[int]) -> None:
+        """Recalcula as entradas de alguns usuários (depois do commit que os alterou)"""
+        user_pks = set(user_pks)
+        if not user_pks or not self.ready:
+            return
+        with self._refresh_lock:
+            with engine.connect() as conn:
+                rows = conn.execute(self._query(user_pks)).all()
+            with self._lock:
+                self._apply(rows, user_pks)
+
+    def schedule(self, user_pks: Iterable[int] = (), rebuild: bool = False) -> None:
+        """Agenda um recálculo na thread de atualização (não bloqueia quem chamou)"""
+        with self._lock:
+            self._pending_pks.update(user_pks)
+            self._pending_rebuild = self._pending_rebuild or rebuild
+            if self._refreshing or not (self._pending_pks or self._pending_rebuild):
+                return
+            self._refreshing = True
+            self._idle.clear()
+        threading.Thread(target=self._drain, name="leaderboard-refresh", daemon=True).start()
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                user_pks, rebuild = self._pending_pks, self._pending_rebuild
+                if not user_pks and not rebuild:
+                    self._refreshing = False
+                    self._idle.set()
+                    return
+                self._pending_pks, self._pending_rebuild = set(), False
+            try:
+                if rebuild:
+                    self.rebuild()
+                else:
+                    self.refresh_users(user_pks)
+            except Exception:
+                logger.exception("Falha ao atualizar o ranking; será corrigido no próximo rebuild")
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Espera os recálculos agendados terminarem (scripts e testes)"""
+        return self._idle.wait(timeout)
+
+    # --- Consultas ---
+
+    def _entry(self, user_pk: int, rank: int, avg: float, count: int) -> dict:
+        user_id, nome = self._users[user_pk]
+        return {
+            "rank": rank,
+            "user_id": user_id,
+            "user_nome": nome,
+            "total_responses": count,
+            "avg_grau_aprendizagem": round(avg, 2)
+        }
+
+    def top(self, scope: Scope = GLOBAL, limit: int = 10) -> List[dict]:
+        with self._lock:
+            board = self._boards.get(scope)
+            if board is None:
+                return []
+            return [self._entry(user_pk, i, avg, count) for i, (user_pk, avg, count) in enumerate(board.top(limit), 1)]
+
+    def rank(self, user_id: str, scope: Scope = GLOBAL) -> Optional[dict]:
+        """Posição do usuário no ranking (None se ele não tem respostas avaliadas nesse ranking)"""
+        with self._lock:
+            user_pk = self._pk_by_id.get(user_id)
+            board = self._boards.get(scope)
+            if user_pk is None or board is None:
+                return None
+            ranked = board.rank(user_pk)
+            if ranked is None:
+                return None
+            return dict(self._entry(user_pk, *ranked), total_ranked=len(board))
+
+    def stats(self) -> dict:
+        with self._lock:
+            scopes = defaultdict(int)
+            for kind, _ in self._boards:
+                scopes[kind] += 1
+            return {"ready": self.ready, "users": len(self._users), "boards": dict(scopes)}
+
+
+leaderboard = Leaderboard()
+
+
+# --- Atualização a partir das escritas ---
+
+_PENDING_USERS = "leaderboard_users"
+_PENDING_REBUILD = "leaderboard_rebuild"
+
+
+def touch_responses(db: Session, response_ids: Iterable[str]) -> None:
+    """Para escritas em Core nas respostas: marca os usuários delas para recalcular no commit"""
+    response_ids = list(response_ids)
+    if not response_ids:
+        return
+    user_pks = db.execute(
+        select(UserActivityResponse.user_pk).where(UserActivityResponse.id.in_(response_ids)).distinct()
+    ).scalars()
+    db.info.setdefault(_PENDING_USERS, set()).update(user_pks)
+
+
+def touch_users(db: Session, user_pks: Iterable[int]) -> None:
+    """Para escritas em Core nos usuários (upsert): recalcula no commit os que estão no ranking"""
+    db.info.setdefault(_PENDING_USERS, set()).update(pk for pk in user_pks if pk in leaderboard._users)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_USERS, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, UserActivityResponse):
+            pending.add(obj.user_pk)
+            # Resposta movida para outro usuário: o anterior também muda
+            pending.update(inspect(obj).attrs.user_pk.history.deleted or ())
+        elif isinstance(obj, User) and obj in session.dirty and obj.pk in leaderboard._users:
+            pending.add(obj.pk)  # nome/nível aparecem no ranking
+    if any(isinstance(obj, (User, Content, Activity)) for obj in session.deleted):
+        session.info[_PENDING_REBUILD] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session) -> None:
+    user_pks = session.info.pop(_PENDING_USERS, None)
+    rebuild = session.info.pop(_PENDING_REBUILD, False)
+    if not leaderboard.ready or not (user_pks or rebuild):
+        return
+    leaderboard.schedule(user_pks or (), rebuild)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    session.info.pop(_PENDING_USERS, None)
+    session.info.pop(_PENDING_REBUILD, None)
+
+
+async def run_rebuild_loop(interval: float = LEADERBOARD_REBUILD_INTERVAL) -> None:
+    """Loop em background (iniciado no startup) que reconstrói o ranking periodicamente"""
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            ranked = await asyncio.to_thread(leaderboard.rebuild)
+            logger.debug("Leaderboard rebuilt: %d user(s)", ranked)
+        except Exception as e:
+            logger.error(f"Leaderboard rebuild failed: {str(e)}")
@@ -25,6 +25,7 @@ def make_chat_llm(
     temperature: float = 0.3,
     api_key: Optional[str] = None,
     provider: Optional[str] = None,
+    timeout: Optional[float] = None,
 ):
     """Factory that returns a LangChain-compatible chat LLM instance.
 
@@ -43,6 +44,8 @@ def make_chat_llm(
         Explicit API key override.
     provider: Optional[str]
         Force provider selection ignoring heuristic.
+    timeout: Optional[float]
+        Request timeout in seconds (usually derived from the request deadline).
     """
 
     env_provider = (provider or os.getenv("LLM_PROVIDER", "")).lower()
@@ -67,10 +70,12 @@ def make_chat_llm(
                     gemini_model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
                 
                 # langchain-google-genai v2.0+ uses simplified constructor
+                extra = {"timeout": timeout} if timeout is not None else {}
                 llm = gemini_cls(
                     model=gemini_model,
                     temperature=temperature,
-                    google_api_key=gemini_key
+                    google_api_key=gemini_key,
+                    **extra
                 )
                 logger.info("Using Gemini provider (%s) with model=%s", gemini_cls.__name__, gemini_model)
                 return llm
@@ -90,7 +95,8 @@ def make_chat_llm(
             # Reuse gemini key if user only provided one key and expects unified env
             openai_key = gemini_key
         logger.info("Using OpenAI provider with model=%s", model)
-        return ChatOpenAI(model=model, temperature=temperature, api_key=openai_key or key)
+        extra = {"timeout": timeout} if timeout is not None else {}
+        return ChatOpenAI(model=model, temperature=temperature, api_key=openai_key or key, **extra)
     except Exception as e:
         raise RuntimeError(
             "Failed to create an OpenAI Chat client (langchain_openai.ChatOpenAI). "
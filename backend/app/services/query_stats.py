@@ -0,0 +1,269 @@
+"""
+Instrumentação de SQL por requisição, via eventos do SQLAlchemy.
+
+Os eventos before/after_cursor_execute dos engines (síncrono e assíncrono)
+contam os statements e somam o tempo no banco da requisição atual, guardada
+num ContextVar (o threadpool do Starlette copia o contexto, então rotas `def`
+também são atribuídas). O middleware:
+
+- adiciona `Server-Timing: db;dur=..;desc="N queries", app;dur=..` à resposta
+- agrupa os statements pelo formato (SQL com parâmetros, listas de IN
+  colapsadas) e, quando um formato de SELECT se repete QUERY_N_PLUS_ONE_THRESHOLD
+  vezes ou mais na mesma requisição, registra um aviso de provável N+1 e
+  acrescenta `n1;desc=..` ao Server-Timing
+
+Escritas feitas pela fila de escrita rodam na thread dela, em lotes que
+misturam requisições, e não entram na conta.
+
+Statements acima de SLOW_QUERY_THRESHOLD_MS vão para o slow-query log: o
+registro roda como unidade da fila de escrita (fora do caminho da
+requisição), captura o EXPLAIN QUERY PLAN com os mesmos parâmetros, loga o SQL
+normalizado, parâmetros e rota, e acumula chamadas/tempo por formato na
+tabela slow_queries (top ofensores em top_slow_queries()).
+
+Para testes e scripts, assert_max_queries() captura todos os statements do
+processo durante o bloco (inclusive os da thread do TestClient) e falha se
+passar do limite.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import QUERY_N_PLUS_ONE_THRESHOLD, SLOW_QUERY_THRESHOLD_MS
+from app.database import IS_SQLITE, async_engine, engine
+from app.db_models import SlowQuery
+from app.services.write_queue import writer
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def statement_shape(statement: str) -> str:
+    """Formato do statement: espaços normalizados e `IN (?, ?, ...)` colapsado"""
+    return _IN_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Statements executados numa requisição (ou num bloco de assert_max_queries)"""
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self._lock = threading.Lock()
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0  # segundos
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.shapes[shape] += 1
+
+    def route(self) -> Optional[str]:
+        """Método + template da rota (ex.: "GET /api/v1/users/{device_id}"), depois do roteamento"""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path', self.scope['path'])}"
+
+    def repeated(self, threshold: int = QUERY_N_PLUS_ONE_THRESHOLD) -> List[tuple]:
+        """SELECTs repetidos `threshold` vezes ou mais: (formato, vezes), do mais repetido ao menos"""
+        with self._lock:
+            return [
+                (shape, times) for shape, times in self.shapes.most_common()
+                if times >= threshold and shape.upper().startswith(("SELECT", "WITH"))
+            ]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+# Verdadeiro enquanto o próprio slow-query log grava (não registra a si mesmo)
+_recording_slow_query: ContextVar[bool] = ContextVar("recording_slow_query", default=False)
+
+# Capturas globais abertas por assert_max_queries()
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    """Estatísticas da requisição atual (None fora de uma requisição)"""
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if _captures:
+        with _captures_lock:
+            captures = list(_captures)
+        for capture in captures:
+            capture.record(statement, duration)
+    if 0 < SLOW_QUERY_THRESHOLD_MS <= duration * 1000 and not _recording_slow_query.get():
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        writer.submit(lambda session: _record_slow_query(
+            session, statement, parameters, duration * 1000, stats.route() if stats else None
+        ))
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _record_slow_query(session: Session, statement: str, parameters: Any, duration_ms: float, route: Optional[str]) -> None:
+    """Unidade da fila de escrita: EXPLAIN + log + acumula em slow_queries"""
+    token = _recording_slow_query.set(True)
+    try:
+        shape = statement_shape(statement)
+        plan = None
+        if IS_SQLITE and shape.upper().startswith(_EXPLAINABLE):
+            try:
+                rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters or ())).all()
+                plan = "\n".join(row[3] for row in rows)
+            except Exception as e:
+                plan = f"(EXPLAIN falhou: {e})"
+        parameters_json = json.dumps(list(parameters or ()), default=str)[:1000]
+
+        logger.warning(
+            f"Query lenta ({duration_ms:.1f} ms) em {route or 'fora de requisição'}: {shape[:500]} "
+            f"| parâmetros {parameters_json[:200]} | plano: {(plan or '-').replace(chr(10), '; ')}"
+        )
+
+        stmt = sqlite_insert(SlowQuery).values(
+            shape_hash=hashlib.sha1(shape.encode()).hexdigest(),
+            statement=shape,
+            calls=1,
+            total_ms=duration_ms,
+            max_ms=duration_ms,
+            last_ms=duration_ms,
+            last_parameters=parameters_json,
+            last_route=route,
+            plan=plan
+        )
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[SlowQuery.shape_hash],
+            set_={
+                "calls": SlowQuery.calls + 1,
+                "total_ms": SlowQuery.total_ms + stmt.excluded.total_ms,
+                "max_ms": func.max(SlowQuery.max_ms, stmt.excluded.max_ms),
+                "last_ms": stmt.excluded.last_ms,
+                "last_parameters": stmt.excluded.last_parameters,
+                "last_route": stmt.excluded.last_route,
+                "plan": func.coalesce(stmt.excluded.plan, SlowQuery.plan),
+                "last_seen_at": func.now()
+            }
+        ))
+    finally:
+        _recording_slow_query.reset(token)
+
+
+def top_slow_queries(db: Session, limit: int = 20) -> List[Dict[str, Any]]:
+    """Formatos de statement que mais somaram tempo acima do limite"""
+    rows = db.query(SlowQuery).order_by(SlowQuery.total_ms.desc()).limit(limit).all()
+    return [
+        {
+            "statement": row.statement,
+            "calls": row.calls,
+            "total_ms": round(row.total_ms, 1),
+            "avg_ms": round(row.total_ms / row.calls, 1) if row.calls else None,
+            "max_ms": round(row.max_ms, 1),
+            "last_ms": round(row.last_ms, 1) if row.last_ms is not None else None,
+            "last_parameters": json.loads(row.last_parameters) if row.last_parameters else None,
+            "last_route": row.last_route,
+            "plan": row.plan.split("\n") if row.plan else None,
+            "first_seen_at": row.first_seen_at,
+            "last_seen_at": row.last_seen_at,
+        }
+        for row in rows
+    ]
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[QueryStats]:
+    """
+    Falha (AssertionError) se o bloco executar mais de max_queries statements.
+
+        with assert_max_queries(3):
+            client.get("/api/v1/dashboard/users")
+
+    A mensagem lista os formatos executados, com os repetidos primeiro.
+    """
+    stats = QueryStats()
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+    if stats.count > max_queries:
+        lines = [f"  {times}x {shape[:200]}" for shape, times in stats.shapes.most_common()]
+        raise AssertionError(
+            f"{stats.count} queries executadas (máximo {max_queries}):\n" + "\n".join(lines)
+        )
+
+
+class QueryStatsMiddleware:
+    """
+    Middleware ASGI puro: abre um QueryStats por requisição HTTP, escreve o
+    Server-Timing no início da resposta e avisa sobre prováveis N+1.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - started) * 1000
+                timings = [
+                    f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+                    f"app;dur={elapsed:.1f}",
+                ]
+                repeated = stats.repeated()
+                if repeated:
+                    shape, times = repeated[0]
+                    logger.warning(
+                        f"Possível N+1 em {scope['method']} {scope['path']}: "
+                        f"{times}x {shape[:200]} ({stats.count} queries no total)"
+                    )
+                    timings.append(f'n1;desc="{len(repeated)} repetidos, max {times}x"')
+                MutableHeaders(scope=message).append("Server-Timing", ", ".join(timings))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,246 @@
+"""
+Job em background que recalcula grau_aprendizagem das respostas históricas
+(UserActivityResponse) com o prompt/modelo atual do LangChainAnalyzer.
+
+- lê as respostas em lotes por keyset (id > último id), sem carregar a tabela
+- avalia cada lote com concorrência limitada
+- grava as notas do lote num único UPDATE em lote, junto com o checkpoint
+- respostas que falharam ficam no checkpoint e são reavaliadas ao retomar
+- só as avaliações rodam no event loop: leituras em thread com sessão
+  própria, gravação de cada lote como unidade da fila de escrita única
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from app.config import JOB_CONCURRENCY
+from app.database import SessionLocal
+from app.db_models import Activity, BackgroundJob, Content, UserActivityResponse
+from app.services import jobs
+from app.services.leaderboard import touch_responses
+from app.services.circuit_breaker import CircuitOpenError, analyzer_breaker, OPEN
+from app.services.langchain_analyzer import analyzer
+from app.services.write_queue import writer
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = "regrading"
+DEFAULT_BATCH_SIZE = 200
+
+
+def _base_query(db: Session, params: Dict):
+    """
+    Respostas de texto elegíveis para reavaliação (áudios são avaliados pelo audio_pipeline)
+    """
+    query = db.query(
+        UserActivityResponse.id,
+        UserActivityResponse.answer,
+        Activity.question,
+        Content.title,
+        Content.description
+    ).join(
+        Activity, UserActivityResponse.activity_pk == Activity.pk
+    ).join(
+        Content, Activity.content_id == Content.id
+    ).filter(
+        UserActivityResponse.responded == True,
+        UserActivityResponse.answer.isnot(None),
+        ~UserActivityResponse.answer.like("/uploads/%")
+    )
+
+    if params.get("activity_id"):
+        query = query.filter(Activity.id == params["activity_id"])
+    if params.get("content_id"):
+        query = query.filter(Activity.content_id == params["content_id"])
+    if params.get("only_ungraded"):
+        query = query.filter(UserActivityResponse.grau_aprendizagem.is_(None))
+    return query
+
+
+async def grade_answer_text(answer: str, question: str, title: str, description: Optional[str]) -> float:
+    """
+    Nota (0.0 a 1.0) de uma resposta em texto com o avaliador atual.
+    Mesmo caminho para respostas digitadas e transcrições de áudio.
+    """
+    analysis = await analyzer.analyze_response(
+        user_response=answer,
+        video_title=title,
+        video_description=description or "",
+        expected_concepts=[],
+        question_text=question,
+        fallback_on_error=False
+    )
+    return round(float(analysis.quality_score), 4)
+
+
+async def _grade_rows(rows: List, concurrency: int) -> Dict[str, Optional[float]]:
+    """
+    Avalia as respostas com no máximo `concurrency` chamadas simultâneas.
+    Retorna {id: score}, com None para as que falharam.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def grade(row) -> Optional[float]:
+        async with semaphore:
+            try:
+                return await grade_answer_text(row.answer, row.question, row.title, row.description)
+            except CircuitOpenError:
+                return None
+            except Exception as e:
+                logger.warning("Regrading failed for response %s: %s", row.id, e)
+                return None
+
+    scores = await asyncio.gather(*[grade(row) for row in rows])
+    return {row.id: score for row, score in zip(rows, scores)}
+
+
+def _save_batch(db: Session, job_id: str, scores: Dict[str, Optional[float]], checkpoint: Dict) -> Dict:
+    """
+    Unidade da fila de escrita: grava as notas do lote em um UPDATE em lote e
+    avança o checkpoint na mesma transação. Retorna o checkpoint e os contadores.
+    """
+    graded = [{"response_id": response_id, "score": score} for response_id, score in scores.items() if score is not None]
+    if graded:
+        # executemany pelo UUID público (a chave primária é a pk inteira)
+        responses = UserActivityResponse.__table__
+        db.execute(
+            update(responses).where(responses.c.id == bindparam("response_id")).values(grau_aprendizagem=bindparam("score")),
+            graded
+        )
+        # UPDATE em Core não passa pelo flush do ORM: avisa o ranking em memória
+        touch_responses(db, [r["response_id"] for r in graded])
+
+    checkpoint = dict(checkpoint)  # a fila pode refazer a unidade: não altera o dict recebido
+    failed_ids = set(checkpoint.get("failed_ids", []))
+    failed_ids.difference_update(r["response_id"] for r in graded)
+    failed_ids.update(response_id for response_id, score in scores.items() if score is None)
+    checkpoint["failed_ids"] = sorted(failed_ids)
+
+    job = db.get(BackgroundJob, job_id)
+    job.checkpoint = checkpoint
+    job.processed_items = (job.processed_items or 0) + len(graded)
+    job.failed_items = len(failed_ids)
+    return {
+        "checkpoint": checkpoint,
+        "processed_items": job.processed_items,
+        "failed_items": job.failed_items,
+        "total_items": job.total_items,
+    }
+
+
+def _start_job(job_id: str) -> Optional[Dict]:
+    """Marca o job como iniciado e conta as respostas na primeira execução (bloqueante; roda em thread)"""
+    db = SessionLocal()
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        if not job:
+            return None
+        params = job.params or {}
+        jobs.mark_started(db, job)
+        if not job.total_items:
+            job.total_items = _base_query(db, params).count()
+            db.commit()
+        return {"params": params, "checkpoint": dict(job.checkpoint or {})}
+    finally:
+        db.close()
+
+
+def _fetch_rows(
+    params: Dict,
+    ids: Optional[List[str]] = None,
+    after_id: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List:
+    """Lote de respostas, por lista de ids ou por keyset a partir de after_id (bloqueante; roda em thread)"""
+    db = SessionLocal()
+    try:
+        query = _base_query(db, params)
+        if ids is not None:
+            return query.filter(UserActivityResponse.id.in_(ids)).all()
+        if after_id:
+            query = query.filter(UserActivityResponse.id > after_id)
+        return query.order_by(UserActivityResponse.id).limit(limit).all()
+    finally:
+        db.close()
+
+
+def _finish_job(job_id: str, error: Optional[str] = None) -> Optional[str]:
+    """Fecha o job (erro explícito ou respostas com falha); retorna o status final"""
+    db = SessionLocal()
+    try:
+        job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id).first()
+        if not job:
+            return None
+        if error is None and job.failed_items:
+            error = f"{job.failed_items} response(s) failed; resume the job to retry them"
+        jobs.mark_finished(db, job, error=error)
+        return job.status
+    finally:
+        db.close()
+
+
+def _check_breaker() -> None:
+    """Interrompe o job se o provedor está fora, em vez de marcar todo o resto como falha"""
+    if analyzer_breaker.state == OPEN:
+        raise RuntimeError("Analyzer circuit breaker is open; resume the job once the provider recovers")
+
+
+@jobs.register_job_runner(JOB_KIND)
+async def run_regrading_job(job_id: str) -> None:
+    """
+    Executa (ou retoma) um job de reavaliação.
+
+    Params do job: activity_id, content_id, only_ungraded, batch_size, concurrency.
+    """
+    try:
+        started = await asyncio.to_thread(_start_job, job_id)
+        if started is None:
+            logger.error("Regrading job %s not found", job_id)
+            return
+
+        params, checkpoint = started["params"], started["checkpoint"]
+        batch_size = params.get("batch_size") or DEFAULT_BATCH_SIZE
+        concurrency = params.get("concurrency") or JOB_CONCURRENCY
+
+        async def save(scores: Dict[str, Optional[float]]) -> Dict:
+            snapshot = dict(checkpoint)
+            return await writer.arun(lambda db: _save_batch(db, job_id, scores, snapshot))
+
+        # 1. Reavaliar as respostas que falharam em execuções anteriores
+        retry_ids = list(checkpoint.get("failed_ids", []))
+        for start in range(0, len(retry_ids), batch_size):
+            chunk = retry_ids[start:start + batch_size]
+            rows = await asyncio.to_thread(_fetch_rows, params, ids=chunk)
+            # Respostas que deixaram de ser elegíveis (apagadas, filtradas) saem da lista de falhas
+            eligible = {row.id for row in rows}
+            checkpoint["failed_ids"] = [i for i in checkpoint.get("failed_ids", []) if i in eligible or i not in chunk]
+            scores = await _grade_rows(rows, concurrency)
+            checkpoint = (await save(scores))["checkpoint"]
+            _check_breaker()
+
+        # 2. Continuar a varredura por keyset a partir do último id processado
+        while True:
+            rows = await asyncio.to_thread(_fetch_rows, params, after_id=checkpoint.get("last_id"), limit=batch_size)
+            if not rows:
+                break
+
+            scores = await _grade_rows(rows, concurrency)
+            checkpoint["last_id"] = rows[-1].id
+            saved = await save(scores)
+            checkpoint = saved["checkpoint"]
+
+            logger.info(
+                "Regrading job %s: %d/%d graded, %d failed",
+                job_id, saved["processed_items"], saved["total_items"], saved["failed_items"]
+            )
+            _check_breaker()
+
+        status = await asyncio.to_thread(_finish_job, job_id)
+        logger.info("Regrading job %s finished: %s", job_id, status)
+
+    except Exception as e:
+        await asyncio.to_thread(_finish_job, job_id, str(e))
+        raise
@@ -0,0 +1,119 @@
+"""
+Rollups de estatísticas por usuário (user_stats) e por conteúdo (content_stats).
+
+As tabelas são mantidas pelos triggers de app.db_models.ROLLUP_TRIGGERS, na
+mesma transação de cada escrita em user_video_progress e
+user_activity_responses (qualquer caminho: rotas, fila de escrita, regrading
+em lote, scripts). Os dashboards leem uma linha por usuário/conteúdo em vez de
+agregar as tabelas de fatos.
+
+rebuild_rollups() recalcula tudo do zero (depois de importar dados com os
+triggers desligados, ou para corrigir deriva); rollup_drift() compara as
+tabelas com um recálculo sem gravar nada.
+"""
+import logging
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Mesmas definições dos triggers: vídeos assistidos = watched IS 1, respostas
+# concluídas = responded IS 1, grau = respostas com grau_aprendizagem
+USER_STATS_SELECT = """
+    SELECT u.pk AS user_pk,
+           coalesce(w.videos_watched, 0) AS videos_watched,
+           coalesce(w.contents_watched, 0) AS contents_watched,
+           coalesce(r.activities_completed, 0) AS activities_completed,
+           coalesce(r.grade_sum, 0.0) AS grade_sum,
+           coalesce(r.grade_count, 0) AS grade_count,
+           max(coalesce(w.last_at, r.last_at), coalesce(r.last_at, w.last_at)) AS last_activity_at
+    FROM users u
+    LEFT JOIN (
+        SELECT p.user_pk, count(*) AS videos_watched, count(DISTINCT v.content_id) AS contents_watched,
+               max(p.watched_at) AS last_at
+        FROM user_video_progress p LEFT JOIN videos v ON v.pk = p.video_pk
+        WHERE p.watched IS 1
+        GROUP BY p.user_pk
+    ) w ON w.user_pk = u.pk
+    LEFT JOIN (
+        SELECT user_pk, sum(responded IS 1) AS activities_completed, total(grau_aprendizagem) AS grade_sum,
+               count(grau_aprendizagem) AS grade_count, max(created_at) AS last_at
+        FROM user_activity_responses
+        GROUP BY user_pk
+    ) r ON r.user_pk = u.pk
+"""
+
+CONTENT_STATS_SELECT = """
+    SELECT c.id AS content_id,
+           coalesce(w.videos_watched, 0) AS videos_watched,
+           coalesce(w.unique_viewers, 0) AS unique_viewers,
+           coalesce(r.activities_completed, 0) AS activities_completed,
+           coalesce(r.grade_sum, 0.0) AS grade_sum,
+           coalesce(r.grade_count, 0) AS grade_count,
+           max(coalesce(w.last_at, r.last_at), coalesce(r.last_at, w.last_at)) AS last_activity_at
+    FROM contents c
+    LEFT JOIN (
+        SELECT v.content_id, count(*) AS videos_watched, count(DISTINCT p.user_pk) AS unique_viewers,
+               max(p.watched_at) AS last_at
+        FROM user_video_progress p JOIN videos v ON v.pk = p.video_pk
+        WHERE p.watched IS 1
+        GROUP BY v.content_id
+    ) w ON w.content_id = c.id
+    LEFT JOIN (
+        SELECT a.content_id, sum(r.responded IS 1) AS activities_completed, total(r.grau_aprendizagem) AS grade_sum,
+               count(r.grau_aprendizagem) AS grade_count, max(r.created_at) AS last_at
+        FROM user_activity_responses r JOIN activities a ON a.pk = r.activity_pk
+        GROUP BY a.content_id
+    ) r ON r.content_id = c.id
+"""
+
+# tabela: (chave, contadores, SELECT que recalcula); last_activity_at também é
+# gravado no rebuild, mas não entra na comparação (os triggers usam CURRENT_TIMESTAMP)
+ROLLUPS = {
+    "user_stats": (
+        "user_pk",
+        ("videos_watched", "contents_watched", "activities_completed", "grade_sum", "grade_count"),
+        USER_STATS_SELECT
+    ),
+    "content_stats": (
+        "content_id",
+        ("videos_watched", "unique_viewers", "activities_completed", "grade_sum", "grade_count"),
+        CONTENT_STATS_SELECT
+    ),
+}
+
+
+def rebuild_rollups(db: Session) -> Dict[str, int]:
+    """Recalcula user_stats e content_stats do zero numa transação. Retorna as linhas gravadas."""
+    rebuilt = {}
+    for table, (key, counters, select_sql) in ROLLUPS.items():
+        columns = ", ".join((key,) + counters + ("last_activity_at",))
+        db.execute(text(f"DELETE FROM {table}"))
+        rebuilt[table] = db.execute(text(f"INSERT INTO {table} ({columns}) {select_sql}")).rowcount
+    db.commit()
+    logger.info(f"Rollups recalculados: {rebuilt}")
+    return rebuilt
+
+
+def rollup_drift(db: Session, limit: int = 20) -> Dict[str, List[dict]]:
+    """
+    Linhas em que a tabela de rollup difere do recálculo (ou está faltando).
+    Lista vazia por tabela = triggers consistentes.
+    """
+    drift = {}
+    for table, (key, columns, select_sql) in ROLLUPS.items():
+        mismatch = " OR ".join(
+            f"abs(coalesce(s.{column}, 0) - e.{column}) > 1e-6" if column == "grade_sum"
+            else f"s.{column} IS NOT e.{column}"
+            for column in columns
+        )
+        rows = db.execute(text(f"""
+            SELECT e.{key} AS key, {", ".join(f"s.{c} AS stored_{c}, e.{c} AS expected_{c}" for c in columns)}
+            FROM ({select_sql}) e LEFT JOIN {table} s ON s.{key} = e.{key}
+            WHERE s.{key} IS NULL OR {mismatch}
+            LIMIT :limit
+        """), {"limit": limit}).mappings().all()
+        drift[table] = [dict(row) for row in rows]
+    return drift
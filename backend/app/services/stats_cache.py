@@ -0,0 +1,181 @@
+"""
+Cache em processo (stale-while-revalidate) das estatísticas globais do dashboard.
+
+GET /dashboard/stats e GET /dashboard-frontend/stats são consultados em
+polling pelo painel e agregam tabelas inteiras. Aqui cada resultado fica em
+memória por chave:
+
+- fresca (idade < DASHBOARD_STATS_TTL e nenhuma escrita relevante desde o
+  cálculo): devolvida direto
+- velha (TTL vencido ou invalidada por escrita): devolvida na hora, e uma
+  única thread em segundo plano recalcula; as requisições seguintes continuam
+  recebendo o valor velho até o novo ficar pronto
+- ausente: a primeira requisição calcula com a própria sessão; as que chegam
+  junto esperam esse mesmo cálculo
+
+A invalidação vem dos eventos do SQLAlchemy: um INSERT/UPDATE/DELETE em
+WATCHED_TABLES marca a conexão e o commit dela avança a geração do cache (o
+rollback descarta a marca). Vale para qualquer caminho de escrita que passe
+pelos engines da aplicação (rotas, fila de escrita, async). Um recálculo que
+começou antes do commit pode gravar o valor anterior como fresco; o TTL
+limita essa janela.
+
+As respostas levam `Age` (segundos desde o cálculo) e `X-Cache` (HIT, STALE
+ou MISS). DASHBOARD_STATS_TTL=0 desliga o cache.
+"""
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import DASHBOARD_STATS_TTL
+from app.database import SessionLocal, async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+# Tabelas lidas pelas estatísticas globais (os rollups mudam junto, pelos triggers)
+WATCHED_TABLES = {"users", "contents", "videos", "activities", "user_video_progress", "user_activity_responses"}
+
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:INSERT|REPLACE|UPDATE|DELETE)(?:\s+OR\s+\w+)?(?:\s+INTO|\s+FROM)?\s+[\"`\[]?(\w+)",
+    re.IGNORECASE
+)
+
+
+class CachedValue(NamedTuple):
+    value: Any
+    age: float  # segundos desde o cálculo
+    status: str  # HIT, STALE ou MISS
+
+
+class _Entry:
+    def __init__(self, value: Any, generation: int):
+        self.value = value
+        self.generation = generation
+        self.computed_at = time.monotonic()
+        self.refreshing = False
+
+
+class StatsCache:
+    def __init__(self, ttl: float = DASHBOARD_STATS_TTL, session_factory: Callable[[], Session] = SessionLocal):
+        self.ttl = ttl
+        self._session_factory = session_factory
+        self._entries: Dict[str, _Entry] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._miss_locks: Dict[str, threading.Lock] = {}
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "invalidations": 0}
+
+    def get(self, key: str, compute: Callable[[Session], Any], db: Session) -> CachedValue:
+        """Valor de `key`; `compute(session)` recalcula (na sessão da requisição só quando não há valor)"""
+        if self.ttl <= 0:
+            return CachedValue(compute(db), 0.0, "MISS")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.computed_at
+                if entry.generation == self._generation and age < self.ttl:
+                    self._stats["hits"] += 1
+                    return CachedValue(entry.value, age, "HIT")
+                self._stats["stale"] += 1
+                if not entry.refreshing:
+                    entry.refreshing = True
+                    threading.Thread(
+                        target=self._refresh, args=(key, compute), name=f"stats-cache-{key}", daemon=True
+                    ).start()
+                return CachedValue(entry.value, age, "STALE")
+            miss_lock = self._miss_locks.setdefault(key, threading.Lock())
+
+        # Sem valor: só uma requisição calcula, as outras esperam por ela
+        with miss_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return CachedValue(entry.value, time.monotonic() - entry.computed_at, "HIT")
+            with self._lock:
+                generation = self._generation
+                self._stats["misses"] += 1
+            value = compute(db)
+            with self._lock:
+                self._entries[key] = _Entry(value, generation)
+            return CachedValue(value, 0.0, "MISS")
+
+    def _refresh(self, key: str, compute: Callable[[Session], Any]) -> None:
+        with self._lock:
+            generation = self._generation
+        db = self._session_factory()
+        try:
+            value = compute(db)
+        except Exception:
+            logger.exception(f"Falha ao recalcular {key} do cache de estatísticas; mantendo o valor anterior")
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+                self._entries[key].refreshing = False
+            return
+        finally:
+            db.close()
+        with self._lock:
+            self._stats["refreshes"] += 1
+            # Geração de quando o cálculo começou: escritas durante o cálculo já o deixam velho
+            self._entries[key] = _Entry(value, generation)
+
+    def invalidate(self) -> None:
+        """Marca todas as entradas como velhas (a próxima leitura dispara o recálculo)"""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return dict(
+                self._stats,
+                ttl=self.ttl,
+                entries={
+                    key: {
+                        "age": round(now - entry.computed_at, 1),
+                        "fresh": entry.generation == self._generation and now - entry.computed_at < self.ttl,
+                        "refreshing": entry.refreshing,
+                    }
+                    for key, entry in self._entries.items()
+                }
+            )
+
+
+stats_cache = StatsCache()
+
+
+def set_cache_headers(response: Response, cached: CachedValue) -> None:
+    response.headers["Age"] = str(int(cached.age))
+    response.headers["X-Cache"] = cached.status
+
+
+def _mark_write(conn, cursor, statement, parameters, context, executemany):
+    match = _WRITE_TARGET.match(statement)
+    if match and match.group(1).lower() in WATCHED_TABLES:
+        conn.info["stats_cache_dirty"] = True
+
+
+def _on_commit(conn):
+    if conn.info.pop("stats_cache_dirty", False):
+        stats_cache.invalidate()
+
+
+def _on_rollback(conn):
+    conn.info.pop("stats_cache_dirty", None)
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "after_cursor_execute", _mark_write)
+    event.listen(_engine, "commit", _on_commit)
+    event.listen(_engine, "rollback", _on_rollback)
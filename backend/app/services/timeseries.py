@@ -0,0 +1,261 @@
+"""
+Séries temporais de atividade (buckets por hora e por dia) para gráficos de tendência.
+
+As tabelas activity_hourly e activity_daily guardam, por bucket, conteúdo e
+nível educacional: vídeos assistidos (por watched_at), respostas concluídas e
+soma/quantidade de notas (por created_at) e usuários ativos distintos. Como
+usuários ativos não se somam entre linhas, cada bucket também tem as linhas
+agregadas com '*' (todos os conteúdos, todos os níveis ou ambos); a consulta
+lê uma linha por bucket e o custo depende do número de buckets, não de eventos.
+
+O compactador roda em background (run_compactor_loop, iniciado no startup)
+como unidade da fila de escrita: a cada passada recalcula, a partir dos
+eventos brutos (índices em watched_at/created_at), as horas desde a última
+compactada menos TIMESERIES_LOOKBACK_HOURS (escritas atrasadas) e os dias que
+as contêm. Na primeira passada preenche o histórico em fatias de
+TIMESERIES_MAX_DAYS_PER_PASS dias, uma unidade da fila por fatia, com
+TIMESERIES_BACKFILL_PAUSE segundos entre elas: as escritas dos usuários que
+chegam durante o backfill entram na fila entre uma fatia e outra. Mudanças em
+eventos mais antigos que a janela (regrading, vídeo desmarcado dias depois)
+só entram com `python rebuild_stats.py --timeseries`.
+
+Limitações (os eventos brutos não guardam esses dados):
+- o nível educacional é o atual do usuário, não o da época do evento; quem
+  muda de nível leva junto os eventos dos buckets recalculados depois disso
+  (janela recente ou rebuild)
+- vídeos assistidos contam uma vez por usuário e vídeo, na data de
+  watched_at (user_video_progress tem uma linha por par): reassistir não
+  gera outro evento
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import (
+    TIMESERIES_BACKFILL_PAUSE, TIMESERIES_COMPACT_INTERVAL, TIMESERIES_LOOKBACK_HOURS, TIMESERIES_MAX_DAYS_PER_PASS
+)
+from app.services.write_queue import writer
+
+logger = logging.getLogger(__name__)
+
+ALL = "*"
+MAX_BUCKETS = 2000
+
+# granularidade: (tabela, formato do início do bucket no SQLite, passo)
+GRANULARITIES = {
+    "hour": ("activity_hourly", "%Y-%m-%d %H:00:00", timedelta(hours=1)),
+    "day": ("activity_daily", "%Y-%m-%d 00:00:00", timedelta(days=1)),
+}
+
+# Eventos do intervalo [:start, :end) com conteúdo e nível do usuário
+_EVENTS = """
+    WITH events AS (
+        SELECT p.user_pk, v.content_id, 1 AS watch, 0 AS response, NULL AS grade, p.watched_at AS at
+        FROM user_video_progress p JOIN videos v ON v.pk = p.video_pk
+        WHERE p.watched IS 1 AND p.watched_at >= :start AND p.watched_at < :end
+        UNION ALL
+        SELECT r.user_pk, a.content_id, 0, (r.responded IS 1), r.grau_aprendizagem, r.created_at
+        FROM user_activity_responses r JOIN activities a ON a.pk = r.activity_pk
+        WHERE r.created_at >= :start AND r.created_at < :end
+    ),
+    tagged AS (
+        SELECT strftime('{bucket}', e.at) AS bucket_start, e.content_id,
+               coalesce(lower(trim(u.nivel_educacional)), '') AS nivel, e.user_pk, e.watch, e.response, e.grade
+        FROM events e JOIN users u ON u.pk = e.user_pk
+    )
+"""
+
+_AGGREGATES = "sum(watch), sum(response), total(grade), count(grade), count(DISTINCT user_pk)"
+
+
+def _fmt(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def floor_bucket(value: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_bucket(value: datetime, granularity: str) -> datetime:
+    """Início do primeiro bucket em ou depois de value (fim exclusivo de um intervalo)"""
+    floored = floor_bucket(value, granularity)
+    return floored if floored == value else floored + GRANULARITIES[granularity][2]
+
+
+def to_utc(value: datetime) -> datetime:
+    """Datetime naive em UTC (o formato das tabelas); valores sem fuso já são UTC"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _utcnow() -> datetime:
+    # Mesmo relógio do CURRENT_TIMESTAMP do SQLite (UTC, sem fuso)
+    return datetime.utcnow()
+
+
+def compact_range(db: Session, granularity: str, start: datetime, end: datetime) -> int:
+    """Recalcula os buckets de [start, end) (alinhados à granularidade) a partir dos eventos"""
+    table, bucket, _ = GRANULARITIES[granularity]
+    params = {"start": _fmt(start), "end": _fmt(end)}
+    db.execute(text(f"DELETE FROM {table} WHERE bucket_start >= :start AND bucket_start < :end"), params)
+    columns = "content_id, nivel, bucket_start, watches, responses, grade_sum, grade_count, active_users"
+    return db.execute(text(f"""
+        INSERT INTO {table} ({columns})
+        {_EVENTS.format(bucket=bucket)}
+        SELECT content_id, nivel, bucket_start, {_AGGREGATES} FROM tagged GROUP BY bucket_start, content_id, nivel
+        UNION ALL
+        SELECT content_id, '{ALL}', bucket_start, {_AGGREGATES} FROM tagged GROUP BY bucket_start, content_id
+        UNION ALL
+        SELECT '{ALL}', nivel, bucket_start, {_AGGREGATES} FROM tagged GROUP BY bucket_start, nivel
+        UNION ALL
+        SELECT '{ALL}', '{ALL}', bucket_start, {_AGGREGATES} FROM tagged GROUP BY bucket_start
+    """), params).rowcount
+
+
+class Compactor:
+    """
+    Estado do compactador. compact() roda na thread de escrita e não altera
+    o estado: record() avança depois do commit (um lote refeito pela fila não
+    pula uma fatia).
+    """
+
+    def __init__(self):
+        self.compacted_until: Optional[datetime] = None  # horas completas até aqui (exclusivo)
+        self.passes = 0
+        self.last_pass_ms: Optional[float] = None
+        self.last_rows = 0
+
+    def _resume_point(self, db: Session) -> Optional[datetime]:
+        """Onde continuar: última hora gravada (reinício) ou o primeiro evento (tabelas vazias)"""
+        last = db.execute(text("SELECT max(bucket_start) FROM activity_hourly")).scalar()
+        if last is None:
+            last = db.execute(text("""
+                SELECT min(at) FROM (
+                    SELECT min(watched_at) AS at FROM user_video_progress WHERE watched IS 1
+                    UNION ALL SELECT min(created_at) FROM user_activity_responses
+                )
+            """)).scalar()
+        return floor_bucket(datetime.fromisoformat(str(last)), "hour") if last else None
+
+    def compact(self, db: Session, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Uma passada (unidade da fila de escrita). Devolve o resultado para
+        record(), com behind=True se ainda há histórico atrasado (o loop chama
+        de novo sem esperar), ou None se não há eventos.
+        """
+        started = time.perf_counter()
+        now = now or _utcnow()
+        current_hour = floor_bucket(now, "hour")
+        end_limit = current_hour + timedelta(hours=1)  # inclui a hora corrente, parcial
+
+        resume = self.compacted_until or self._resume_point(db)
+        if resume is None:
+            return None
+        start = min(resume, current_hour) - timedelta(hours=TIMESERIES_LOOKBACK_HOURS)
+        end = min(start + timedelta(days=TIMESERIES_MAX_DAYS_PER_PASS), end_limit)
+
+        rows = compact_range(db, "hour", start, end)
+        last_day = floor_bucket(end - timedelta(microseconds=1), "day")
+        rows += compact_range(db, "day", floor_bucket(start, "day"), last_day + timedelta(days=1))
+        return {
+            "compacted_until": min(end, current_hour),
+            "behind": end < end_limit,
+            "rows": rows,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def record(self, result: Dict[str, Any]) -> None:
+        self.compacted_until = result["compacted_until"]
+        self.passes += 1
+        self.last_rows = result["rows"]
+        self.last_pass_ms = result["ms"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compacted_until": self.compacted_until,
+            "passes": self.passes,
+            "last_pass_ms": self.last_pass_ms,
+            "last_rows": self.last_rows,
+        }
+
+
+compactor = Compactor()
+
+
+def rebuild_timeseries(db: Session) -> int:
+    """Recalcula as séries inteiras (script rebuild_stats.py --timeseries). Retorna as linhas gravadas."""
+    db.execute(text("DELETE FROM activity_hourly"))
+    db.execute(text("DELETE FROM activity_daily"))
+    rebuilt = Compactor()
+    while True:
+        result = rebuilt.compact(db)
+        if result is None:
+            break
+        rebuilt.record(result)
+        if not result["behind"]:
+            break
+    db.commit()
+    return db.execute(text("SELECT (SELECT count(*) FROM activity_hourly) + (SELECT count(*) FROM activity_daily)")).scalar()
+
+
+async def run_compactor_loop(
+    interval: float = TIMESERIES_COMPACT_INTERVAL,
+    backfill_pause: float = TIMESERIES_BACKFILL_PAUSE
+) -> None:
+    """Loop em background (iniciado no startup) que mantém as séries em dia"""
+    while True:
+        try:
+            result = await writer.arun(compactor.compact)
+            if result is not None:
+                compactor.record(result)
+                if result["behind"]:
+                    # Preenchendo histórico: próxima fatia logo, mas deixa a fila de escrita andar antes
+                    await asyncio.sleep(backfill_pause)
+                    continue
+        except Exception as e:
+            logger.error(f"Timeseries compaction failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def get_timeseries(
+    db: Session,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    content_id: Optional[str] = None,
+    nivel: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Pontos de [start, end) já alinhados, com buckets sem atividade preenchidos com zero"""
+    table, _, step = GRANULARITIES[granularity]
+    rows = db.execute(text(f"""
+        SELECT bucket_start, watches, responses, grade_sum, grade_count, active_users FROM {table}
+        WHERE content_id = :content_id AND nivel = :nivel AND bucket_start >= :start AND bucket_start < :end
+    """), {
+        "content_id": content_id or ALL,
+        "nivel": nivel.strip().lower() if nivel else ALL,
+        "start": _fmt(start),
+        "end": _fmt(end),
+    }).all()
+    by_bucket = {str(row.bucket_start): row for row in rows}
+
+    points = []
+    bucket = start
+    while bucket < end:
+        row = by_bucket.get(_fmt(bucket))
+        points.append({
+            "bucket_start": bucket,
+            "watches": row.watches if row else 0,
+            "responses": row.responses if row else 0,
+            "active_users": row.active_users if row else 0,
+            "avg_grau_aprendizagem": round(row.grade_sum / row.grade_count, 2) if row and row.grade_count else None,
+        })
+        bucket += step
+    return points
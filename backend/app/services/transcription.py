@@ -0,0 +1,107 @@
+"""
+Engines de transcrição de áudio (interface plugável).
+
+Um engine implementa `transcribe(path, language) -> str`. O engine usado pelo
+pipeline vem de TRANSCRIPTION_ENGINE; novos engines são registrados com
+@register_engine("nome").
+
+- openai: Whisper pela API da OpenAI
+- fake: local e determinístico, para testes e desenvolvimento sem API
+"""
+import abc
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Optional
+
+from app.config import OPENAI_API_KEY, TRANSCRIPTION_ENGINE, TRANSCRIPTION_MODEL, TRANSCRIPTION_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionEngine(abc.ABC):
+    """Interface dos engines de transcrição."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def transcribe(self, path: str, language: Optional[str] = None) -> str:
+        """Texto transcrito do arquivo em `path`"""
+
+
+_ENGINES: Dict[str, Callable[[], TranscriptionEngine]] = {}
+_instances: Dict[str, TranscriptionEngine] = {}
+
+
+def register_engine(name: str):
+    """Decorator que registra a classe (ou factory) de um engine pelo nome"""
+    def decorator(factory):
+        _ENGINES[name] = factory
+        return factory
+    return decorator
+
+
+def get_engine(name: Optional[str] = None) -> TranscriptionEngine:
+    """Instância (reutilizada) do engine configurado"""
+    name = (name or TRANSCRIPTION_ENGINE).lower()
+    if name not in _ENGINES:
+        raise ValueError(f"Unknown transcription engine '{name}'. Available: {', '.join(sorted(_ENGINES))}")
+    if name not in _instances:
+        _instances[name] = _ENGINES[name]()
+        logger.info("Using transcription engine '%s'", name)
+    return _instances[name]
+
+
+@register_engine("openai")
+class OpenAITranscriptionEngine(TranscriptionEngine):
+    """Whisper via API da OpenAI (o arquivo é enviado em streaming pelo cliente HTTP)."""
+
+    name = "openai"
+
+    def __init__(self, model: str = TRANSCRIPTION_MODEL, timeout: float = TRANSCRIPTION_TIMEOUT):
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=timeout, max_retries=0)
+
+    async def transcribe(self, path: str, language: Optional[str] = None) -> str:
+        extra = {"language": language} if language else {}
+        with open(path, "rb") as audio_file:
+            result = await self.client.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                **extra
+            )
+        return result.text.strip()
+
+
+@register_engine("fake")
+class FakeTranscriptionEngine(TranscriptionEngine):
+    """
+    Engine local para testes: devolve o conteúdo de <arquivo>.txt se existir,
+    senão um texto fixo. `delay` simula a latência de um engine real e
+    `fail_times` faz as primeiras chamadas falharem (para testar retries).
+    """
+
+    name = "fake"
+
+    def __init__(self, text: str = "Resposta transcrita de teste.", delay: float = 0.0, fail_times: int = 0):
+        self.text = text
+        self.delay = delay
+        self.fail_times = fail_times
+        self.calls = 0
+
+    async def transcribe(self, path: str, language: Optional[str] = None) -> str:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.calls <= self.fail_times:
+            raise RuntimeError(f"fake transcription failure {self.calls}/{self.fail_times}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+        sidecar = f"{path}.txt"
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                return f.read().strip()
+        return self.text
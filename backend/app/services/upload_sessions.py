@@ -0,0 +1,286 @@
+"""
+Upload retomável de áudio em blocos, para conexões móveis instáveis.
+
+Fluxo (inspirado no protocolo tus):
+- criar a sessão (devolve o id)
+- enviar blocos com o offset atual; um bloco com offset diferente do
+  registrado é rejeitado e o cliente consulta o offset e continua dali
+- finalizar: o arquivo parcial entra no blob store e a resposta é criada
+
+O arquivo parcial fica em UPLOAD_SESSION_DIR/<id>.part. O offset gravado no
+banco é a fonte da verdade: cada bloco é gravado na sua posição (sem truncar)
+e só conta depois do UPDATE condicional `... WHERE upload_offset = :offset`.
+Com vários workers, dois PATCHes no mesmo offset podem gravar ao mesmo tempo
+(os mesmos bytes, num retry), mas só um avança o offset; o outro recebe 409.
+Bytes além do offset (processo que caiu, bloco perdedor) são descartados no
+finalize. Se o cliente cai no meio do bloco, o que já chegou é confirmado.
+Sessões sem atividade por UPLOAD_SESSION_TTL segundos são removidas por um
+loop em background.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import weakref
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.config import (
+    MAX_AUDIO_UPLOAD_BYTES, UPLOAD_SESSION_DIR, UPLOAD_SESSION_TTL, UPLOAD_SESSION_GC_INTERVAL
+)
+from app.database import SessionLocal
+from app.db_models import UploadSession
+from app.services.audio_store import store_temp_file
+from app.services.uploads import UploadTooLargeError, remove_quietly
+
+logger = logging.getLogger(__name__)
+
+OPEN = "open"
+FINALIZED = "finalized"
+
+# Um bloco por vez por sessão neste processo (PATCHes duplicados de retries do
+# cliente); entre processos vale o UPDATE condicional do offset
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class UploadOffsetMismatch(ValueError):
+    """O bloco não começa no offset registrado para a sessão."""
+
+    def __init__(self, expected: int):
+        super().__init__(f"Offset inválido; o upload está em {expected} bytes")
+        self.expected = expected
+
+
+class UploadIncompleteError(ValueError):
+    """Finalize chamado antes de receber todos os bytes declarados."""
+
+
+class UploadAlreadyFinalized(RuntimeError):
+    """Outra requisição (outro worker) finalizou a sessão primeiro."""
+
+
+def part_path(session_id: str) -> str:
+    return os.path.join(UPLOAD_SESSION_DIR, f"{session_id}.part")
+
+
+def session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _session_locks[session_id] = lock
+    return lock
+
+
+def _max_bytes(session: UploadSession) -> int:
+    if session.upload_length is not None:
+        return min(session.upload_length, MAX_AUDIO_UPLOAD_BYTES)
+    return MAX_AUDIO_UPLOAD_BYTES
+
+
+def create_session(
+    db: Session,
+    user_id: str,
+    activity_id: str,
+    extension: str,
+    upload_length: Optional[int] = None
+) -> UploadSession:
+    """Cria a sessão e o arquivo parcial vazio"""
+    if upload_length is not None and upload_length > MAX_AUDIO_UPLOAD_BYTES:
+        raise UploadTooLargeError(MAX_AUDIO_UPLOAD_BYTES)
+
+    session = UploadSession(
+        user_id=user_id,
+        activity_id=activity_id,
+        extension=extension.lower(),
+        upload_length=upload_length,
+        upload_offset=0,
+        status=OPEN,
+        expires_at=datetime.now() + timedelta(seconds=UPLOAD_SESSION_TTL)
+    )
+    db.add(session)
+    db.flush()
+
+    os.makedirs(UPLOAD_SESSION_DIR, exist_ok=True)
+    open(part_path(session.id), "wb").close()
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def _open_part(path: str) -> int:
+    """Abre o parcial para escrita posicional (sem truncar: bytes além do offset são ignorados)"""
+    return os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+
+
+def _write_at(fd: int, chunk: bytes, position: int) -> None:
+    view = memoryview(chunk)
+    while view:
+        written = os.pwrite(fd, view, position)
+        view = view[written:]
+        position += written
+
+
+def _close(fd: int) -> None:
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _advance_offset(db: Session, session: UploadSession, offset: int, new_offset: int) -> bool:
+    """Avança o offset só se ainda está em `offset` (outro PATCH pode ter chegado antes)"""
+    advanced = db.execute(
+        update(UploadSession).where(
+            UploadSession.id == session.id,
+            UploadSession.status == OPEN,
+            UploadSession.upload_offset == offset
+        ).values(
+            upload_offset=new_offset,
+            expires_at=datetime.now() + timedelta(seconds=UPLOAD_SESSION_TTL)
+        )
+    ).rowcount
+    db.commit()
+    db.refresh(session)
+    return advanced == 1
+
+
+async def append_chunk(db: Session, session: UploadSession, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """
+    Grava um bloco a partir de `offset` e avança o offset da sessão (commit).
+    Se o cliente desconecta no meio, os bytes recebidos até ali são confirmados.
+
+    Raises:
+        UploadOffsetMismatch: se offset != upload_offset registrado (antes ou
+            depois de gravar, se outro PATCH avançou o offset primeiro)
+        UploadTooLargeError: se o total passar do tamanho declarado/máximo
+
+    Returns:
+        Novo offset
+    """
+    if offset != session.upload_offset:
+        raise UploadOffsetMismatch(session.upload_offset)
+
+    max_bytes = _max_bytes(session)
+    fd = await run_in_threadpool(_open_part, part_path(session.id))
+    written = offset
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if written + len(chunk) > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            await run_in_threadpool(_write_at, fd, chunk, written)
+            written += len(chunk)
+    except ClientDisconnect:
+        logger.info(f"Cliente desconectou no meio do bloco da sessão {session.id}; confirmando {written - offset} bytes")
+    finally:
+        await run_in_threadpool(_close, fd)
+
+    if written == offset:
+        return offset
+    if not await run_in_threadpool(_advance_offset, db, session, offset, written):
+        raise UploadOffsetMismatch(session.upload_offset)
+    return written
+
+
+def _hash_and_link(path: str, offset: int, dest_dir: str) -> Dict:
+    """
+    Calcula o SHA-256 dos bytes confirmados e cria uma cópia (hard link) para
+    o blob store; o parcial só é removido depois do commit do finalize.
+    """
+    with open(path, "r+b") as f:
+        f.truncate(offset)
+        hasher = hashlib.sha256()
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+
+    os.makedirs(dest_dir, exist_ok=True)
+    tmp_path = os.path.join(dest_dir, f".upload-{os.path.basename(path)}")
+    remove_quietly(tmp_path)
+    try:
+        os.link(path, tmp_path)
+    except OSError:
+        shutil.copyfile(path, tmp_path)
+    return {'tmp_path': tmp_path, 'sha256': hasher.hexdigest()}
+
+
+async def finalize_session(db: Session, session: UploadSession, dest_dir: str) -> Dict:
+    """
+    Move o arquivo completo para o blob store (sem commit; o chamador cria a
+    resposta e marca a sessão como finalizada na mesma transação)
+
+    Raises:
+        UploadIncompleteError: se faltam bytes do tamanho declarado
+    """
+    if session.upload_length is not None and session.upload_offset != session.upload_length:
+        raise UploadIncompleteError(
+            f"Upload incompleto: {session.upload_offset} de {session.upload_length} bytes recebidos"
+        )
+    if session.upload_offset == 0:
+        raise UploadIncompleteError("Upload vazio")
+
+    linked = await run_in_threadpool(_hash_and_link, part_path(session.id), session.upload_offset, dest_dir)
+    return await store_temp_file(db, linked['tmp_path'], linked['sha256'], session.upload_offset, session.extension)
+
+
+def mark_finalized(db: Session, session: UploadSession, response_id: str) -> None:
+    """
+    Marca a sessão como finalizada (sem commit), só se ainda estava aberta.
+
+    Raises:
+        UploadAlreadyFinalized: outra requisição finalizou antes; o chamador
+            desfaz a transação e devolve a resposta já criada
+    """
+    finalized = db.execute(
+        update(UploadSession).where(
+            UploadSession.id == session.id,
+            UploadSession.status == OPEN
+        ).values(
+            status=FINALIZED,
+            response_id=response_id,
+            expires_at=datetime.now() + timedelta(seconds=UPLOAD_SESSION_TTL)
+        )
+    ).rowcount
+    if finalized != 1:
+        raise UploadAlreadyFinalized(session.id)
+
+
+def discard_part(session_id: str) -> None:
+    remove_quietly(part_path(session_id))
+
+
+def collect_abandoned_sessions(db: Session, now: Optional[datetime] = None) -> int:
+    """Remove sessões expiradas (abertas ou já finalizadas) e seus parciais"""
+    now = now or datetime.now()
+    expired = db.query(UploadSession.id).filter(UploadSession.expires_at < now).all()
+    if not expired:
+        return 0
+
+    ids = [row.id for row in expired]
+    db.query(UploadSession).filter(UploadSession.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    for session_id in ids:
+        discard_part(session_id)
+    return len(ids)
+
+
+async def run_gc_loop(interval: float = UPLOAD_SESSION_GC_INTERVAL) -> None:
+    """Loop em background (iniciado no startup) que coleta sessões abandonadas"""
+    while True:
+        try:
+            db = SessionLocal()
+            try:
+                removed = await run_in_threadpool(collect_abandoned_sessions, db)
+            finally:
+                db.close()
+            if removed:
+                logger.info(f"{removed} sessão(ões) de upload abandonada(s) removida(s)")
+        except Exception as e:
+            logger.error(f"Upload session GC failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,132 @@
+"""
+Upload de arquivos em streaming, sem carregar o arquivo inteiro em memória.
+
+O arquivo é lido em blocos de tamanho fixo e gravado num arquivo temporário
+no diretório de destino. O limite de tamanho é verificado durante a
+leitura e o SHA-256 é calculado no caminho. Ao final o temporário é
+renomeado atomicamente para o nome definitivo. As operações de disco rodam
+no threadpool para não bloquear o event loop.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Dict, BinaryIO
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config import MAX_AUDIO_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """Levantada quando o upload ultrapassa o tamanho máximo permitido."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Arquivo excede o tamanho máximo de {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+
+def _write_chunk(tmp: BinaryIO, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    tmp.write(chunk)
+
+
+def _flush_and_close(tmp: BinaryIO) -> None:
+    tmp.flush()
+    os.fsync(tmp.fileno())
+    tmp.close()
+
+
+def remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_upload_to_temp(
+    upload: UploadFile,
+    dest_dir: str,
+    max_bytes: int = MAX_AUDIO_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Dict:
+    """
+    Grava o upload em streaming num arquivo temporário dentro de dest_dir
+
+    O temporário fica no mesmo diretório do destino final para que o rename
+    seja atômico. Cabe ao chamador renomeá-lo (os.replace) ou removê-lo.
+
+    Args:
+        upload: Arquivo recebido pelo FastAPI
+        dest_dir: Diretório onde o arquivo final vai ficar
+        max_bytes: Tamanho máximo permitido (verificado durante o streaming)
+        chunk_size: Tamanho de cada bloco lido
+
+    Returns:
+        Dict com tmp_path, size (bytes) e sha256 (hex)
+
+    Raises:
+        UploadTooLargeError: se o arquivo passar de max_bytes
+    """
+    await run_in_threadpool(os.makedirs, dest_dir, exist_ok=True)
+
+    fd, tmp_path = await run_in_threadpool(tempfile.mkstemp, dir=dest_dir, prefix=".upload-", suffix=".part")
+    tmp = os.fdopen(fd, "wb")
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            await run_in_threadpool(_write_chunk, tmp, hasher, chunk)
+
+        await run_in_threadpool(_flush_and_close, tmp)
+    except BaseException:
+        tmp.close()
+        await run_in_threadpool(remove_quietly, tmp_path)
+        raise
+
+    return {
+        'tmp_path': tmp_path,
+        'size': size,
+        'sha256': hasher.hexdigest(),
+    }
+
+
+async def stream_upload_to_file(
+    upload: UploadFile,
+    dest_path: str,
+    max_bytes: int = MAX_AUDIO_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Dict:
+    """
+    Grava o upload em dest_path em streaming, com rename atômico no final
+
+    Returns:
+        Dict com path, size (bytes) e sha256 (hex)
+
+    Raises:
+        UploadTooLargeError: se o arquivo passar de max_bytes
+    """
+    stored = await stream_upload_to_temp(upload, os.path.dirname(dest_path), max_bytes, chunk_size)
+
+    try:
+        await run_in_threadpool(os.replace, stored['tmp_path'], dest_path)
+    except BaseException:
+        await run_in_threadpool(remove_quietly, stored['tmp_path'])
+        raise
+
+    logger.info(f"Upload salvo em {dest_path} ({stored['size']} bytes)")
+    return {
+        'path': dest_path,
+        'size': stored['size'],
+        'sha256': stored['sha256'],
+    }
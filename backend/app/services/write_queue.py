@@ -0,0 +1,174 @@
+"""
+Fila de escrita única para o SQLite (group commit).
+
+Mesmo em WAL o SQLite aceita um escritor por vez; com várias threads do
+threadpool disputando o lock em db.commit(), cada uma espera o busy_timeout e
+faz um fsync próprio. Aqui uma thread dedicada é dona da conexão de escrita:
+as rotas enviam pequenas unidades de escrita (funções que recebem a Session) e
+recebem um Future. A thread junta as unidades que chegam em sequência numa
+única transação e resolve os Futures só depois do commit.
+
+- lote: até WRITE_QUEUE_MAX_BATCH unidades, esperando no máximo
+  WRITE_QUEUE_MAX_WAIT_MS por mais unidades depois da primeira
+- isolamento de falhas: se uma unidade levanta exceção, o lote é desfeito e
+  cada unidade roda de novo na sua própria transação (só a culpada falha)
+- as unidades devem devolver valores simples (dicts, ids), não objetos ORM,
+  e fazer as validações de leitura antes, na sessão da própria requisição
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_WAIT_MS
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+WriteUnit = Callable[[Session], Any]
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(
+        self,
+        session_factory: Callable[..., Session] = SessionLocal,
+        max_batch: int = WRITE_QUEUE_MAX_BATCH,
+        max_wait_ms: float = WRITE_QUEUE_MAX_WAIT_MS,
+    ):
+        self._session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"units": 0, "batches": 0, "failed_units": 0, "split_batches": 0, "max_batch_seen": 0}
+
+    # --- API para as rotas ---
+
+    def submit(self, unit: WriteUnit) -> Future:
+        """Enfileira uma unidade de escrita; o Future resolve depois do commit"""
+        self.start()
+        future: Future = Future()
+        self._queue.put((unit, future))
+        return future
+
+    def run(self, unit: WriteUnit, timeout: Optional[float] = None) -> Any:
+        """Versão bloqueante (rotas síncronas, que já rodam no threadpool)"""
+        return self.submit(unit).result(timeout)
+
+    async def arun(self, unit: WriteUnit) -> Any:
+        """Versão assíncrona (rotas async)"""
+        return await asyncio.wrap_future(self.submit(unit))
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Processa o que já está na fila e encerra a thread"""
+        with self._lock:
+            thread = self._thread
+            if not thread or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["running"] = bool(self._thread and self._thread.is_alive())
+        stats["avg_batch"] = round(stats["units"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    # --- Thread de escrita ---
+
+    def _next_batch(self) -> Tuple[List[Tuple[WriteUnit, Future]], bool]:
+        """Bloqueia até a primeira unidade e junta as que chegarem na janela"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        session = self._session_factory(expire_on_commit=False)
+        try:
+            while True:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._execute(session, batch)
+                if stopping:
+                    break
+        finally:
+            session.close()
+
+    def _execute(self, session: Session, batch: List[Tuple[WriteUnit, Future]]) -> None:
+        pending = [(unit, future) for unit, future in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        self._stats["batches"] += 1
+        self._stats["units"] += len(pending)
+        self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(pending))
+
+        results = []
+        try:
+            for unit, _ in pending:
+                results.append(unit(session))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(pending) == 1:
+                self._stats["failed_units"] += 1
+                pending[0][1].set_exception(e)
+                return
+            # Uma unidade falhou: refaz cada uma sozinha para não derrubar as outras
+            self._stats["split_batches"] += 1
+            for unit, future in pending:
+                self._execute_single(session, unit, future)
+            return
+        finally:
+            session.expunge_all()
+
+        for (_, future), result in zip(pending, results):
+            future.set_result(result)
+
+    def _execute_single(self, session: Session, unit: WriteUnit, future: Future) -> None:
+        try:
+            result = unit(session)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self._stats["failed_units"] += 1
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            session.expunge_all()
+
+
+# Instância usada pela aplicação (a thread sobe no primeiro uso ou no startup)
+writer = WriteQueue()
@@ -2,8 +2,12 @@
 Serviço para extrair informações de vídeos do YouTube usando yt-dlp
 """
 import yt_dlp
+from yt_dlp.networking.exceptions import HTTPError, TransportError
 from typing import Optional, Dict
 import logging
+from app.config import YTDLP_SOCKET_TIMEOUT, YTDLP_MIN_SECONDS
+from app.services.circuit_breaker import youtube_breaker
+from app.services.deadline import DeadlineExceeded, deadline_near, is_timeout_error, mark_degraded, time_budget
 
 logger = logging.getLogger(__name__)
 
@@ -13,132 +17,209 @@ def get_video_info(video_id: str) -> Optional[Dict]:
     Extrai informações do vídeo do YouTube usando yt-dlp
     Retorna a URL DIRETA do arquivo de vídeo (não a página web)
     
+    Protegido por circuit breaker: enquanto o YouTube estiver falhando,
+    retorna a URL da página imediatamente, sem tentar a extração. O mesmo
+    acontece quando o deadline da requisição está perto do fim.
+    
     Args:
         video_id: ID do vídeo no YouTube (ex: dQw4w9WgXcQ)
     
     Returns:
         Dict com url (direta), title, thumbnail_url, duration
     """
+    if deadline_near(YTDLP_MIN_SECONDS):
+        logger.debug(f"Deadline da requisição próximo, pulando extração do vídeo {video_id}")
+        mark_degraded("youtube")
+        return _fallback_video_info(video_id)
+    
+    if not youtube_breaker.allow_request():
+        logger.debug(f"Circuit breaker do YouTube aberto, retornando URL da página para {video_id}")
+        return _fallback_video_info(video_id)
+    
     try:
-        urls_to_try = [
-            f"https://www.youtube.com/watch?v={video_id}",
-            f"https://www.youtube.com/shorts/{video_id}"
-        ]
-        
-        for youtube_url in urls_to_try:
-            try:
-                ydl_opts = {
-                    'quiet': True,
-                    'no_warnings': True,
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(youtube_url, download=False)
-                    
-                    if not info:
-                        continue
-                    
-                    # YouTube usa DASH (streams separados de vídeo e áudio)
-                    # Retornar TODAS as opções para o app decidir
-                    
-                    formats = info.get('formats', [])
-                    
-                    # 1. Tentar formatos combinados (vídeo + áudio)
-                    video_audio_formats = [
-                        f for f in formats 
-                        if f.get('url') and 
-                        f.get('vcodec') != 'none' and 
-                        f.get('acodec') != 'none' and 
-                        'googlevideo.com' in f.get('url', '')
-                    ]
-                    
-                    # 2. Formatos separados (DASH)
-                    video_only = [
-                        f for f in formats 
-                        if f.get('url') and 
-                        f.get('vcodec') != 'none' and 
-                        f.get('acodec') == 'none' and 
-                        'googlevideo.com' in f.get('url', '')
-                    ]
-                    
-                    audio_only = [
-                        f for f in formats 
-                        if f.get('url') and 
-                        f.get('vcodec') == 'none' and 
-                        f.get('acodec') != 'none' and 
-                        'googlevideo.com' in f.get('url', '')
-                    ]
-                    
-                    # Priorizar formato combinado
-                    if video_audio_formats:
-                        best = video_audio_formats[-1]
-                        logger.info(f"Formato combinado encontrado: {best.get('format_id')}")
-                        return {
-                            'url': best.get('url'),
-                            'audio_url': None,
-                            'youtube_url': youtube_url,
-                            'title': info.get('title'),
-                            'thumbnail_url': info.get('thumbnail'),
-                            'duration': info.get('duration'),
-                            'description': info.get('description'),
-                            'uploader': info.get('uploader'),
-                            'view_count': info.get('view_count'),
-                        }
-                    
-                    # Se só tem separados (DASH), retornar ambos
-                    elif video_only and audio_only:
-                        best_video = video_only[-1]
-                        best_audio = audio_only[-1]
-                        logger.info(f"DASH detectado: vídeo={best_video.get('format_id')}, áudio={best_audio.get('format_id')}")
-                        return {
-                            'url': best_video.get('url'),
-                            'audio_url': best_audio.get('url'),
-                            'youtube_url': youtube_url,
-                            'title': info.get('title'),
-                            'thumbnail_url': info.get('thumbnail'),
-                            'duration': info.get('duration'),
-                            'description': info.get('description'),
-                            'uploader': info.get('uploader'),
-                            'view_count': info.get('view_count'),
-                        }
-                    
-                    # Se só tem vídeo
-                    elif video_only:
-                        best_video = video_only[-1]
-                        logger.warning(f"Apenas vídeo disponível: {best_video.get('format_id')}")
-                        return {
-                            'url': best_video.get('url'),
-                            'audio_url': None,
-                            'youtube_url': youtube_url,
-                            'title': info.get('title'),
-                            'thumbnail_url': info.get('thumbnail'),
-                            'duration': info.get('duration'),
-                            'description': info.get('description'),
-                            'uploader': info.get('uploader'),
-                            'view_count': info.get('view_count'),
-                        }
-                    
-            except Exception as e:
-                logger.debug(f"Tentativa com {youtube_url} falhou: {str(e)}")
-                continue
-        
+        info = _extract_video_info(video_id)
+    except DeadlineExceeded:
+        # Falta de tempo do cliente não é falha do YouTube: não conta no breaker
+        mark_degraded("youtube")
+        youtube_breaker.release()
+        return _fallback_video_info(video_id)
+    except Exception as e:
+        logger.error(f"Erro ao extrair info do vídeo {video_id}: {str(e)}")
+        youtube_breaker.record_failure()
+        return _fallback_video_info(video_id)
+    
+    # O YouTube respondeu (mesmo que o vídeo não exista ou não tenha URL direta)
+    youtube_breaker.record_success()
+    
+    if info is None:
         # Se ambas falharam, retornar URL da página (fallback)
         logger.warning(f"Não foi possível extrair URL direta do vídeo {video_id}, retornando URL da página")
-        return {
-            'url': f"https://www.youtube.com/watch?v={video_id}",
-            'title': None,
-            'thumbnail_url': f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
-            'duration': None,
-        }
+        return _fallback_video_info(video_id)
     
-    except Exception as e:
-        logger.error(f"Erro ao extrair info do vídeo {video_id}: {str(e)}")
-        return {
-            'url': f"https://www.youtube.com/watch?v={video_id}",
-            'title': None,
-            'thumbnail_url': f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
-            'duration': None,
-        }
+    return info
+
+
+def _fallback_video_info(video_id: str) -> Dict:
+    """
+    Informações mínimas do vídeo quando a extração não é possível
+    """
+    return {
+        'url': f"https://www.youtube.com/watch?v={video_id}",
+        'title': None,
+        'thumbnail_url': f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
+        'duration': None,
+    }
+
+
+def _extract_video_info(video_id: str) -> Optional[Dict]:
+    """
+    Tenta extrair a URL direta do vídeo via yt-dlp
+    
+    Vídeo inexistente, privado ou id inválido retorna None; erro de rede ou
+    timeout em todas as tentativas é relançado (conta como falha no breaker).
+    Timeout de uma tentativa cujo socket_timeout foi encurtado pelo deadline da
+    requisição vira DeadlineExceeded (o prazo era do cliente, não do YouTube).
+    
+    Returns:
+        Dict com as informações do vídeo, ou None se nenhuma URL funcionou
+    """
+    transport_error = None
+    deadline_error = None
+    urls_to_try = [
+        f"https://www.youtube.com/watch?v={video_id}",
+        f"https://www.youtube.com/shorts/{video_id}"
+    ]
+    
+    for youtube_url in urls_to_try:
+        if deadline_near(YTDLP_MIN_SECONDS):
+            raise DeadlineExceeded(f"Sem tempo para extrair {youtube_url}")
+        
+        socket_timeout = time_budget(YTDLP_SOCKET_TIMEOUT)
+        try:
+            ydl_opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'socket_timeout': socket_timeout,
+            }
+            
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(youtube_url, download=False)
+                
+                if not info:
+                    continue
+                
+                # YouTube usa DASH (streams separados de vídeo e áudio)
+                # Retornar TODAS as opções para o app decidir
+                
+                formats = info.get('formats', [])
+                
+                # 1. Tentar formatos combinados (vídeo + áudio)
+                video_audio_formats = [
+                    f for f in formats 
+                    if f.get('url') and 
+                    f.get('vcodec') != 'none' and 
+                    f.get('acodec') != 'none' and 
+                    'googlevideo.com' in f.get('url', '')
+                ]
+                
+                # 2. Formatos separados (DASH)
+                video_only = [
+                    f for f in formats 
+                    if f.get('url') and 
+                    f.get('vcodec') != 'none' and 
+                    f.get('acodec') == 'none' and 
+                    'googlevideo.com' in f.get('url', '')
+                ]
+                
+                audio_only = [
+                    f for f in formats 
+                    if f.get('url') and 
+                    f.get('vcodec') == 'none' and 
+                    f.get('acodec') != 'none' and 
+                    'googlevideo.com' in f.get('url', '')
+                ]
+                
+                # Priorizar formato combinado
+                if video_audio_formats:
+                    best = video_audio_formats[-1]
+                    logger.info(f"Formato combinado encontrado: {best.get('format_id')}")
+                    return {
+                        'url': best.get('url'),
+                        'audio_url': None,
+                        'youtube_url': youtube_url,
+                        'title': info.get('title'),
+                        'thumbnail_url': info.get('thumbnail'),
+                        'duration': info.get('duration'),
+                        'description': info.get('description'),
+                        'uploader': info.get('uploader'),
+                        'view_count': info.get('view_count'),
+                    }
+                
+                # Se só tem separados (DASH), retornar ambos
+                elif video_only and audio_only:
+                    best_video = video_only[-1]
+                    best_audio = audio_only[-1]
+                    logger.info(f"DASH detectado: vídeo={best_video.get('format_id')}, áudio={best_audio.get('format_id')}")
+                    return {
+                        'url': best_video.get('url'),
+                        'audio_url': best_audio.get('url'),
+                        'youtube_url': youtube_url,
+                        'title': info.get('title'),
+                        'thumbnail_url': info.get('thumbnail'),
+                        'duration': info.get('duration'),
+                        'description': info.get('description'),
+                        'uploader': info.get('uploader'),
+                        'view_count': info.get('view_count'),
+                    }
+                
+                # Se só tem vídeo
+                elif video_only:
+                    best_video = video_only[-1]
+                    logger.warning(f"Apenas vídeo disponível: {best_video.get('format_id')}")
+                    return {
+                        'url': best_video.get('url'),
+                        'audio_url': None,
+                        'youtube_url': youtube_url,
+                        'title': info.get('title'),
+                        'thumbnail_url': info.get('thumbnail'),
+                        'duration': info.get('duration'),
+                        'description': info.get('description'),
+                        'uploader': info.get('uploader'),
+                        'view_count': info.get('view_count'),
+                    }
+                
+        except Exception as e:
+            logger.debug(f"Tentativa com {youtube_url} falhou: {str(e)}")
+            if socket_timeout < YTDLP_SOCKET_TIMEOUT and is_timeout_error(e):
+                deadline_error = e
+            elif _is_transport_error(e):
+                transport_error = e
+            continue
+    
+    if transport_error is not None:
+        raise transport_error
+    if deadline_error is not None:
+        raise DeadlineExceeded(f"Timeout do deadline da requisição ao extrair {video_id}") from deadline_error
+    return None
+
+
+def _is_transport_error(error: BaseException) -> bool:
+    """
+    True se o erro (ou a causa embrulhada pelo yt-dlp) é de rede, timeout ou
+    HTTP 5xx/429. "Video unavailable", id inválido e afins são respostas
+    normais do YouTube e não devem abrir o circuit breaker.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, HTTPError):
+            return error.status >= 500 or error.status == 429
+        if isinstance(error, (TransportError, TimeoutError, ConnectionError)):
+            return True
+        # DownloadError/ExtractorError guardam a exceção original em exc_info
+        exc_info = getattr(error, "exc_info", None)
+        error = (exc_info[1] if exc_info else None) or error.__cause__ or error.__context__
+    return False
 
 
 def extract_video_id(url_or_id: str) -> str:
@@ -0,0 +1,155 @@
+"""
+Benchmark: camada síncrona (Session) x assíncrona (AsyncSession + aiosqlite)
+
+Sobe um app FastAPI mínimo, no mesmo processo, com a mesma consulta (usuário
+pelo device_id + contagens de progresso) exposta de três formas:
+
+- blocking:   `async def` com a Session síncrona (bloqueia o event loop;
+              era o caso do router de usuários)
+- threadpool: `def` com a Session síncrona (disputa o threadpool do Starlette)
+- async:      `async def` com get_async_db (consultas aguardadas no event loop)
+
+e dispara requisições concorrentes via httpx.ASGITransport, medindo vazão,
+latência (p50/p99) e o maior atraso do event loop durante a rodada. O cliente
+roda no mesmo loop, então os números servem para comparar as variantes entre
+si, não como capacidade absoluta. Usa um banco temporário próprio.
+
+Uso:
+    python benchmark_async_db.py [--users 2000] [--requests 5000] [--concurrency 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+_tmpdir = tempfile.mkdtemp(prefix="feedbreak-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import Base, SessionLocal, async_engine, engine, get_async_db, get_db
+from app.db_models import User, UserVideoProgress
+
+
+def seed(users: int) -> list:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        device_ids = []
+        for i in range(users):
+            user = User(device_id=f"bench-{i}", nome=f"Aluno {i}", idade=15, interesses=[], nivel_educacional="medio")
+            db.add(user)
+            device_ids.append(user.device_id)
+        db.commit()
+        return device_ids
+    finally:
+        db.close()
+
+
+def _sync_stats(db: Session, device_id: str) -> dict:
+    user = db.execute(select(User).where(User.device_id == device_id)).scalars().first()
+    watched = db.execute(
+        select(func.count(UserVideoProgress.pk)).where(UserVideoProgress.user_pk == user.pk)
+    ).scalar()
+    return {"id": user.id, "watched": watched}
+
+
+app = FastAPI()
+
+
+@app.get("/blocking/{device_id}")
+async def blocking(device_id: str, db: Session = Depends(get_db)):
+    return _sync_stats(db, device_id)
+
+
+@app.get("/threadpool/{device_id}")
+def threadpool(device_id: str, db: Session = Depends(get_db)):
+    return _sync_stats(db, device_id)
+
+
+@app.get("/async/{device_id}")
+async def async_path(device_id: str, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.device_id == device_id))).scalars().first()
+    watched = (await db.execute(
+        select(func.count(UserVideoProgress.pk)).where(UserVideoProgress.user_pk == user.pk)
+    )).scalar()
+    return {"id": user.id, "watched": watched}
+
+
+async def _watch_loop_lag(samples: list, interval: float = 0.01) -> None:
+    """Mede quanto o event loop atrasa um sleep curto"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def run_variant(name: str, device_ids: list, total: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(f"/{name}/{random.choice(device_ids)}")
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        # Aquecimento (abre as conexões do pool)
+        await asyncio.gather(*(one() for _ in range(min(concurrency, total))))
+        latencies.clear()
+
+        lag = [0.0]
+        watcher = asyncio.create_task(_watch_loop_lag(lag))
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        watcher.cancel()
+
+    latencies.sort()
+    return {
+        "variant": name,
+        "req_per_s": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "max_loop_lag_ms": max(lag) * 1000,
+        "errors": errors,
+    }
+
+
+async def main(args) -> None:
+    device_ids = seed(args.users)
+    print(f"Banco: {os.environ['DATABASE_URL']} ({args.users} usuários)")
+    print(f"{args.requests} requisições, concorrência {args.concurrency}\n")
+    print(f"{'variante':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'lag loop ms':>13}{'erros':>8}")
+    for name in ("blocking", "threadpool", "async"):
+        result = await run_variant(name, device_ids, args.requests, args.concurrency)
+        print(
+            f"{result['variant']:<12}{result['req_per_s']:>10.0f}{result['p50_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['max_loop_lag_ms']:>13.1f}{result['errors']:>8}"
+        )
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara a camada de banco síncrona com a assíncrona")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
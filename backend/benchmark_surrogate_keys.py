@@ -0,0 +1,186 @@
+"""
+Benchmark: chaves UUID (String(36)) x chaves inteiras (pk) nas tabelas de
+progresso e respostas
+
+Cria um banco temporário na revisão 007 (FKs em UUID), popula com dados
+sintéticos e mede o tamanho de tabelas/índices (dbstat) e o tempo dos joins
+quentes; depois aplica a migração 008 (alembic upgrade head), que reescreve
+os dados com chaves inteiras, e mede de novo.
+
+Uso:
+    python benchmark_surrogate_keys.py [--users 5000] [--videos 200] [--activities 100] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmpdir = tempfile.mkdtemp(prefix="feedbreak-keys-")
+DB_PATH = os.path.join(_tmpdir, "keys.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from alembic import command
+from alembic.config import Config
+
+TABLES = ["users", "videos", "activities", "user_video_progress", "user_activity_responses"]
+
+# Nomes das chaves em cada esquema: (chave da tabela pai, FK de usuário, FK de vídeo, FK de atividade)
+SCHEMAS = {
+    "uuid": ("id", "user_id", "video_id", "activity_id"),
+    "int": ("pk", "user_pk", "video_pk", "activity_pk"),
+}
+
+JOINS = {
+    "visualizações por conteúdo": """
+        SELECT v.content_id, COUNT(*) FROM user_video_progress p
+        JOIN videos v ON v.{key} = p.{video_fk}
+        WHERE p.watched = 1 GROUP BY v.content_id
+    """,
+    "média de grau por conteúdo": """
+        SELECT a.content_id, AVG(r.grau_aprendizagem) FROM user_activity_responses r
+        JOIN activities a ON a.{key} = r.{activity_fk}
+        WHERE r.grau_aprendizagem IS NOT NULL GROUP BY a.content_id
+    """,
+    "ranking de usuários": """
+        SELECT u.nome, COUNT(r.{activity_fk}), AVG(r.grau_aprendizagem) FROM users u
+        JOIN user_activity_responses r ON r.{user_fk} = u.{key}
+        WHERE r.responded = 1 GROUP BY u.{key} ORDER BY 3 DESC LIMIT 20
+    """,
+    "progresso de um usuário (device_id)": """
+        SELECT COUNT(*) FROM user_video_progress p
+        JOIN users u ON u.{key} = p.{user_fk}
+        WHERE u.device_id = 'device-42' AND p.watched = 1
+    """,
+}
+
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return config
+
+
+def seed(conn: sqlite3.Connection, users: int, videos: int, activities: int) -> None:
+    """Popula o esquema UUID (revisão 007)"""
+    rng = random.Random(42)
+    contents = [str(uuid.uuid4()) for _ in range(max(1, videos // 20))]
+    conn.executemany(
+        "INSERT INTO contents (id, title) VALUES (?, ?)",
+        [(content_id, f"Conteúdo {i}") for i, content_id in enumerate(contents)]
+    )
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    conn.executemany(
+        "INSERT INTO users (id, device_id, nome) VALUES (?, ?, ?)",
+        [(user_id, f"device-{i}", f"Usuário {i}") for i, user_id in enumerate(user_ids)]
+    )
+    video_ids = [str(uuid.uuid4()) for _ in range(videos)]
+    conn.executemany(
+        "INSERT INTO videos (id, content_id, video_id, order_index) VALUES (?, ?, ?, ?)",
+        [(video_id, contents[i % len(contents)], f"yt{i}", i) for i, video_id in enumerate(video_ids)]
+    )
+    activity_ids = [str(uuid.uuid4()) for _ in range(activities)]
+    conn.executemany(
+        "INSERT INTO activities (id, content_id, question, order_index) VALUES (?, ?, ?, ?)",
+        [(activity_id, contents[i % len(contents)], f"Pergunta {i}", i) for i, activity_id in enumerate(activity_ids)]
+    )
+    for user_id in user_ids:
+        conn.executemany(
+            "INSERT INTO user_video_progress (id, user_id, video_id, watched) VALUES (?, ?, ?, 1)",
+            [(str(uuid.uuid4()), user_id, video_id) for video_id in rng.sample(video_ids, min(20, videos))]
+        )
+        conn.executemany(
+            "INSERT INTO user_activity_responses (id, user_id, activity_id, answer, grau_aprendizagem, responded) "
+            "VALUES (?, ?, ?, 'resposta', ?, 1)",
+            [
+                (str(uuid.uuid4()), user_id, activity_id, rng.random())
+                for activity_id in rng.sample(activity_ids, min(10, activities))
+            ]
+        )
+    conn.commit()
+
+
+def measure(schema: str, repeat: int) -> dict:
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("VACUUM")
+    sizes = {}
+    for table in TABLES:
+        # Tabela + todos os índices dela (autoindex das uniques inclusive)
+        rows = conn.execute(
+            "SELECT s.name, SUM(s.pgsize) FROM dbstat s "
+            "WHERE s.name = ? OR s.name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?) "
+            "GROUP BY s.name",
+            (table, table)
+        ).fetchall()
+        sizes[table] = {
+            "table": sum(size for name, size in rows if name == table),
+            "indexes": sum(size for name, size in rows if name != table),
+        }
+
+    key, user_fk, video_fk, activity_fk = SCHEMAS[schema]
+    timings = {}
+    for name, sql in JOINS.items():
+        sql = sql.format(key=key, user_fk=user_fk, video_fk=video_fk, activity_fk=activity_fk)
+        conn.execute(sql).fetchall()  # aquece o cache de páginas
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[name] = statistics.median(samples)
+    conn.close()
+    return {"sizes": sizes, "timings": timings}
+
+
+def report(before: dict, after: dict) -> None:
+    kib = lambda size: f"{size / 1024:,.0f} KiB"
+    print(f"\n{'tabela':<26}{'dados UUID':>14}{'dados int':>14}{'índices UUID':>16}{'índices int':>14}")
+    for table in TABLES:
+        old, new = before["sizes"][table], after["sizes"][table]
+        print(f"{table:<26}{kib(old['table']):>14}{kib(new['table']):>14}"
+              f"{kib(old['indexes']):>16}{kib(new['indexes']):>14}")
+    old_total = sum(s["table"] + s["indexes"] for s in before["sizes"].values())
+    new_total = sum(s["table"] + s["indexes"] for s in after["sizes"].values())
+    print(f"{'total':<26}{kib(old_total):>14} -> {kib(new_total)} ({new_total / old_total - 1:+.0%})")
+
+    print(f"\n{'join (mediana)':<40}{'UUID':>10}{'int':>10}")
+    for name in JOINS:
+        old, new = before["timings"][name], after["timings"][name]
+        print(f"{name:<40}{old:>8.2f}ms{new:>8.2f}ms  ({new / old - 1:+.0%})")
+
+
+def main(users: int, videos: int, activities: int, repeat: int) -> None:
+    config = alembic_config()
+    command.upgrade(config, "007_unique_video_progress")
+
+    conn = sqlite3.connect(DB_PATH)
+    started = time.perf_counter()
+    seed(conn, users, videos, activities)
+    conn.close()
+    print(f"Banco em {DB_PATH}: {users} usuários populados em {time.perf_counter() - started:.1f}s")
+
+    before = measure("uuid", repeat)
+
+    started = time.perf_counter()
+    command.upgrade(config, "head")
+    print(f"Migração 008 (reescrita em lotes) em {time.perf_counter() - started:.1f}s")
+
+    after = measure("int", repeat)
+    report(before, after)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara chaves UUID e inteiras em tamanho e velocidade de join")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--activities", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.users, args.videos, args.activities, args.repeat)
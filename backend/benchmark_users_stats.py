@@ -0,0 +1,166 @@
+"""
+Benchmark: GET /dashboard/users (get_users_stats) com muitos usuários
+
+Compara a implementação antiga (página por OFFSET/LIMIT, três agregações
+por usuário e ordenação em Python só dentro da página) com a leitura do
+rollup user_stats ordenada pelos seus índices. Para cada ordenação mede o
+tempo por página, o número de queries e confere se a página segue a ordem
+global. O seed passa pelos triggers dos rollups.
+
+Uso:
+    python benchmark_users_stats.py [--users 100000] [--pages 5] [--limit 50]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+_tmpdir = tempfile.mkdtemp(prefix="feedbreak-users-stats-")
+DB_PATH = os.path.join(_tmpdir, "users_stats.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("OPENAI_API_KEY", "not-used-by-this-benchmark")
+os.environ.setdefault("SLOW_QUERY_THRESHOLD_MS", "0")
+
+from sqlalchemy import func
+
+from app.database import Base, SessionLocal, engine
+from app.db_models import User, UserActivityResponse, UserVideoProgress
+from app.models import UserStats
+from app.routers.dashboard import get_users_stats
+from app.services.query_stats import assert_max_queries
+
+ORDERINGS = {
+    "videos_watched": lambda stats: stats.videos_watched,
+    "activities_completed": lambda stats: stats.activities_completed,
+    "avg_grade": lambda stats: stats.avg_grau_aprendizagem or 0,
+}
+
+
+def legacy_users_stats(db, skip: int, limit: int, order_by: str):
+    """Implementação anterior (3N+1 queries, ordem só dentro da página)"""
+    users = db.query(User).offset(skip).limit(limit).all()
+    users_stats = []
+    for user in users:
+        videos_watched = db.query(func.count(UserVideoProgress.id)).filter(
+            UserVideoProgress.user_pk == user.pk,
+            UserVideoProgress.watched == True
+        ).scalar() or 0
+        activities_completed = db.query(func.count(UserActivityResponse.id)).filter(
+            UserActivityResponse.user_pk == user.pk,
+            UserActivityResponse.responded == True
+        ).scalar() or 0
+        avg_learning = db.query(func.avg(UserActivityResponse.grau_aprendizagem)).filter(
+            UserActivityResponse.user_pk == user.pk,
+            UserActivityResponse.grau_aprendizagem.isnot(None)
+        ).scalar()
+        users_stats.append(UserStats(
+            user_id=user.id,
+            user_nome=user.nome,
+            videos_watched=videos_watched,
+            activities_completed=activities_completed,
+            avg_grau_aprendizagem=round(float(avg_learning), 2) if avg_learning else None,
+            last_active=user.last_active_at
+        ))
+    users_stats.sort(key=ORDERINGS[order_by], reverse=True)
+    return users_stats
+
+
+def seed(users: int, videos: int, activities: int) -> None:
+    """Popula direto pelo sqlite3 (executemany) para caber 100k usuários em segundos"""
+    rng = random.Random(7)
+    conn = sqlite3.connect(DB_PATH)
+    content_id = str(uuid.uuid4())
+    conn.execute("INSERT INTO contents (id, title) VALUES (?, 'Conteúdo')", (content_id,))
+    conn.executemany(
+        "INSERT INTO videos (pk, id, content_id, video_id, order_index) VALUES (?, ?, ?, ?, ?)",
+        [(pk, str(uuid.uuid4()), content_id, f"yt{pk}", pk) for pk in range(1, videos + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO activities (pk, id, content_id, question, order_index) VALUES (?, ?, ?, ?, ?)",
+        [(pk, str(uuid.uuid4()), content_id, f"Pergunta {pk}", pk) for pk in range(1, activities + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO users (pk, id, device_id, nome, interesses, nivel_educacional) VALUES (?, ?, ?, ?, '[]', 'fundamental')",
+        [(pk, str(uuid.uuid4()), f"device-{pk}", f"Usuário {pk}") for pk in range(1, users + 1)]
+    )
+    progress, responses = [], []
+    for user_pk in range(1, users + 1):
+        for video_pk in rng.sample(range(1, videos + 1), rng.randint(0, 8)):
+            progress.append((str(uuid.uuid4()), user_pk, video_pk, rng.random() < 0.9))
+        for activity_pk in rng.sample(range(1, activities + 1), rng.randint(0, 5)):
+            grade = round(rng.random(), 2) if rng.random() < 0.8 else None
+            responses.append((str(uuid.uuid4()), user_pk, activity_pk, "resposta", grade, rng.random() < 0.85))
+    conn.executemany(
+        "INSERT INTO user_video_progress (id, user_pk, video_pk, watched) VALUES (?, ?, ?, ?)", progress
+    )
+    conn.executemany(
+        "INSERT INTO user_activity_responses (id, user_pk, activity_pk, answer, grau_aprendizagem, responded) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        responses
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"{users} usuários, {len(progress)} progressos, {len(responses)} respostas")
+
+
+def run(name: str, fetch, pages: int, limit: int, order_by: str) -> dict:
+    timings, queries, rows = [], 0, []
+    for page in range(pages):
+        with assert_max_queries(10_000) as stats:
+            started = time.perf_counter()
+            result = fetch(skip=page * limit, limit=limit, order_by=order_by)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries += stats.count
+        rows.extend(result)
+    key = ORDERINGS[order_by]
+    values = [key(row) for row in rows]
+    return {
+        "name": name,
+        "p50": statistics.median(timings),
+        "max": max(timings),
+        "queries": queries / pages,
+        "globally_sorted": values == sorted(values, reverse=True),
+        "first": values[0] if values else None,
+    }
+
+
+def main(users: int, pages: int, limit: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    seed(users, videos=40, activities=20)
+    print(f"Banco em {DB_PATH} populado em {time.perf_counter() - started:.1f}s\n")
+
+    db = SessionLocal()
+    try:
+        print(f"{'ordenação':<22}{'implementação':<14}{'p50/página':>12}{'máx':>10}{'queries/pág':>13}"
+              f"{'1º valor':>10}  ordem global")
+        for order_by in ORDERINGS:
+            variants = [
+                ("antiga", lambda **kw: legacy_users_stats(db, **kw)),
+                ("rollup", lambda **kw: get_users_stats(db=db, **kw)),
+            ]
+            for name, fetch in variants:
+                result = run(name, fetch, pages, limit, order_by)
+                print(f"{order_by:<22}{name:<14}{result['p50']:>10.1f}ms{result['max']:>8.1f}ms"
+                      f"{result['queries']:>13.0f}{result['first']!s:>10}  "
+                      f"{'sim' if result['globally_sorted'] else 'NÃO'}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de get_users_stats com muitos usuários")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    main(args.users, args.pages, args.limit)
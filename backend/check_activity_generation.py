@@ -0,0 +1,184 @@
+"""
+Roda o job de geração de atividades de ponta a ponta com um LLM de mentira.
+
+Sobe o app com um banco temporário, cria conteúdos e dispara
+POST /activities/generate. Só o cliente do provedor é substituído
+(agent._make_llm): prompt, parse da resposta, circuit breaker, checkpoint e
+insert das atividades rodam como em produção. Depois verifica:
+
+- o job termina `completed` com N atividades por conteúdo
+- falhas do provedor durante um job abrem o breaker `llm_jobs`, não o `llm`
+- GET /activities/generate/stream: os tokens chegam como eventos `token` e o
+  evento `done` traz a pergunta parseada e o id da atividade salva
+- o lease: um job com lease válido de outro worker não é marcado como
+  interrompido no startup nem executado de novo; com o lease vencido, sim
+
+Uso:
+    python check_activity_generation.py
+
+Retorna código 1 se alguma verificação falhar.
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+_tmpdir = tempfile.mkdtemp(prefix="feedbreak-generation-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'generation.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("OPENAI_API_KEY", "not-used-by-this-check")
+
+import asyncio
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.database import Base, SessionLocal, engine
+from app.db_models import Activity, BackgroundJob, Content
+from app.main import app
+from app.services import agent, jobs
+from app.services.circuit_breaker import llm_breaker
+from app.services.activity_generation import JOB_KIND, generation_breaker
+
+CATEGORY = "ciencias"
+PER_ITEM = 2
+
+
+class FakeChatModel:
+    """Responde como o provedor, com uma pergunta derivada do prompt recebido"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    def _answer(self, messages) -> str:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("provider unavailable")
+        prompt = messages[-1].content
+        return json.dumps({
+            "pergunta_gerada": f"Pergunta {self.calls} sobre o contexto ({len(prompt)} caracteres)?",
+            "nivel_alvo": "medio",
+            "conceito_avaliado": "conceito"
+        }, ensure_ascii=False)
+
+    def invoke(self, messages):
+        return AIMessage(content=self._answer(messages))
+
+    async def astream(self, messages):
+        answer = self._answer(messages)
+        for i in range(0, len(answer), 16):
+            yield AIMessageChunk(content=answer[i:i + 16])
+
+
+def seed() -> list:
+    db = SessionLocal()
+    try:
+        contents = [
+            Content(title=f"Conteúdo {i}", description="Fotossíntese e cadeia alimentar", category=CATEGORY, publico_alvo="medio")
+            for i in range(6)
+        ]
+        db.add_all(contents)
+        db.commit()
+        return [content.id for content in contents]
+    finally:
+        db.close()
+
+
+def run_generation(client: TestClient) -> dict:
+    response = client.post("/api/v1/activities/generate", json={
+        "category": CATEGORY, "activities_per_item": PER_ITEM, "concurrency": 2
+    })
+    if response.status_code != 202:
+        raise RuntimeError(f"POST /activities/generate: HTTP {response.status_code} {response.text[:200]}")
+    return client.get(f"/api/v1/jobs/{response.json()['id']}").json()
+
+
+def read_events(body: str) -> list:
+    """Converte o corpo text/event-stream em [(evento, dados)]"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def check(results: list, name: str, ok: bool, detail: str = "") -> None:
+    results.append(ok)
+    print(f"{'ok' if ok else 'FALHA':<8}{name}{f' ({detail})' if detail and not ok else ''}")
+
+
+def main() -> int:
+    Base.metadata.create_all(bind=engine)
+    content_ids = seed()
+    results = []
+
+    with TestClient(app) as client:
+        model = FakeChatModel()
+        agent._make_llm = lambda **kwargs: model
+        response = client.get("/api/v1/activities/generate/stream", params={"content_id": content_ids[0]})
+        events = read_events(response.text)
+        tokens = "".join(data["text"] for event, data in events if event == "token")
+        name, final = events[-1]
+        db = SessionLocal()
+        saved = db.query(Activity).filter(Activity.id == final.get("id")).first()
+        db.close()
+        check(
+            results, "stream envia os tokens e o evento final",
+            response.headers["content-type"].startswith("text/event-stream")
+            and len(events) > 2 and name == "done" and json.loads(tokens)["pergunta_gerada"] == final["pergunta_gerada"],
+            f"{len(events)} eventos, último {name}: {final}"
+        )
+        check(
+            results, "atividade do stream salva", saved is not None and saved.question == final["pergunta_gerada"]
+            and final["conceito_avaliado"] == "conceito", str(final)
+        )
+        model.calls = 0
+        db = SessionLocal()
+        db.query(Activity).filter(Activity.content_id.in_(content_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+        job = run_generation(client)
+        db = SessionLocal()
+        generated = db.query(Activity).filter(Activity.content_id.in_(content_ids)).count()
+        db.close()
+        check(results, "job concluído", job["status"] == jobs.COMPLETED, f"{job['status']}: {job['error']}")
+        check(
+            results, f"{PER_ITEM} atividades por conteúdo", generated == PER_ITEM * len(content_ids),
+            f"{generated} geradas, {model.calls} chamadas ao provedor"
+        )
+
+        model = FakeChatModel(fail=True)
+        job = run_generation(client)
+        check(results, "falhas do provedor contam nos itens do job", job["failed_items"] == len(content_ids), str(job))
+        check(results, "breaker llm_jobs aberto", generation_breaker.state == "open", generation_breaker.state)
+        check(results, "breaker llm das requisições intacto", llm_breaker.state == "closed", llm_breaker.state)
+
+    # Lease de outro worker, ainda válido e depois vencido
+    db = SessionLocal()
+    job = BackgroundJob(
+        kind=JOB_KIND, status=jobs.RUNNING, params={"category": CATEGORY}, checkpoint={},
+        lease_owner="other-worker", lease_expires_at=datetime.now() + timedelta(minutes=5)
+    )
+    db.add(job)
+    db.commit()
+    check(results, "lease válido não é marcado interrompido", jobs.mark_interrupted_jobs(db) == 0)
+    asyncio.run(jobs.run_job(job.id, JOB_KIND))
+    db.refresh(job)
+    check(results, "lease válido não é executado de novo", job.lease_owner == "other-worker", job.lease_owner)
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+    check(results, "lease vencido é marcado interrompido", jobs.mark_interrupted_jobs(db) == 1)
+    db.close()
+
+    failures = results.count(False)
+    print(f"\n{len(results) - failures}/{len(results)} verificações ok")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
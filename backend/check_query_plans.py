@@ -0,0 +1,193 @@
+"""
+Verifica o plano (EXPLAIN QUERY PLAN) das consultas quentes de progresso,
+respostas, playlist e dashboard.
+
+Cada consulta declara as tabelas que precisam ser acessadas por índice
+(SEARCH); o script falha se alguma delas cair em SCAN (varredura completa,
+inclusive de um índice inteiro) ou se uma consulta ordenada precisar de
+"TEMP B-TREE" para o ORDER BY. Serve como regressão depois de mudar índices
+ou consultas.
+
+Uso:
+    python check_query_plans.py              # banco temporário criado pelos modelos
+    python check_query_plans.py --current    # banco de DATABASE_URL (ex.: depois do alembic upgrade)
+
+Retorna código 1 se alguma consulta regrediu.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+if "--current" not in sys.argv:
+    _tmpdir = tempfile.mkdtemp(prefix="feedbreak-plans-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'plans.db')}"
+
+from sqlalchemy import func, select
+
+from app.database import Base, engine
+from app.db_models import Activity, UserActivityResponse, UserVideoProgress, Video
+
+USER_PK = 1
+CONTENT_ID = "00000000-0000-0000-0000-000000000002"
+VIDEO_PK = 3
+
+
+def _watched_video_pks():
+    return select(UserVideoProgress.video_pk).where(
+        UserVideoProgress.user_pk == USER_PK,
+        UserVideoProgress.watched == True
+    )
+
+
+def _responded_activity_pks():
+    return select(UserActivityResponse.activity_pk).where(
+        UserActivityResponse.user_pk == USER_PK,
+        UserActivityResponse.responded == True
+    )
+
+
+# (nome, consulta, tabelas que precisam de SEARCH, exige ORDER BY pelo índice)
+HOT_QUERIES = [
+    (
+        "progress: vídeos assistidos do usuário",
+        select(func.count(UserVideoProgress.pk)).where(
+            UserVideoProgress.user_pk == USER_PK,
+            UserVideoProgress.watched == True
+        ),
+        ["user_video_progress"], False
+    ),
+    (
+        "progress: próximo vídeo do conteúdo",
+        select(Video).where(
+            Video.content_id == CONTENT_ID,
+            Video.pk.notin_(_watched_video_pks())
+        ).order_by(Video.order_index).limit(1),
+        ["videos", "user_video_progress"], True
+    ),
+    (
+        "progress: próxima atividade não respondida",
+        select(Activity).where(
+            Activity.content_id == CONTENT_ID,
+            Activity.pk.notin_(_responded_activity_pks())
+        ).order_by(Activity.order_index).limit(1),
+        ["activities", "user_activity_responses"], True
+    ),
+    (
+        "progress: atividades respondidas do usuário",
+        select(func.count(UserActivityResponse.pk)).where(
+            UserActivityResponse.user_pk == USER_PK,
+            UserActivityResponse.responded == True
+        ),
+        ["user_activity_responses"], False
+    ),
+    (
+        "progress: média de grau do usuário",
+        select(func.avg(UserActivityResponse.grau_aprendizagem)).where(
+            UserActivityResponse.user_pk == USER_PK,
+            UserActivityResponse.grau_aprendizagem.isnot(None)
+        ),
+        ["user_activity_responses"], False
+    ),
+    (
+        "videos: playlist do conteúdo",
+        select(Video).where(Video.content_id == CONTENT_ID).order_by(Video.order_index).limit(100),
+        ["videos"], True
+    ),
+    (
+        "activities: atividades do conteúdo",
+        select(Activity).where(Activity.content_id == CONTENT_ID).order_by(Activity.order_index).limit(100),
+        ["activities"], True
+    ),
+    (
+        "dashboard: visualizações do conteúdo",
+        select(func.count(UserVideoProgress.pk)).join(Video).where(
+            Video.content_id == CONTENT_ID,
+            UserVideoProgress.watched == True
+        ),
+        ["videos", "user_video_progress"], False
+    ),
+    (
+        "dashboard: usuários únicos do conteúdo",
+        select(func.count(func.distinct(UserVideoProgress.user_pk))).join(Video).where(
+            Video.content_id == CONTENT_ID,
+            UserVideoProgress.watched == True
+        ),
+        ["videos", "user_video_progress"], False
+    ),
+    (
+        "dashboard: respostas do conteúdo",
+        select(func.count(UserActivityResponse.pk)).join(Activity).where(
+            Activity.content_id == CONTENT_ID,
+            UserActivityResponse.responded == True
+        ),
+        ["activities", "user_activity_responses"], False
+    ),
+    (
+        "dashboard: média de grau do conteúdo",
+        select(func.avg(UserActivityResponse.grau_aprendizagem)).join(Activity).where(
+            Activity.content_id == CONTENT_ID,
+            UserActivityResponse.grau_aprendizagem.isnot(None)
+        ),
+        ["activities", "user_activity_responses"], False
+    ),
+    (
+        "dashboard: progresso do usuário em um vídeo",
+        select(UserVideoProgress.pk, UserVideoProgress.watched).where(
+            UserVideoProgress.user_pk == USER_PK,
+            UserVideoProgress.video_pk == VIDEO_PK
+        ).limit(1),
+        ["user_video_progress"], False
+    ),
+]
+
+
+def explain(conn, statement) -> list:
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()]
+
+
+def check_plan(plan: list, search_tables: list, ordered: bool) -> list:
+    """Problemas encontrados no plano (lista vazia = ok)"""
+    problems = []
+    for detail in plan:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in search_tables:
+            problems.append(f"varredura completa: {detail}")
+    for table in search_tables:
+        if not any(detail.startswith(f"SEARCH {table} ") for detail in plan):
+            problems.append(f"{table} não é acessada por índice")
+    if ordered and any("TEMP B-TREE FOR ORDER BY" in detail for detail in plan):
+        problems.append("ORDER BY com sort temporário")
+    return problems
+
+
+def main(current: bool) -> int:
+    if not engine.url.get_backend_name() == "sqlite":
+        print("EXPLAIN QUERY PLAN só é suportado no SQLite")
+        return 1
+    if not current:
+        Base.metadata.create_all(bind=engine)
+
+    failures = 0
+    with engine.connect() as conn:
+        for name, statement, search_tables, ordered in HOT_QUERIES:
+            plan = explain(conn, statement)
+            problems = check_plan(plan, search_tables, ordered)
+            print(f"{'FALHA' if problems else 'ok':<6} {name}")
+            for detail in plan:
+                print(f"         {detail}")
+            for problem in problems:
+                print(f"       ! {problem}")
+            failures += bool(problems)
+
+    print(f"\n{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} consultas usando índice")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica se as consultas quentes usam índice")
+    parser.add_argument("--current", action="store_true", help="Usa o banco de DATABASE_URL em vez de um temporário")
+    sys.exit(main(parser.parse_args().current))
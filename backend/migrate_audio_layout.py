@@ -0,0 +1,183 @@
+"""
+Migra os áudios do diretório plano (uploads/audio/<arquivo>) para o layout em
+shards do blob store (uploads/audio/ab/cd/<sha256>.<ext>), sem parar a API.
+
+Para cada lote:
+  1. cria um hard link (ou cópia) do arquivo no caminho novo
+  2. reescreve audio_blobs.url e user_activity_responses.answer numa transação
+  3. só depois do commit remove o caminho antigo
+
+Enquanto o lote não é commitado as duas URLs funcionam, então leituras
+concorrentes nunca apontam para um arquivo inexistente. Arquivos antigos que
+ainda não estavam no blob store (anteriores à deduplicação) entram nele com
+o contador de referências correspondente. Rodar de novo é seguro: só URLs
+fora do layout novo são selecionadas.
+
+Uso:
+    python migrate_audio_layout.py [--batch-size 500] [--sleep 0.2] [--dry-run]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import time
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import func, update
+
+from app.database import SessionLocal
+from app.db_models import AudioBlob, UserActivityResponse
+from app.services.audio_store import AUDIO_URL_PREFIX, SHARD_URL_PATTERN, audio_path_from_url, blob_url
+from app.services.uploads import remove_quietly
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("migrate_audio_layout")
+
+
+def _hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _link_into_place(old_path: str, new_path: str) -> None:
+    """Deixa o arquivo disponível no caminho novo sem tirá-lo do antigo"""
+    if os.path.exists(new_path):
+        return
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    tmp_path = f"{new_path}.migrating"
+    try:
+        os.link(old_path, tmp_path)
+    except OSError:
+        # Sistemas de arquivos sem hard link (ou volumes diferentes)
+        shutil.copy2(old_path, tmp_path)
+    os.replace(tmp_path, new_path)
+
+
+def _rewrite_answers(db, old_url: str, new_url: str) -> int:
+    return db.execute(
+        update(UserActivityResponse)
+        .where(UserActivityResponse.answer == old_url)
+        .values(answer=new_url)
+    ).rowcount
+
+
+def migrate_blobs(db, batch_size: int, sleep: float, dry_run: bool) -> int:
+    """Fase 1: blobs já deduplicados, mas salvos no diretório plano"""
+    moved = 0
+    last_url = ""
+    while True:
+        blobs = db.query(AudioBlob).filter(
+            AudioBlob.url > last_url,
+            ~AudioBlob.url.like(SHARD_URL_PATTERN)
+        ).order_by(AudioBlob.url).limit(batch_size).all()
+        if not blobs:
+            break
+        last_url = blobs[-1].url
+
+        to_remove = []
+        for blob in blobs:
+            old_url = blob.url
+            old_path = audio_path_from_url(old_url)
+            new_url = blob_url(blob.sha256, os.path.splitext(old_url)[1])
+            if not os.path.exists(old_path):
+                logger.warning("Arquivo ausente para o blob %s (%s); mantendo a URL", blob.sha256[:12], old_url)
+                continue
+            if dry_run:
+                logger.info("[dry-run] %s -> %s", old_url, new_url)
+                continue
+
+            _link_into_place(old_path, audio_path_from_url(new_url))
+            blob.url = new_url
+            _rewrite_answers(db, old_url, new_url)
+            to_remove.append(old_path)
+
+        db.commit()
+        for path in to_remove:
+            remove_quietly(path)
+        moved += len(to_remove)
+        logger.info("Blobs: %d movidos até agora", moved)
+        time.sleep(sleep)
+    return moved
+
+
+def migrate_legacy_files(db, batch_size: int, sleep: float, dry_run: bool) -> int:
+    """Fase 2: respostas que apontam para arquivos anteriores ao blob store"""
+    moved = 0
+    last_url = ""
+    while True:
+        urls = [row.answer for row in db.query(UserActivityResponse.answer).filter(
+            UserActivityResponse.answer > last_url,
+            UserActivityResponse.answer.like(f"{AUDIO_URL_PREFIX}%"),
+            ~UserActivityResponse.answer.like(SHARD_URL_PATTERN)
+        ).distinct().order_by(UserActivityResponse.answer).limit(batch_size).all()]
+        if not urls:
+            break
+        last_url = urls[-1]
+
+        to_remove = []
+        for old_url in urls:
+            old_path = audio_path_from_url(old_url)
+            if not os.path.exists(old_path):
+                logger.warning("Arquivo ausente: %s; mantendo a URL", old_url)
+                continue
+
+            sha256 = _hash_file(old_path)
+            existing = db.query(AudioBlob).filter(AudioBlob.sha256 == sha256).first()
+            new_url = existing.url if existing else blob_url(sha256, os.path.splitext(old_url)[1])
+            if dry_run:
+                logger.info("[dry-run] %s -> %s%s", old_url, new_url, " (duplicado)" if existing else "")
+                continue
+
+            _link_into_place(old_path, audio_path_from_url(new_url))
+            refs = _rewrite_answers(db, old_url, new_url)
+            if existing:
+                existing.ref_count = AudioBlob.ref_count + refs
+            else:
+                db.add(AudioBlob(
+                    sha256=sha256,
+                    url=new_url,
+                    size_bytes=os.path.getsize(old_path),
+                    ref_count=refs
+                ))
+            # flush por arquivo: o mesmo sha256 pode aparecer de novo no lote
+            db.flush()
+            to_remove.append(old_path)
+
+        db.commit()
+        for path in to_remove:
+            remove_quietly(path)
+        moved += len(to_remove)
+        logger.info("Arquivos antigos: %d movidos até agora", moved)
+        time.sleep(sleep)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra uploads de áudio para o layout em shards")
+    parser.add_argument("--batch-size", type=int, default=500, help="Arquivos por transação")
+    parser.add_argument("--sleep", type=float, default=0.2, help="Pausa entre lotes (segundos), para não disputar o banco com a API")
+    parser.add_argument("--dry-run", action="store_true", help="Só lista o que seria movido")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        blobs = migrate_blobs(db, args.batch_size, args.sleep, args.dry_run)
+        legacy = migrate_legacy_files(db, args.batch_size, args.sleep, args.dry_run)
+        remaining = db.query(func.count(func.distinct(UserActivityResponse.answer))).filter(
+            UserActivityResponse.answer.like(f"{AUDIO_URL_PREFIX}%"),
+            ~UserActivityResponse.answer.like(SHARD_URL_PATTERN)
+        ).scalar()
+        print(f"✅ {blobs} blob(s) e {legacy} arquivo(s) antigo(s) migrados; {remaining} URL(s) fora do layout novo")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
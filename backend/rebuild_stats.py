@@ -0,0 +1,57 @@
+"""
+Recalcula do zero os rollups user_stats e content_stats a partir de
+user_video_progress e user_activity_responses (e, com --timeseries, as séries
+activity_hourly/activity_daily).
+
+Os triggers mantêm as tabelas em dia a cada escrita; use este comando depois
+de importar dados por fora (triggers removidos, restore parcial) ou se
+--check apontar deriva. O recálculo roda numa única transação, então a API
+pode continuar no ar (as escritas esperam o busy_timeout).
+
+Uso:
+    python rebuild_stats.py            # recalcula
+    python rebuild_stats.py --check    # só compara com um recálculo (código 1 se houver deriva)
+    python rebuild_stats.py --timeseries   # também recalcula as séries (ex.: depois de um regrading)
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.database import SessionLocal
+from app.services.rollups import rebuild_rollups, rollup_drift
+from app.services.timeseries import rebuild_timeseries
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recalcula os rollups user_stats e content_stats")
+    parser.add_argument("--check", action="store_true", help="Só verifica a deriva, sem gravar")
+    parser.add_argument("--timeseries", action="store_true", help="Também recalcula activity_hourly/activity_daily")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.check:
+            drift = rollup_drift(db)
+            for table, rows in drift.items():
+                print(f"{table}: {'ok' if not rows else f'{len(rows)} linha(s) divergente(s) (até 20)'}")
+                for row in rows:
+                    print(f"  {row}")
+            return 1 if any(drift.values()) else 0
+
+        rebuilt = rebuild_rollups(db)
+        print(f"✅ Rollups recalculados: {rebuilt['user_stats']} usuário(s), {rebuilt['content_stats']} conteúdo(s)")
+        if args.timeseries:
+            print(f"✅ Séries temporais recalculadas: {rebuild_timeseries(db)} bucket(s)")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -174,8 +174,8 @@ def seed_test_data():
             for video in watched_videos:
                 progress = UserVideoProgress(
                     id=str(uuid.uuid4()),
-                    user_id=user.id,
-                    video_id=video.id,
+                    user_pk=user.pk,
+                    video_pk=video.pk,
                     watched=True,
                     watched_at=datetime.now() - timedelta(days=random.randint(1, 60))
                 )
@@ -197,8 +197,8 @@ def seed_test_data():
                 grau = random.uniform(0.4, 1.0)  # Grau de aprendizagem entre 0.4 e 1.0
                 response = UserActivityResponse(
                     id=str(uuid.uuid4()),
-                    user_id=user.id,
-                    activity_id=activity.id,
+                    user_pk=user.pk,
+                    activity_pk=activity.pk,
                     answer=f"Resposta do usuário {user.nome} para a atividade sobre {activity.question[:30]}...",
                     grau_aprendizagem=round(grau, 2),
                     responded=True,